@@ -1,5 +1,17 @@
 import os
 
+# Gọi thẳng các service nội bộ (vd: http://inventory-service:8003/api) thay vì
+# vòng qua firewall -> nginx -> auth_request. Request được ký bằng
+# INTERNAL_SERVICE_SECRET để service nhận tin tưởng (xem app/core/internal_auth.py).
+INTERNAL_ROUTING = os.environ.get("INTERNAL_ROUTING", "false").lower() == "true"
+
+
+def _service_url(name: str, direct_default: str) -> str:
+    """URL của service phía sau: gọi thẳng (INTERNAL_ROUTING) hoặc qua firewall/gateway"""
+    if INTERNAL_ROUTING:
+        return os.environ.get(f"{name}_DIRECT_URL", direct_default)
+    return os.environ.get(f"{name}_URL")
+
 
 class Settings:
     # Biến môi trường cho Redis
@@ -14,9 +26,15 @@ class Settings:
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7  # 7 ngày se refresh db 1 lan
 
     # URL của User Service (để gọi nội bộ)
-    USER_SERVICE_URL: str = os.environ.get(
-        "USER_SERVICE_URL", "http://localhost:8000/api"
+    SERVICE_NAME: str = "auth-service"
+    INTERNAL_ROUTING: bool = INTERNAL_ROUTING
+    USER_SERVICE_URL: str = (
+        _service_url("USER_SERVICE", "http://user-service:8000/api")
+        or "http://localhost:8000/api"
     )
+    # Ký / xác thực request giữa các service nội bộ
+    INTERNAL_SERVICE_SECRET: str = os.environ.get("INTERNAL_SERVICE_SECRET", "")
+    INTERNAL_SIGNATURE_MAX_AGE: int = int(os.environ.get("INTERNAL_SIGNATURE_MAX_AGE", 30))
 
 
 settings = Settings()
@@ -3,6 +3,7 @@ from datetime import timedelta
 import httpx  # Thư viện để gọi API (user-service)
 import redis
 from app.core.config import settings
+from app.core.internal_auth import sign_internal_request
 from app.core.security import (create_access_token, create_refresh_token,
                                verify_password)
 from app.models.token import Token
@@ -39,9 +40,19 @@ async def authenticate_user(email: str, password: str, db_redis: redis.Redis) ->
     try:
         # httpx là thư viện gọi API bất đồng bộ
         async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{settings.USER_SERVICE_URL}/users/by-email/{email}"
+            request = client.build_request(
+                "GET", f"{settings.USER_SERVICE_URL}/users/by-email/{email}"
             )
+            request.headers.update(
+                sign_internal_request(
+                    settings.SERVICE_NAME,
+                    request.method,
+                    request.url.path,
+                    request.url.query,
+                    request.content,
+                )
+            )
+            response = await client.send(request)
 
         if response.status_code == 200:
             user_data = response.json()
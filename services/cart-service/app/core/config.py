@@ -5,6 +5,9 @@ class Settings:
     REDIS_URL: str = os.environ.get("REDIS_URL", "redis://localhost:6379")
     JWT_SECRET_KEY: str = os.environ.get("JWT_SECRET_KEY", "secret")
     JWT_ALGORITHM: str = os.environ.get("JWT_ALGORITHM", "HS256")
+    # Ký / xác thực request giữa các service nội bộ
+    INTERNAL_SERVICE_SECRET: str = os.environ.get("INTERNAL_SERVICE_SECRET", "")
+    INTERNAL_SIGNATURE_MAX_AGE: int = int(os.environ.get("INTERNAL_SIGNATURE_MAX_AGE", 30))
 
 
 settings = Settings()
@@ -1,8 +1,12 @@
 from app.api.v1 import cart
+from app.core.internal_auth import internal_caller_middleware
 from fastapi import FastAPI
 
 app = FastAPI(title="Cart Service")
 
+# Xác thực header ký của service nội bộ (khi được gọi thẳng, không qua gateway)
+app.middleware("http")(internal_caller_middleware)
+
 app.include_router(cart.router, prefix="/api", tags=["cart"])
 
 
@@ -1,4 +1,4 @@
-import os, time, asyncio
+import os, time, asyncio, uuid, copy
 import httpx
 from jose import jwt
 from nicegui import app, ui
@@ -10,6 +10,34 @@ BROWSER_HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
 }
 
+# Cache GET catalog sản phẩm: {url + params: (etag, body)}.
+# Gửi If-None-Match; product-service trả 304 nếu catalog chưa đổi -> dùng lại body cũ.
+CATALOG_CACHE_MAX_ENTRIES = 500
+_catalog_cache = {}
+
+
+async def get_catalog_json(client, url, params=None, timeout=5.0):
+    """GET có điều kiện, trả về (status_code, body); 304 được đổi thành 200 + body đã lưu"""
+    key = url + "?" + "&".join(f"{k}={v}" for k, v in sorted((params or {}).items()))
+    headers = dict(BROWSER_HEADERS)
+    cached = _catalog_cache.get(key)
+    if cached:
+        headers["If-None-Match"] = cached[0]
+    response = await client.get(url, params=params, headers=headers, timeout=timeout)
+    if response.status_code == 304 and cached:
+        return 200, copy.deepcopy(cached[1])
+    if response.status_code != 200:
+        return response.status_code, None
+    body = response.json()
+    etag = response.headers.get("ETag")
+    if etag:
+        _catalog_cache.pop(key, None)
+        if len(_catalog_cache) >= CATALOG_CACHE_MAX_ENTRIES:
+            _catalog_cache.pop(next(iter(_catalog_cache)))
+        _catalog_cache[key] = (etag, copy.deepcopy(body))
+    return 200, body
+
+
 def get_user_role(token):
     try:
         payload = jwt.get_unverified_claims(token)
@@ -79,9 +107,9 @@ async def get_users_api(token):
 async def get_products_api():
     try:
         async with httpx.AsyncClient() as client:
-            response = await client.get(f"{API_BASE_URL}/api/products/", headers=BROWSER_HEADERS, timeout=5.0)
-            if response.status_code == 200:
-                return response.json()
+            status_code, body = await get_catalog_json(client, f"{API_BASE_URL}/api/products/")
+            if status_code == 200:
+                return body
             return []
     except Exception as e:
         print(f"Get Products Error: {e}")
@@ -165,19 +193,46 @@ async def remove_from_cart_api(token, user_email, product_id):
 async def get_product_detail_api(product_id):
     try:
         async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{API_BASE_URL}/api/products/{product_id}", headers=BROWSER_HEADERS, timeout=5.0
+            status_code, body = await get_catalog_json(
+                client, f"{API_BASE_URL}/api/products/{product_id}"
             )
-            if response.status_code == 200:
-                return response.json()
+            if status_code == 200:
+                return body
             return None
     except:
         return None
 
 
-async def create_order_api(token, shipping_address):
+# Số id tối đa trong 1 request GET /api/products/batch?ids=... (giới hạn của product-service)
+PRODUCT_BATCH_MAX_IDS = 200
+
+
+async def get_products_batch_api(product_ids):
+    """Lấy thông tin nhiều sản phẩm (1 request mỗi 200 id), trả về dict {product_id: product}"""
+    products = {}
+    try:
+        async with httpx.AsyncClient() as client:
+            for start in range(0, len(product_ids), PRODUCT_BATCH_MAX_IDS):
+                chunk = product_ids[start:start + PRODUCT_BATCH_MAX_IDS]
+                status_code, body = await get_catalog_json(
+                    client,
+                    f"{API_BASE_URL}/api/products/batch",
+                    params={"ids": ",".join(str(p_id) for p_id in chunk)},
+                )
+                if status_code == 200:
+                    items = body.get("items", {})
+                    products.update({int(p_id): product for p_id, product in items.items()})
+    except Exception as e:
+        print(f"Get Products Batch Error: {e}")
+    return products
+
+
+async def create_order_api(token, shipping_address, idempotency_key=None):
     try:
         headers = {"Authorization": f"Bearer {token}", **BROWSER_HEADERS}
+        if idempotency_key:
+            # Bấm "Đặt hàng" nhiều lần / gửi lại khi timeout không tạo thêm đơn
+            headers["Idempotency-Key"] = idempotency_key
         async with httpx.AsyncClient() as client:
             response = await client.post(
                 f"{API_BASE_URL}/api/orders/",
@@ -194,21 +249,29 @@ async def create_order_api(token, shipping_address):
         print(f"Create Order Error: {e}")
         return False, str(e)
     
-async def get_my_orders_api(token):
+async def get_my_orders_api(token, cursor=None, limit=10):
+    """Lấy 1 trang lịch sử đơn hàng, trả về (orders, next_cursor)"""
     try:
         headers = {"Authorization": f"Bearer {token}", **BROWSER_HEADERS}
+        params = {"limit": limit}
+        if cursor:
+            params["cursor"] = cursor
         async with httpx.AsyncClient() as client:
             response = await client.get(
-                f"{API_BASE_URL}/api/orders/my-orders", headers=headers, timeout=10.0
+                f"{API_BASE_URL}/api/orders/my-orders", params=params, headers=headers, timeout=10.0
             )
             if response.status_code == 200:
-                return response.json()
-            return []
+                return response.json(), response.headers.get("X-Next-Cursor")
+            return [], None
     except Exception as e:
         print(f"Get My Orders Error: {e}")
-        return []
+        return [], None
 
 # --- API INVENTORY ---
+# Số id tối đa trong 1 request GET /api/inventory?ids=... (giới hạn của inventory-service)
+INVENTORY_BULK_MAX_IDS = 500
+
+
 async def get_inventory_api(product_id):
     """Lấy số lượng tồn kho của 1 sản phẩm"""
     try:
@@ -223,6 +286,50 @@ async def get_inventory_api(product_id):
         return 0
 
 
+async def get_inventory_bulk_api(product_ids):
+    """Lấy tồn kho của nhiều sản phẩm (1 request mỗi 500 id), trả về dict {product_id: quantity}"""
+    stock = {}
+    try:
+        async with httpx.AsyncClient() as client:
+            for start in range(0, len(product_ids), INVENTORY_BULK_MAX_IDS):
+                chunk = product_ids[start:start + INVENTORY_BULK_MAX_IDS]
+                response = await client.get(
+                    f"{API_BASE_URL}/api/inventory",
+                    params={"ids": ",".join(str(p_id) for p_id in chunk)},
+                    headers=BROWSER_HEADERS,
+                    timeout=5.0,
+                )
+                if response.status_code == 200:
+                    for item in response.json().get("items", []):
+                        stock[item["product_id"]] = item["quantity"]
+    except Exception as e:
+        print(f"Get Inventory Bulk Error: {e}")
+    return stock
+
+
+async def get_low_stock_api():
+    """Các sản phẩm dưới ngưỡng đặt hàng lại (đọc từ tập dưới ngưỡng, không quét kho)"""
+    items = []
+    try:
+        async with httpx.AsyncClient() as client:
+            after = 0
+            while after is not None:
+                response = await client.get(
+                    f"{API_BASE_URL}/api/inventory/low-stock",
+                    params={"after": after, "limit": INVENTORY_BULK_MAX_IDS},
+                    headers=BROWSER_HEADERS,
+                    timeout=5.0,
+                )
+                if response.status_code != 200:
+                    break
+                data = response.json()
+                items.extend(data.get("items", []))
+                after = data.get("next_after")
+    except Exception as e:
+        print(f"Get Low Stock Error: {e}")
+    return items
+
+
 async def update_inventory_api(token, product_id, change_quantity):
     """Cập nhật số lượng tồn kho (chỉ dành cho Staff/Admin)"""
     try:
@@ -244,7 +351,8 @@ async def update_inventory_api(token, product_id, change_quantity):
 
 
 async def search_products_api(
-    q="", category="", brand="", min_price=0, max_price=999999999, page=1, page_size=20
+    q="", category="", brand="", min_price=0, max_price=999999999, page=1, page_size=20,
+    cursor=None, facets=False,
 ):
     try:
         params = {
@@ -255,19 +363,42 @@ async def search_products_api(
             "max_price": max_price,
             "page": page,
             "page_size": page_size,
+            # Tổng số kết quả được cache phía server, không COUNT lại mỗi lần chuyển trang
+            "total_mode": "cached",
         }
+        if cursor:
+            params["cursor"] = cursor
+        if facets:
+            params["facets"] = "true"
         async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{API_BASE_URL}/api/products/search", params=params, headers=BROWSER_HEADERS, timeout=10.0
+            status_code, body = await get_catalog_json(
+                client, f"{API_BASE_URL}/api/products/search", params=params, timeout=10.0
             )
-            if response.status_code == 200:
-                return response.json()
+            if status_code == 200:
+                return body
             return None
     except Exception as e:
         print(f"Search Products Error: {e}")
         return None
 
 
+async def suggest_products_api(prefix, limit=8):
+    """Gợi ý khi gõ: {"categories": [...], "products": [...]} (lỗi -> rỗng)"""
+    empty = {"categories": [], "products": []}
+    try:
+        async with httpx.AsyncClient() as client:
+            status_code, body = await get_catalog_json(
+                client,
+                f"{API_BASE_URL}/api/products/suggest",
+                params={"prefix": prefix, "limit": limit},
+                timeout=2.0,
+            )
+            return body if status_code == 200 else empty
+    except Exception as e:
+        print(f"Suggest Products Error: {e}")
+        return empty
+
+
 # --- 2. GIAO DIỆN CHUNG (Header/Layout) ---
 def layout_header():
     """Thanh menu điều hướng dùng chung cho các trang"""
@@ -418,7 +549,11 @@ async def products_page():
                         full_image_url = f"http://localhost:8888/api/products{image_path}"
                         
                         # 3. Hiển thị ảnh bằng component của NiceGUI
-                        ui.image(full_image_url).classes('h-48 w-full object-cover')
+                        # Dùng bản thu nhỏ (?size=) thay vì ảnh gốc; srcset cho màn hình mật độ cao
+                        ui.image(f"{full_image_url}?size=320").props(
+                            f'srcset="{full_image_url}?size=320 320w, {full_image_url}?size=640 640w" '
+                            'sizes="(min-width: 1024px) 25vw, (min-width: 640px) 50vw, 100vw"'
+                        ).classes('h-48 w-full object-cover')
                         # --- KẾT THÚC THÊM MỚI ---
                         with ui.column().classes("p-4 flex-grow w-full"):
                             category = p.get("category", "General")
@@ -462,10 +597,11 @@ async def cart_page():
             items = cart_data["items"]
             detailed_list = []
             temp_total = 0.0
+            products = await get_products_batch_api([item["product_id"] for item in items])
             for item in items:
                 p_id = item["product_id"]
                 qty = item["quantity"]
-                product_info = await get_product_detail_api(p_id)
+                product_info = products.get(p_id)
                 if product_info:
                     price = float(product_info["price"])
                     subtotal = price * qty
@@ -586,10 +722,13 @@ async def checkout_page():
     total_price = 0.0
     items_count = 0
     if cart_data and cart_data.get("items"):
+        products = await get_products_batch_api(
+            [item["product_id"] for item in cart_data["items"]]
+        )
         for item in cart_data["items"]:
             p_id = item["product_id"]
             qty = item["quantity"]
-            info = await get_product_detail_api(p_id)
+            info = products.get(p_id)
             if info:
                 total_price += float(info["price"]) * qty
                 items_count += 1
@@ -597,6 +736,9 @@ async def checkout_page():
         ui.navigate.to("/products")
         return
 
+    # 1 key cho mỗi lần mở trang thanh toán (dùng chung cho mọi lần bấm đặt hàng)
+    checkout_key = str(uuid.uuid4())
+
     async def handle_place_order():
         if not name_input.value or not address_input.value or not phone_input.value:
             ui.notify("Vui lòng điền đầy đủ thông tin giao hàng!", type="warning")
@@ -604,7 +746,9 @@ async def checkout_page():
 
         btn_order.props("loading")
         full_shipping_info = f"{name_input.value}, Phone number: {phone_input.value}, Address: {address_input.value}"
-        success, result = await create_order_api(token, full_shipping_info)
+        success, result = await create_order_api(
+            token, full_shipping_info, idempotency_key=checkout_key
+        )
         if success:
             ui.notify(
                 "🎉 Đặt hàng thành công!",
@@ -1020,6 +1164,20 @@ async def admin_inventory_page():
     async def render_inventory_table():
         # Lấy danh sách sản phẩm trước
         products = await get_products_api()
+        # Tồn kho của cả danh sách trong 1 request (thay vì gọi từng sản phẩm)
+        stock = await get_inventory_bulk_api([p["id"] for p in products or []])
+        low_stock = await get_low_stock_api()
+        if low_stock:
+            names = {p["id"]: p["name"] for p in products or []}
+            with ui.card().classes("w-full mb-4 border-l-4 border-red-500"):
+                ui.label(f"Sắp hết hàng ({len(low_stock)})").classes(
+                    "text-lg font-bold text-red-600"
+                )
+                for item in low_stock:
+                    name = names.get(item["product_id"], f"Sản phẩm #{item['product_id']}")
+                    ui.label(
+                        f"{name}: còn {item['quantity']} (ngưỡng {item['threshold']})"
+                    ).classes("text-sm text-slate-700")
         if products:
             with ui.card().classes("w-full"):
                 with ui.row().classes("w-full bg-slate-100 p-3 font-bold"):
@@ -1029,8 +1187,7 @@ async def admin_inventory_page():
                     ui.label("Hành động").classes("flex-grow text-right")
 
                 for p in products:
-                    # Lấy số lượng tồn kho từng món (Hơi chậm nếu list dài, nhưng demo ok)
-                    current_stock = await get_inventory_api(p["id"])
+                    current_stock = stock.get(p["id"], 0)
 
                     with ui.row().classes(
                         "w-full p-3 border-b items-center hover:bg-gray-50"
@@ -1119,7 +1276,7 @@ async def my_orders_page():
                 ui.label('📦 LỊCH SỬ MUA HÀNG').classes('text-3xl font-black text-slate-800 tracking-tight')
                 ui.button('Quay lại', icon="arrow_back", on_click=lambda: ui.navigate.to('/profile')).props("flat").classes('text-gray-600')
 
-            orders = await get_my_orders_api(token)
+            orders, next_cursor = await get_my_orders_api(token)
 
             if not orders:
                 with ui.column().classes("w-full items-center p-16 bg-white rounded-lg border border-gray-200 shadow-sm"):
@@ -1129,7 +1286,7 @@ async def my_orders_page():
                     ui.button('MUA SẮM NGAY', on_click=lambda: ui.navigate.to('/products')).classes('bg-blue-600 text-white px-8 py-2 rounded-full font-bold shadow-md')
                 return
 
-            for order in orders:
+            def render_order_card(order):
                 with ui.card().classes('w-full p-0 mb-6 border border-gray-200 shadow-sm rounded-xl overflow-hidden hover:shadow-md transition-shadow'):
                     # Header của Bill
                     with ui.row().classes('w-full justify-between items-center bg-slate-100 p-5 border-b border-gray-200'):
@@ -1140,7 +1297,7 @@ async def my_orders_page():
                         
                         status = order['status']
                         color = 'text-green-700 bg-green-200' if status == 'COMPLETED' else 'text-orange-700 bg-orange-200'
-                        if status == 'PENDING': color = 'text-blue-700 bg-blue-200'
+                        if status in ['PENDING', 'PROCESSING']: color = 'text-blue-700 bg-blue-200'
                         elif status in ['PAYMENT_FAILED', 'INVENTORY_FAILED']: color = 'text-red-700 bg-red-200'
                         ui.label(status).classes(f'font-bold px-4 py-1.5 rounded-full text-xs tracking-wider {color}')
 
@@ -1167,6 +1324,22 @@ async def my_orders_page():
                         ui.label('Thành tiền').classes('text-slate-500 font-bold uppercase tracking-wider text-sm')
                         ui.label(f"${float(order['total_price']):,.2f}").classes('font-black text-2xl text-red-600')
 
+            orders_container = ui.column().classes('w-full')
+            with orders_container:
+                for order in orders:
+                    render_order_card(order)
+
+            async def load_more():
+                nonlocal next_cursor
+                more_orders, next_cursor = await get_my_orders_api(token, cursor=next_cursor)
+                with orders_container:
+                    for order in more_orders:
+                        render_order_card(order)
+                load_more_btn.set_visibility(bool(next_cursor))
+
+            load_more_btn = ui.button('XEM THÊM ĐƠN HÀNG', on_click=load_more).props("outline").classes('w-full text-slate-600')
+            load_more_btn.set_visibility(bool(next_cursor))
+
 
 # --- TRANG TÌM KIẾM SẢN PHẨM ---
 @ui.page("/search")
@@ -1180,8 +1353,11 @@ async def search_page():
         "min_price": 0,
         "max_price": 999999999,
         "page": 1,
+        # Cursor keyset đã biết của từng trang ({số trang: cursor})
+        "cursors": {},
         "results": None,
         "loading": False,
+        "suggestions": None,
     }
 
     token = app.storage.user.get("token")
@@ -1190,6 +1366,7 @@ async def search_page():
     async def do_search(reset_page=True):
         if reset_page:
             state["page"] = 1
+            state["cursors"] = {}
         state["loading"] = True
         render_results.refresh()
         result = await search_products_api(
@@ -1200,10 +1377,15 @@ async def search_page():
             max_price=state["max_price"],
             page=state["page"],
             page_size=20,
+            cursor=state["cursors"].get(state["page"]),
+            facets=True,
         )
+        if result and result.get("next_cursor"):
+            state["cursors"][state["page"] + 1] = result["next_cursor"]
         state["results"] = result
         state["loading"] = False
         render_results.refresh()
+        render_facets.refresh()
 
     async def go_to_page(new_page):
         state["page"] = new_page
@@ -1224,6 +1406,82 @@ async def search_page():
         else:
             ui.notify("Lỗi khi thêm vào giỏ hàng.", type="negative")
 
+    def pick_category(value):
+        category_input.value = value or ""
+        state["category"] = value or ""
+        asyncio.ensure_future(do_search())
+
+    def pick_price_bucket(bucket):
+        min_price_input.value = bucket["min"]
+        max_price_input.value = bucket["max"]
+        state["min_price"] = bucket["min"] or 0
+        state["max_price"] = bucket["max"] or 999999999
+        asyncio.ensure_future(do_search())
+
+    def pick_suggestion(product_name=None, category=None):
+        if category is not None:
+            category_input.value = category
+            state["category"] = category
+        else:
+            search_input.value = product_name
+            state["q"] = product_name
+        state["suggestions"] = None
+        render_suggestions.refresh()
+        asyncio.ensure_future(do_search())
+
+    @ui.refreshable
+    def render_suggestions():
+        suggestions = state["suggestions"]
+        if not suggestions or not (suggestions["categories"] or suggestions["products"]):
+            return
+        with ui.element("div").style(
+            "position:absolute; top:0; left:24px; right:24px; z-index:50; background:white; "
+            "border-radius:0 0 8px 8px; box-shadow:0 4px 12px rgba(0,0,0,0.15); padding:8px 0"
+        ):
+            for item in suggestions["categories"]:
+                with ui.row().classes(
+                    "w-full items-center gap-2 px-4 py-1 cursor-pointer hover:bg-gray-100"
+                ).on("click", lambda v=item["value"]: pick_suggestion(category=v)):
+                    ui.icon("category", size="18px").classes("text-gray-400")
+                    ui.label(f"Danh mục: {item['value']}")
+                    ui.label(f"({item['count']})").classes("text-gray-400 text-sm")
+            for item in suggestions["products"]:
+                with ui.row().classes(
+                    "w-full items-center gap-2 px-4 py-1 cursor-pointer hover:bg-gray-100"
+                ).on("click", lambda n=item["name"]: pick_suggestion(product_name=n)):
+                    ui.icon("search", size="18px").classes("text-gray-400")
+                    ui.label(item["name"])
+
+    # Số lượng theo danh mục / khoảng giá (facets) trả về cùng kết quả tìm kiếm
+    @ui.refreshable
+    def render_facets():
+        facets = (state["results"] or {}).get("facets")
+        if not facets:
+            return
+        ui.label("Theo danh mục").classes("font-semibold text-gray-700 mt-4 mb-1 text-sm")
+        for item in facets["categories"]:
+            with ui.row().classes(
+                "w-full justify-between cursor-pointer hover:text-green-700 text-sm"
+            ).on("click", lambda v=item["value"]: pick_category(v)):
+                ui.label(item["value"] or "Khác")
+                ui.label(str(item["count"])).classes("text-gray-400")
+
+        ui.label("Theo khoảng giá").classes("font-semibold text-gray-700 mt-4 mb-1 text-sm")
+        for bucket in facets["price"]:
+            if not bucket["count"]:
+                continue
+            if bucket["min"] is None:
+                label = f"Dưới {bucket['max']:,.0f}đ"
+            elif bucket["max"] is None:
+                label = f"Từ {bucket['min']:,.0f}đ"
+            else:
+                label = f"{bucket['min']:,.0f}đ - {bucket['max']:,.0f}đ"
+            with ui.row().classes(
+                "w-full justify-between cursor-pointer hover:text-green-700 text-sm"
+            ).on("click", lambda b=bucket: pick_price_bucket(b)):
+                ui.label(label)
+                ui.label(str(bucket["count"])).classes("text-gray-400")
+
     @ui.refreshable
     def render_results():
         if state["loading"]:
@@ -1340,19 +1598,35 @@ async def search_page():
 
             def on_search_click():
                 state["q"] = search_input.value
+                state["suggestions"] = None
+                render_suggestions.refresh()
                 asyncio.ensure_future(do_search())
 
+            async def on_search_typing():
+                prefix = (search_input.value or "").strip()
+                suggestions = await suggest_products_api(prefix) if prefix else None
+                # Bỏ kết quả của lần gõ cũ về muộn
+                if prefix != (search_input.value or "").strip():
+                    return
+                state["suggestions"] = suggestions
+                render_suggestions.refresh()
+
             search_input = (
                 ui.input(placeholder="Nhập tên sản phẩm cần tìm...")
                 .style("flex:1; background:white; border-radius:6px")
                 .props("outlined dense")
             )
             search_input.on("keydown.enter", lambda: on_search_click())
+            search_input.on("update:model-value", on_search_typing, throttle=0.25)
             ui.button("TÌM KIẾM", icon="search", on_click=on_search_click).style(
                 "background:white; color:#0f172a; font-weight:700; "
                 "border-radius:6px; flex-shrink:0"
             )
 
+        # Danh sách gợi ý nổi ngay dưới thanh tìm kiếm
+        with ui.element("div").style("position:relative; max-width:1200px; margin:0 auto"):
+            render_suggestions()
+
         # Nội dung: sidebar trái cố định + kết quả phải co giãn
         # Dùng plain div để flexbox hoạt động đúng, không bị Quasar override
         with ui.element("div").style(
@@ -1428,6 +1702,7 @@ async def search_page():
                 ui.button("XÓA BỘ LỌC", on_click=reset_filters).props("flat").classes(
                     "w-full text-gray-500"
                 )
+                render_facets()
 
             # Khu vực kết quả — plain div, chiếm phần còn lại
             with ui.element("div").style("flex:1; min-width:0"):
@@ -1,11 +1,209 @@
+import asyncio
+import json
+from typing import Optional
+
+from app.core.internal_auth import require_internal_caller
 from app.db.database import get_db
-from app.models.inventory import InventoryRead, InventoryUpdate
+from app.models.inventory import (HoldConfirm, HoldCreate, HoldRead,
+                                  InventoryBulkRead, InventoryBulkUpdate,
+                                  InventoryListRead, InventoryMovementsRead,
+                                  InventoryRead, InventoryUpdate,
+                                  LowStockListRead, ThresholdRead,
+                                  ThresholdUpdate)
 from app.services import inventory_service as crud
-from fastapi import APIRouter, Depends
+from app.services import stock_holds, stock_ledger
+from app.services.hot_stock import HotStockBusy, hot_stock
+from app.services.low_stock import low_stock
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
 router = APIRouter()
 
+# Giới hạn số id trong 1 request đọc nhiều (tránh mệnh đề IN quá lớn)
+MAX_BULK_IDS = 500
+MAX_LIST_LIMIT = 1000
+MAX_MOVEMENTS_LIMIT = 500
+# Nhân viên kho cập nhật tồn kho qua gateway (X-User-Role do auth_request của gateway gắn)
+STOCK_EDITOR_ROLES = ("ADMIN", "STAFF")
+# Gửi comment giữ kết nối SSE (dưới proxy_read_timeout 60s mặc định của nginx)
+SSE_KEEPALIVE_SECONDS = 15
+
+
+@router.get("/inventory", response_model=InventoryListRead)
+def list_product_stock(
+    ids: str = "",
+    after: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=MAX_LIST_LIMIT),
+    db: Session = Depends(get_db),
+):
+    """
+    API công khai: Tồn kho của nhiều sản phẩm trong 1 request.
+    - ?ids=1,2,3: đúng các sản phẩm này, theo thứ tự; chưa có trong kho -> 0
+    - không có ids: toàn bộ kho theo product_id, trang sau dùng ?after=<next_after>
+    """
+    if ids:
+        try:
+            product_ids = [int(part) for part in ids.split(",") if part.strip()]
+        except ValueError:
+            raise HTTPException(
+                status_code=400, detail="ids must be a comma-separated list of integers"
+            )
+        if len(product_ids) > MAX_BULK_IDS:
+            raise HTTPException(status_code=400, detail=f"Too many ids (max {MAX_BULK_IDS})")
+        return {"items": crud.get_stock_bulk(db, product_ids)}
+
+    items, next_after = crud.list_stock(db, after=after, limit=limit)
+    return {"items": items, "next_after": next_after}
+
+
+def _require_hot_stock():
+    if not hot_stock.enabled:
+        raise HTTPException(
+            status_code=503, detail="Hot stock mode is disabled (HOT_STOCK_ENABLED/REDIS_URL)"
+        )
+
+
+def _require_internal_or_staff(request: Request):
+    if request.headers.get("X-User-Role") in STOCK_EDITOR_ROLES:
+        return
+    require_internal_caller(request)
+
+
+@router.get("/inventory/hot", dependencies=[Depends(_require_internal_or_staff)])
+def list_hot_skus(db: Session = Depends(get_db)):
+    """API nội bộ: Các SKU đang ở chế độ nóng (số lượng Redis + delta chưa ghi MySQL)."""
+    _require_hot_stock()
+    return {"items": hot_stock.list_hot(db), "stats": hot_stock.stats()}
+
+
+@router.post(
+    "/inventory/hot/{product_id}",
+    response_model=InventoryRead,
+    dependencies=[Depends(_require_internal_or_staff)],
+)
+def promote_hot_sku(product_id: int):
+    """
+    API nội bộ: Chuyển SKU sang chế độ nóng (vd: trước flash sale).
+    Từ lúc này số lượng chuẩn nằm ở Redis, MySQL được ghi bù theo batch.
+    """
+    _require_hot_stock()
+    try:
+        quantity = hot_stock.promote(product_id)
+    except HotStockBusy:
+        raise HTTPException(status_code=409, detail="Hot stock flush in progress, retry")
+    return {"product_id": product_id, "quantity": quantity}
+
+
+@router.delete("/inventory/hot/{product_id}", dependencies=[Depends(_require_internal_or_staff)])
+def demote_hot_sku(product_id: int):
+    """API nội bộ: Trả SKU về MySQL (ghi hết delta đang chờ rồi bỏ dấu nóng)."""
+    _require_hot_stock()
+    try:
+        removed = hot_stock.demote(product_id)
+    except HotStockBusy:
+        raise HTTPException(status_code=409, detail="Hot stock flush in progress, retry")
+    if not removed:
+        raise HTTPException(status_code=404, detail="Product is not in hot stock mode")
+    return {"product_id": product_id, "demoted": True}
+
+
+@router.post(
+    "/inventory/holds",
+    response_model=HoldRead,
+    status_code=201,
+    dependencies=[Depends(require_internal_caller)],
+)
+def create_stock_hold(hold_in: HoldCreate, db: Session = Depends(get_db)):
+    """
+    API nội bộ: Giữ hàng khi checkout (Order Service gọi 1 lần trước khi tạo đơn).
+    Tất cả món được giữ hoặc không món nào (400 nếu không đủ hàng); hết ttl_seconds
+    mà chưa confirm thì hàng tự trả lại kho. Gửi lại cùng request_id trả về hold cũ.
+    """
+    return stock_holds.create_hold(db, hold_in)
+
+
+@router.get("/inventory/holds/{hold_id}", response_model=HoldRead)
+def get_stock_hold(hold_id: str, db: Session = Depends(get_db)):
+    return stock_holds.get_hold(db, hold_id)
+
+
+@router.post(
+    "/inventory/holds/{hold_id}/confirm",
+    response_model=HoldRead,
+    dependencies=[Depends(require_internal_caller)],
+)
+def confirm_stock_hold(
+    hold_id: str, confirm_in: Optional[HoldConfirm] = None, db: Session = Depends(get_db)
+):
+    """API nội bộ: Xác nhận hold (đã thanh toán). 409 nếu hold đã hết hạn / đã hủy."""
+    order_id = confirm_in.order_id if confirm_in else None
+    return stock_holds.confirm_hold(db, hold_id, order_id=order_id)
+
+
+@router.post(
+    "/inventory/holds/{hold_id}/release",
+    response_model=HoldRead,
+    dependencies=[Depends(require_internal_caller)],
+)
+def release_stock_hold(hold_id: str, db: Session = Depends(get_db)):
+    """API nội bộ: Hủy hold, trả hàng lại kho. 409 nếu hold đã được xác nhận."""
+    return stock_holds.release_hold(db, hold_id)
+
+
+@router.get("/inventory/low-stock", response_model=LowStockListRead)
+def list_low_stock(
+    after: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=MAX_BULK_IDS),
+    db: Session = Depends(get_db),
+):
+    """
+    API nội bộ: Các sản phẩm đang dưới ngưỡng đặt hàng lại (quantity <= threshold), theo product_id.
+    Đọc từ tập dưới ngưỡng (không quét kho); trang sau dùng ?after=<next_after>.
+    """
+    members, next_after = low_stock.list_members(db, after=after, limit=limit)
+    stock = crud.get_stock_bulk(db, [member.product_id for member in members])
+    items = [
+        {
+            "product_id": member.product_id,
+            "quantity": item.quantity,
+            "threshold": member.threshold,
+            "since": member.since,
+        }
+        for member, item in zip(members, stock)
+    ]
+    return {"items": items, "next_after": next_after}
+
+
+@router.get("/inventory/low-stock/stream")
+async def stream_low_stock(request: Request):
+    """
+    API nội bộ: Server-Sent Events khi sản phẩm vượt ngưỡng
+    (event: low = xuống dưới ngưỡng, event: recovered = đã nhập đủ hàng).
+    Client kết nối lại nên gọi GET /inventory/low-stock để lấy lại trạng thái đầy đủ.
+    """
+    queue = low_stock.subscribe()
+
+    async def events():
+        try:
+            yield "retry: 5000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    payload = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {payload['event']}\ndata: {json.dumps(payload)}\n\n"
+        finally:
+            low_stock.unsubscribe(queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Tắt buffer của nginx (gateway) cho riêng response này
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 
 @router.get("/inventory/{product_id}", response_model=InventoryRead)
 def get_product_stock(product_id: int, db: Session = Depends(get_db)):
@@ -13,10 +211,84 @@ def get_product_stock(product_id: int, db: Session = Depends(get_db)):
     return crud.get_stock(db, product_id)
 
 
-@router.post("/inventory/update", response_model=InventoryRead)
+@router.get("/inventory/{product_id}/movements", response_model=InventoryMovementsRead)
+def list_product_movements(
+    product_id: int,
+    before: Optional[int] = Query(None, ge=1),
+    limit: int = Query(100, ge=1, le=MAX_MOVEMENTS_LIMIT),
+    db: Session = Depends(get_db),
+):
+    """
+    API nội bộ: Lịch sử thay đổi tồn kho của 1 sản phẩm (sổ cái), mới nhất trước.
+    SKU nóng: các thay đổi xuất hiện sau lần flush kế tiếp.
+    """
+    items = stock_ledger.list_movements(db, product_id, before=before, limit=limit)
+    next_before = items[-1].id if len(items) == limit else None
+    return {"items": items, "next_before": next_before}
+
+
+def _threshold_read(db: Session, product_id: int, custom: bool) -> dict:
+    """Đánh giá lại ngay sản phẩm với ngưỡng mới (có thể phát sự kiện vượt ngưỡng)"""
+    quantity = crud.get_stock(db, product_id).quantity
+    low_stock.observe({product_id: quantity})
+    threshold = low_stock.threshold(product_id)
+    return {
+        "product_id": product_id,
+        "threshold": threshold,
+        "custom": custom,
+        "quantity": quantity,
+        "low": 0 <= threshold and quantity <= threshold,
+    }
+
+
+@router.put(
+    "/inventory/{product_id}/threshold",
+    response_model=ThresholdRead,
+    dependencies=[Depends(_require_internal_or_staff)],
+)
+def set_product_threshold(
+    product_id: int, threshold_in: ThresholdUpdate, db: Session = Depends(get_db)
+):
+    """API nội bộ: Đặt ngưỡng đặt hàng lại riêng cho 1 sản phẩm (số âm = không cảnh báo)."""
+    low_stock.set_threshold(db, product_id, threshold_in.threshold)
+    return _threshold_read(db, product_id, custom=True)
+
+
+@router.delete(
+    "/inventory/{product_id}/threshold",
+    response_model=ThresholdRead,
+    dependencies=[Depends(_require_internal_or_staff)],
+)
+def clear_product_threshold(product_id: int, db: Session = Depends(get_db)):
+    """API nội bộ: Bỏ ngưỡng riêng, sản phẩm dùng lại LOW_STOCK_DEFAULT_THRESHOLD."""
+    if not low_stock.clear_threshold(db, product_id):
+        raise HTTPException(status_code=404, detail="Product has no custom threshold")
+    return _threshold_read(db, product_id, custom=False)
+
+
+@router.post(
+    "/inventory/update",
+    response_model=InventoryRead,
+    dependencies=[Depends(_require_internal_or_staff)],
+)
 def update_product_stock(update_data: InventoryUpdate, db: Session = Depends(get_db)):
     """
-    API nội bộ: Cập nhật kho (Order Service sẽ gọi cái này).
-    (Sau này sẽ bảo vệ API này, chỉ cho service nội bộ gọi)
+    API nội bộ: Cập nhật kho (Order Service / nhân viên kho qua gateway).
+    Khi đã cấu hình INTERNAL_SERVICE_SECRET: chỉ service nội bộ (có chữ ký) hoặc ADMIN / STAFF.
     """
     return crud.update_stock(db, update_data)
+
+
+@router.post(
+    "/inventory/bulk-update",
+    response_model=InventoryBulkRead,
+    dependencies=[Depends(require_internal_caller)],
+)
+def bulk_update_product_stock(
+    bulk_data: InventoryBulkUpdate, db: Session = Depends(get_db)
+):
+    """
+    API nội bộ: Cập nhật kho cho nhiều sản phẩm trong 1 transaction.
+    Nếu 1 sản phẩm không đủ hàng thì không sản phẩm nào bị trừ.
+    """
+    return {"items": crud.update_stock_bulk(db, bulk_data)}
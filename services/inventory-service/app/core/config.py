@@ -11,5 +11,43 @@ class Settings:
     # URL kết nối SQLAlchemy, sử dụng pymysql
     DATABASE_URL = f"mysql+pymysql://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DB}"
 
+    # Ký / xác thực request giữa các service nội bộ
+    INTERNAL_SERVICE_SECRET = os.environ.get("INTERNAL_SERVICE_SECRET", "")
+    INTERNAL_SIGNATURE_MAX_AGE = int(os.environ.get("INTERNAL_SIGNATURE_MAX_AGE", 30))
+
+    # Redis (chỉ cần khi bật HOT_STOCK_ENABLED)
+    REDIS_URL = os.environ.get("REDIS_URL", "")
+    # Chế độ SKU nóng: số lượng của các SKU được promote nằm ở Redis (trừ bằng Lua),
+    # ghi bù (write-behind) vào MySQL mỗi HOT_STOCK_FLUSH_INTERVAL giây
+    HOT_STOCK_ENABLED = os.environ.get("HOT_STOCK_ENABLED", "false").lower() == "true"
+    HOT_STOCK_FLUSH_INTERVAL = float(os.environ.get("HOT_STOCK_FLUSH_INTERVAL", 1))
+    # Chu kỳ đối soát Redis <-> MySQL (sửa lệch sau crash / Redis mất dữ liệu)
+    HOT_STOCK_RECONCILE_INTERVAL = float(os.environ.get("HOT_STOCK_RECONCILE_INTERVAL", 60))
+    # Thời gian tối đa 1 request chờ SKU chuyển chế độ (promote/demote) trước khi trả 503
+    HOT_STOCK_TRANSITION_WAIT = float(os.environ.get("HOT_STOCK_TRANSITION_WAIT", 2))
+
+    # Sổ cái tồn kho (inventory_movements): mỗi thay đổi là 1 dòng chỉ thêm (kèm order_id/request_id).
+    # Nhập kho (số dương) chỉ INSERT, không khóa hàng inventory; định kỳ được gộp (compaction)
+    # vào bảng inventory (snapshot). Số lượng đọc = snapshot + phần chưa gộp.
+    STOCK_LEDGER_ENABLED = os.environ.get("STOCK_LEDGER_ENABLED", "true").lower() == "true"
+    STOCK_LEDGER_COMPACT_INTERVAL = float(os.environ.get("STOCK_LEDGER_COMPACT_INTERVAL", 5))
+    # Số dòng chưa gộp xử lý trong 1 transaction compaction
+    STOCK_LEDGER_COMPACT_BATCH = int(os.environ.get("STOCK_LEDGER_COMPACT_BATCH", 5000))
+
+    # Giữ hàng (hold) khi checkout: số lượng bị trừ khỏi "có thể bán" ngay, hết hạn thì trả lại
+    STOCK_HOLD_DEFAULT_TTL = int(os.environ.get("STOCK_HOLD_DEFAULT_TTL", 600))
+    STOCK_HOLD_MAX_TTL = int(os.environ.get("STOCK_HOLD_MAX_TTL", 3600))
+    # Quét DB tìm hold quá hạn (hold do instance khác tạo / còn sót sau khi restart);
+    # hold do instance này tạo hết hạn đúng giờ nhờ heap trong bộ nhớ
+    STOCK_HOLD_SWEEP_INTERVAL = float(os.environ.get("STOCK_HOLD_SWEEP_INTERVAL", 30))
+
+    # Cảnh báo sắp hết hàng: sản phẩm có quantity <= ngưỡng nằm trong tập "dưới ngưỡng".
+    # Ngưỡng mặc định cho sản phẩm chưa đặt ngưỡng riêng (số âm = không theo dõi)
+    LOW_STOCK_DEFAULT_THRESHOLD = int(os.environ.get("LOW_STOCK_DEFAULT_THRESHOLD", 0))
+    # Nạp lại ngưỡng / tập dưới ngưỡng (thay đổi từ instance khác) và kiểm tra lại các thành viên
+    LOW_STOCK_REFRESH_INTERVAL = float(os.environ.get("LOW_STOCK_REFRESH_INTERVAL", 30))
+    # Số sản phẩm mỗi trang khi dựng lại tập dưới ngưỡng lúc khởi động
+    LOW_STOCK_REBUILD_BATCH = int(os.environ.get("LOW_STOCK_REBUILD_BATCH", 1000))
+
 
 settings = Settings()
@@ -1,3 +1,4 @@
+import redis
 from app.core.config import settings
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
@@ -7,6 +8,14 @@ engine = create_engine(settings.DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Redis dùng cho chế độ SKU nóng (HOT_STOCK_ENABLED) và phát sự kiện sắp hết hàng giữa các
+# instance; không cấu hình thì None
+redis_client = (
+    redis.Redis.from_url(settings.REDIS_URL, socket_timeout=0.5, socket_connect_timeout=0.5)
+    if settings.REDIS_URL
+    else None
+)
+
 
 def get_db():
     db = SessionLocal()
@@ -1,5 +1,7 @@
 from app.db.database import Base
-from sqlalchemy import Column, Integer
+from sqlalchemy import (BigInteger, Boolean, Column, DateTime, ForeignKey, Index,
+                        Integer, String, func)
+from sqlalchemy.orm import relationship
 
 
 class Inventory(Base):
@@ -10,3 +12,101 @@ class Inventory(Base):
     # product_id phải là duy nhất (unique)
     product_id = Column(Integer, unique=True, index=True, nullable=False)
     quantity = Column(Integer, nullable=False, default=0)
+
+
+# SKU "nóng" (flash sale): số lượng chuẩn nằm ở Redis, bảng inventory được ghi bù theo batch.
+# Bảng riêng (không thêm cột vào inventory) vì dự án chưa có migration.
+class InventoryHotSku(Base):
+    __tablename__ = "inventory_hot_skus"
+
+    product_id = Column(Integer, primary_key=True, autoincrement=False)
+    promoted_at = Column(DateTime, server_default=func.now())
+
+
+# 1 dòng duy nhất: batch write-behind cuối cùng đã ghi vào inventory (để ghi lại sau crash không bị cộng 2 lần)
+class InventoryFlushState(Base):
+    __tablename__ = "inventory_flush_state"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    last_batch_id = Column(String(36), nullable=True)
+    flushed_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
+# Sổ cái tồn kho: chỉ thêm, không sửa nội dung (chỉ cờ compacted đổi khi được gộp vào inventory).
+# compacted = False: thay đổi chưa có trong inventory.quantity (số lượng đọc phải cộng thêm)
+class InventoryMovement(Base):
+    __tablename__ = "inventory_movements"
+    __table_args__ = (
+        # Tổng phần chưa gộp của 1 sản phẩm (đọc / kiểm tra trừ kho)
+        Index("ix_inventory_movements_product_pending", "product_id", "compacted"),
+        # Compaction quét các dòng chưa gộp theo thứ tự id
+        Index("ix_inventory_movements_pending", "compacted", "id"),
+    )
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    product_id = Column(Integer, nullable=False)
+    change_quantity = Column(Integer, nullable=False)
+    order_id = Column(Integer, nullable=True, index=True)
+    request_id = Column(String(64), nullable=True, index=True)
+    compacted = Column(Boolean, nullable=False, default=False)
+    created_at = Column(DateTime, server_default=func.now())
+
+
+# request_id đã được bulk-update áp dụng: ghi cùng transaction với thay đổi kho, khóa chính
+# chặn việc 1 request gửi lại (retry sau khi mất response) trừ kho lần 2
+class InventoryRequest(Base):
+    __tablename__ = "inventory_requests"
+
+    request_id = Column(String(64), primary_key=True)
+    created_at = Column(DateTime, server_default=func.now())
+
+
+# Giữ hàng khi checkout: số lượng đã bị trừ khỏi tồn kho (có thể bán) lúc tạo hold.
+# RESERVING (đã ghi hold, đang trừ kho) -> ACTIVE -> CONFIRMED (bán xong, không đổi kho)
+# | RELEASING / EXPIRING -> RELEASED / EXPIRED
+# (trả lại kho; kẹt ở RELEASING / EXPIRING nếu trả hàng lỗi, sweeper thử lại)
+class InventoryHold(Base):
+    __tablename__ = "inventory_holds"
+    __table_args__ = (
+        # Sweeper: các hold ACTIVE theo thời điểm hết hạn
+        Index("ix_inventory_holds_status_expires", "status", "expires_at"),
+    )
+
+    id = Column(String(36), primary_key=True)
+    status = Column(String(20), nullable=False, default="ACTIVE")
+    expires_at = Column(DateTime, nullable=False)
+    order_id = Column(Integer, nullable=True, index=True)
+    # Tạo lại hold với cùng request_id (client retry) trả về hold cũ thay vì giữ thêm hàng
+    request_id = Column(String(64), nullable=True, unique=True)
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+    items = relationship("InventoryHoldItem", lazy="selectin", order_by="InventoryHoldItem.product_id")
+
+
+class InventoryHoldItem(Base):
+    __tablename__ = "inventory_hold_items"
+
+    id = Column(Integer, primary_key=True)
+    hold_id = Column(String(36), ForeignKey("inventory_holds.id"), nullable=False, index=True)
+    product_id = Column(Integer, nullable=False, index=True)
+    quantity = Column(Integer, nullable=False)
+
+
+# Ngưỡng đặt hàng lại riêng của từng sản phẩm (không có dòng -> LOW_STOCK_DEFAULT_THRESHOLD)
+class InventoryThreshold(Base):
+    __tablename__ = "inventory_thresholds"
+
+    product_id = Column(Integer, primary_key=True, autoincrement=False)
+    threshold = Column(Integer, nullable=False)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
+# Tập "dưới ngưỡng" (quantity <= threshold) được duy trì dần theo từng lần cập nhật kho:
+# chỉ INSERT / DELETE khi sản phẩm vượt qua ngưỡng, dashboard đọc bảng nhỏ này thay vì quét kho
+class InventoryLowStock(Base):
+    __tablename__ = "inventory_low_stock"
+
+    product_id = Column(Integer, primary_key=True, autoincrement=False)
+    threshold = Column(Integer, nullable=False)
+    since = Column(DateTime, server_default=func.now())
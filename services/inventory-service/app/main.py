@@ -1,11 +1,85 @@
+import logging
+import threading
+from contextlib import asynccontextmanager
+
 from app.api.v1 import inventory
-from app.db.database import Base, engine
+from app.core.internal_auth import internal_caller_middleware
+from app.db import models
+from app.core.config import settings
+from app.db.database import Base, SessionLocal, engine, redis_client
+from app.services import inventory_service as crud
+from app.services import stock_ledger
+from app.services.hot_stock import hot_stock
+from app.services.low_stock import low_stock
+from app.services.stock_holds import hold_sweeper
 from fastapi import FastAPI
 
+logger = logging.getLogger(__name__)
+
 # Yêu cầu SQLAlchemy tạo bảng "inventory" khi khởi động
 Base.metadata.create_all(bind=engine)
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Gộp phần sổ cái còn lại từ lần chạy trước (kể cả khi vừa tắt STOCK_LEDGER_ENABLED,
+    # lúc đó số lượng đọc chỉ còn là snapshot)
+    compacted = stock_ledger.compact()
+    if compacted:
+        logger.info("Stock ledger: compacted %s movements at startup", compacted)
+    stop_flusher = threading.Event()
+    if settings.STOCK_LEDGER_ENABLED:
+        threading.Thread(
+            target=stock_ledger.run_compactor,
+            args=(stop_flusher,),
+            name="stock-ledger-compactor",
+            daemon=True,
+        ).start()
+    if hot_stock.enabled:
+        # Đối soát lúc khởi động (nạp lại key nếu Redis mất dữ liệu), rồi flush định kỳ
+        threading.Thread(
+            target=hot_stock.run_background,
+            args=(stop_flusher,),
+            name="hot-stock-flusher",
+            daemon=True,
+        ).start()
+    else:
+        db = SessionLocal()
+        try:
+            if db.query(models.InventoryHotSku).first() is not None:
+                logger.warning(
+                    "Hot stock mode is disabled but some SKUs are still marked hot; "
+                    "their MySQL quantities may miss unflushed Redis deltas"
+                )
+        finally:
+            db.close()
+    # Hết hạn hold: nạp các hold còn ACTIVE vào heap rồi chạy sweeper
+    hold_sweeper.load_active()
+    threading.Thread(target=hold_sweeper.run, name="stock-hold-sweeper", daemon=True).start()
+    # Tập dưới ngưỡng: dựng lại 1 lần (quét kho theo trang, chạy nền), rồi nạp lại định kỳ
+    threading.Thread(
+        target=low_stock.run,
+        args=(stop_flusher, crud.list_stock, crud.get_stock_bulk),
+        name="low-stock-monitor",
+        daemon=True,
+    ).start()
+    if redis_client is not None:
+        # Sự kiện vượt ngưỡng từ mọi instance -> client SSE của instance này
+        threading.Thread(
+            target=low_stock.listen,
+            args=(stop_flusher,),
+            name="low-stock-events",
+            daemon=True,
+        ).start()
+    yield
+    stop_flusher.set()
+    hold_sweeper.stop()
+
+
+app = FastAPI(lifespan=lifespan)
+
+# Xác thực header ký của service nội bộ (khi được gọi thẳng, không qua gateway)
+app.middleware("http")(internal_caller_middleware)
 
 app.include_router(inventory.router, prefix="/api", tags=["inventory"])
 
@@ -14,3 +88,27 @@ app.include_router(inventory.router, prefix="/api", tags=["inventory"])
 def read_root():
     """Endpoint Healthcheck"""
     return {"service": "Inventory Service is running"}
+
+
+@app.get("/metrics/hot-stock")
+def read_hot_stock_stats():
+    return hot_stock.stats()
+
+
+@app.get("/metrics/stock-holds")
+def read_stock_hold_stats():
+    return hold_sweeper.stats()
+
+
+@app.get("/metrics/low-stock")
+def read_low_stock_stats():
+    return low_stock.stats()
+
+
+@app.get("/metrics/stock-ledger")
+def read_stock_ledger_stats():
+    db = SessionLocal()
+    try:
+        return stock_ledger.stats(db)
+    finally:
+        db.close()
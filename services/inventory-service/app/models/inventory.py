@@ -1,10 +1,16 @@
-from pydantic import BaseModel
+from datetime import datetime
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
 
 
 # Schema để đọc dữ liệu (GET)
+# quantity = số lượng có thể bán; reserved = đang được giữ bởi các hold ACTIVE
+# (tồn kho thực tế = quantity + reserved)
 class InventoryRead(BaseModel):
     product_id: int
     quantity: int
+    reserved: int = 0
 
     class Config:
         from_attributes = True  # Cho phép Pydantic đọc từ SQLAlchemy
@@ -12,6 +18,109 @@ class InventoryRead(BaseModel):
 
 # Schema để cập nhật (POST/PUT)
 # 'change_quantity' có thể là số âm (khi bán) hoặc số dương (khi nhập)
+# order_id / request_id (tùy chọn) được lưu vào sổ cái inventory_movements để đối soát
 class InventoryUpdate(BaseModel):
     product_id: int
     change_quantity: int
+    order_id: Optional[int] = None
+    request_id: Optional[str] = Field(None, max_length=64)
+
+
+# Schema cập nhật nhiều sản phẩm trong 1 transaction (tất cả hoặc không gì cả)
+class InventoryBulkUpdate(BaseModel):
+    items: List[InventoryUpdate]
+    # Ghi cho mọi dòng sổ cái của lần cập nhật này (order_id/request_id trong từng item bị bỏ qua).
+    # request_id đã được áp dụng thì gửi lại chỉ trả về số lượng hiện tại, không trừ/cộng lần 2
+    order_id: Optional[int] = None
+    request_id: Optional[str] = Field(None, max_length=64)
+
+
+class InventoryBulkRead(BaseModel):
+    items: List[InventoryRead] = []
+
+
+# Đọc nhiều sản phẩm (?ids=...) hoặc liệt kê toàn bộ kho theo trang
+# next_after: truyền lại vào ?after= để lấy trang sau (None = hết)
+class InventoryListRead(BaseModel):
+    items: List[InventoryRead] = []
+    next_after: Optional[int] = None
+
+
+# 1 dòng sổ cái; compacted = đã được gộp vào số lượng snapshot (bảng inventory)
+class InventoryMovementRead(BaseModel):
+    id: int
+    product_id: int
+    change_quantity: int
+    order_id: Optional[int] = None
+    request_id: Optional[str] = None
+    compacted: bool
+    created_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+# Lịch sử thay đổi của 1 sản phẩm, mới nhất trước; trang sau dùng ?before=<next_before>
+class InventoryMovementsRead(BaseModel):
+    items: List[InventoryMovementRead] = []
+    next_before: Optional[int] = None
+
+
+class HoldItem(BaseModel):
+    product_id: int
+    quantity: int = Field(..., gt=0)
+
+    class Config:
+        from_attributes = True
+
+
+# Tạo hold: giữ tất cả món hoặc không món nào; ttl_seconds mặc định STOCK_HOLD_DEFAULT_TTL
+class HoldCreate(BaseModel):
+    items: List[HoldItem] = Field(..., min_length=1)
+    ttl_seconds: Optional[int] = Field(None, gt=0)
+    order_id: Optional[int] = None
+    request_id: Optional[str] = Field(None, max_length=64)
+
+
+class HoldRead(BaseModel):
+    id: str
+    status: str
+    expires_at: datetime
+    order_id: Optional[int] = None
+    request_id: Optional[str] = None
+    items: List[HoldItem] = []
+
+    class Config:
+        from_attributes = True
+
+
+# Xác nhận hold (thanh toán xong); order_id ghi vào hold nếu lúc tạo chưa có
+class HoldConfirm(BaseModel):
+    order_id: Optional[int] = None
+
+
+# Ngưỡng đặt hàng lại: quantity <= threshold -> sản phẩm vào tập dưới ngưỡng (số âm = không theo dõi)
+class ThresholdUpdate(BaseModel):
+    threshold: int
+
+
+class ThresholdRead(BaseModel):
+    product_id: int
+    threshold: int
+    # False = đang dùng LOW_STOCK_DEFAULT_THRESHOLD
+    custom: bool
+    quantity: int
+    low: bool
+
+
+# 1 sản phẩm dưới ngưỡng; quantity đọc lúc gọi API, since = lúc vượt xuống dưới ngưỡng
+class LowStockItem(BaseModel):
+    product_id: int
+    quantity: int
+    threshold: int
+    since: Optional[datetime] = None
+
+
+class LowStockListRead(BaseModel):
+    items: List[LowStockItem] = []
+    next_after: Optional[int] = None
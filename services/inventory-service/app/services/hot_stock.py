@@ -0,0 +1,509 @@
+import logging
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+import redis
+from app.core.config import settings
+from app.db import models
+from app.db.database import SessionLocal, redis_client
+from app.services import stock_ledger
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+QTY_KEY = "stock:qty:{}"
+# Delta chưa ghi vào MySQL: {product_id: tổng thay đổi}
+PENDING_KEY = "stock:pending"
+# Batch đang được ghi vào MySQL (pending được RENAME sang đây) + id của batch
+FLUSHING_KEY = "stock:flushing"
+FLUSHING_BATCH_KEY = "stock:flushing:batch"
+# Từng thay đổi (cho sổ cái inventory_movements): "product_id|delta|ts|order_id|request_id",
+# được ghi vào MySQL cùng batch với pending
+MOVEMENTS_KEY = "stock:movements"
+FLUSHING_MOVEMENTS_KEY = "stock:flushing:movements"
+# Chỉ 1 tiến trình được flush / đối soát / promote / demote tại 1 thời điểm
+LOCK_KEY = "stock:flush-lock"
+LOCK_TTL_MS = 30_000
+FLUSH_STATE_ID = 1
+
+# Kiểm tra-rồi-trừ nguyên tử cho 1 hoặc nhiều SKU (tất cả hoặc không gì cả).
+# KEYS = các key số lượng..., PENDING_KEY, MOVEMENTS_KEY
+# ARGV = product_id, thay đổi (từng cặp)..., "ts|order_id|request_id"
+# Trả về {1, số lượng mới...} | {0, vị trí, số lượng hiện có} (không đủ) | {-1, vị trí} (không phải SKU nóng)
+_APPLY_LUA = """
+local n = #KEYS - 2
+local pending = KEYS[n + 1]
+local meta = ARGV[#ARGV]
+local updated = {}
+for i = 1, n do
+    local current = redis.call('GET', KEYS[i])
+    if not current then
+        return {-1, i}
+    end
+    local new = tonumber(current) + tonumber(ARGV[2 * i])
+    if new < 0 then
+        return {0, i, tonumber(current)}
+    end
+    updated[i] = new
+end
+local result = {1}
+for i = 1, n do
+    redis.call('SET', KEYS[i], updated[i])
+    redis.call('HINCRBY', pending, ARGV[2 * i - 1], ARGV[2 * i])
+    redis.call('RPUSH', KEYS[n + 2], ARGV[2 * i - 1] .. '|' .. ARGV[2 * i] .. '|' .. meta)
+    result[i + 1] = updated[i]
+end
+return result
+"""
+
+# Hoàn lại thay đổi đã áp dụng (phần MySQL của cùng đơn thất bại). Luôn ghi vào pending
+# để flusher cộng vào MySQL kể cả khi SKU vừa bị demote (key số lượng đã xóa).
+_REVERT_LUA = """
+local n = #KEYS - 2
+local pending = KEYS[n + 1]
+local meta = ARGV[#ARGV]
+for i = 1, n do
+    if redis.call('EXISTS', KEYS[i]) == 1 then
+        redis.call('INCRBY', KEYS[i], ARGV[2 * i])
+    end
+    redis.call('HINCRBY', pending, ARGV[2 * i - 1], ARGV[2 * i])
+    redis.call('RPUSH', KEYS[n + 2], ARGV[2 * i - 1] .. '|' .. ARGV[2 * i] .. '|' .. meta)
+end
+return n
+"""
+
+# Lấy batch cần ghi: batch cũ còn dang dở (crash giữa chừng) hoặc chuyển pending -> flushing
+# KEYS = PENDING, FLUSHING, FLUSHING_BATCH, MOVEMENTS, FLUSHING_MOVEMENTS
+_TAKE_BATCH_LUA = """
+if redis.call('EXISTS', KEYS[2]) == 0 then
+    if redis.call('EXISTS', KEYS[1]) == 0 then
+        return false
+    end
+    redis.call('RENAME', KEYS[1], KEYS[2])
+    if redis.call('EXISTS', KEYS[4]) == 1 then
+        redis.call('RENAME', KEYS[4], KEYS[5])
+    end
+    redis.call('SET', KEYS[3], ARGV[1])
+end
+local batch_id = redis.call('GET', KEYS[3])
+if not batch_id then
+    batch_id = ARGV[1]
+    redis.call('SET', KEYS[3], batch_id)
+end
+return {batch_id, redis.call('HGETALL', KEYS[2]), redis.call('LRANGE', KEYS[5], 0, -1)}
+"""
+
+# Xóa batch đã ghi xong (chỉ khi vẫn đúng batch đó)
+# KEYS = FLUSHING, FLUSHING_BATCH, FLUSHING_MOVEMENTS
+_FINISH_BATCH_LUA = """
+if redis.call('GET', KEYS[2]) == ARGV[1] then
+    redis.call('DEL', KEYS[1], KEYS[2], KEYS[3])
+    return 1
+end
+return 0
+"""
+
+# Đối soát: số lượng đúng = MySQL + pending. Thiếu key -> nạp lại; lệch -> đưa phần lệch
+# vào pending (Redis là nguồn chuẩn của SKU nóng, MySQL sẽ được ghi bù).
+# KEYS = các key số lượng..., PENDING_KEY, MOVEMENTS_KEY
+# ARGV = product_id, số lượng MySQL (từng cặp)..., "ts|order_id|request_id" cho dòng sổ cái sửa lệch
+_RECONCILE_LUA = """
+local n = #KEYS - 2
+local pending = KEYS[n + 1]
+local meta = ARGV[#ARGV]
+local repaired = {}
+for i = 1, n do
+    local product_id = ARGV[2 * i - 1]
+    local expected = tonumber(ARGV[2 * i]) + tonumber(redis.call('HGET', pending, product_id) or '0')
+    local current = redis.call('GET', KEYS[i])
+    if not current then
+        redis.call('SET', KEYS[i], expected)
+        table.insert(repaired, {product_id, 'loaded', expected})
+    elseif tonumber(current) ~= expected then
+        redis.call('HINCRBY', pending, product_id, tonumber(current) - expected)
+        redis.call('RPUSH', KEYS[n + 2], product_id .. '|' .. (tonumber(current) - expected) .. '|' .. meta)
+        table.insert(repaired, {product_id, 'drift', tonumber(current) - expected})
+    end
+end
+return repaired
+"""
+
+_RELEASE_LOCK_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+NOT_HOT = object()
+
+
+def _movement_meta(order_id: Optional[int] = None, request_id: Optional[str] = None) -> str:
+    return f"{time.time():.6f}|{order_id or ''}|{request_id or ''}"
+
+
+def _parse_movement(entry: bytes) -> dict:
+    product_id, change_quantity, ts, order_id, request_id = entry.decode().split("|", 4)
+    return stock_ledger.movement_row(
+        int(product_id),
+        int(change_quantity),
+        datetime.utcfromtimestamp(float(ts)),
+        order_id=int(order_id) if order_id else None,
+        request_id=request_id or None,
+    )
+
+
+class InsufficientStock(Exception):
+    def __init__(self, product_id: int, available: int):
+        super().__init__(f"product {product_id}: only {available} left")
+        self.product_id = product_id
+        self.available = available
+
+
+class HotStockBusy(Exception):
+    """Tiến trình khác đang flush / promote / demote, thử lại sau"""
+
+
+class HotStock:
+    """
+    Số lượng tồn kho của SKU nóng nằm ở Redis, trừ bằng Lua (kiểm tra-rồi-trừ nguyên tử,
+    không khóa hàng MySQL). Mỗi thay đổi cộng dồn vào hash pending; flusher định kỳ ghi
+    tổng delta của mỗi SKU vào bảng inventory trong 1 transaction.
+
+    Bất biến của SKU nóng: số lượng Redis = số lượng MySQL (snapshot + phần sổ cái chưa gộp)
+    + pending (+ batch đang ghi). Từng thay đổi được giữ trong 1 list Redis và ghi vào sổ cái
+    inventory_movements cùng batch.
+    Batch đang ghi có id lưu cả ở Redis và trong inventory_flush_state (cùng transaction
+    với UPDATE), nên crash giữa chừng thì lần sau biết batch đã vào MySQL hay chưa.
+    Đối soát (reconcile) nạp lại key bị mất và đưa phần lệch vào pending.
+
+    SKU nào nóng được đánh dấu trong bảng inventory_hot_skus; đường MySQL kiểm tra dấu
+    này sau khi đã khóa hàng, nên promote/demote (cũng khóa hàng đó) không chen ngang được.
+    """
+
+    def __init__(self, redis_client=None, session_factory=SessionLocal, enabled: bool = False):
+        self.redis = redis_client
+        self.session_factory = session_factory
+        self.enabled = enabled and redis_client is not None
+        if self.redis is not None:
+            self._apply = self.redis.register_script(_APPLY_LUA)
+            self._revert = self.redis.register_script(_REVERT_LUA)
+            self._take_batch = self.redis.register_script(_TAKE_BATCH_LUA)
+            self._finish_batch = self.redis.register_script(_FINISH_BATCH_LUA)
+            self._reconcile = self.redis.register_script(_RECONCILE_LUA)
+            self._release_lock = self.redis.register_script(_RELEASE_LOCK_LUA)
+        self._stats_lock = threading.Lock()
+        self.stats_counters = {
+            "hot_updates": 0,
+            "hot_rejected": 0,
+            "reverts": 0,
+            "flushed_batches": 0,
+            "flushed_skus": 0,
+            "replayed_batches": 0,
+            "reconcile_runs": 0,
+            "reconcile_repairs": 0,
+            "redis_errors": 0,
+        }
+        self.last_flush_at: Optional[float] = None
+
+    def _count(self, name: str, amount: int = 1):
+        with self._stats_lock:
+            self.stats_counters[name] += amount
+
+    # --- Đọc / ghi số lượng ---
+
+    def get_quantities(self, product_ids: Iterable[int]) -> Dict[int, int]:
+        """Số lượng của các SKU nóng trong danh sách (SKU thường không có trong kết quả)"""
+        product_ids = list(product_ids)
+        if not self.enabled or not product_ids:
+            return {}
+        try:
+            values = self.redis.mget([QTY_KEY.format(pid) for pid in product_ids])
+        except redis.RedisError as e:
+            self._count("redis_errors")
+            logger.warning("Hot stock: Redis read failed, serving MySQL quantities: %s", e)
+            return {}
+        return {pid: int(value) for pid, value in zip(product_ids, values) if value is not None}
+
+    def apply(
+        self, changes: Dict[int, int], order_id: Optional[int] = None, request_id: Optional[str] = None
+    ):
+        """
+        Áp dụng các thay đổi {product_id: delta} lên SKU nóng, tất cả hoặc không gì cả.
+        Trả về {product_id: số lượng mới}, hoặc NOT_HOT nếu có SKU không (còn) nóng /
+        Redis lỗi (khi đó người gọi đi đường MySQL, đường này tự kiểm tra dấu SKU nóng).
+        """
+        if not self.enabled or not changes:
+            return NOT_HOT
+        product_ids = list(changes)
+        keys = [QTY_KEY.format(pid) for pid in product_ids] + [PENDING_KEY, MOVEMENTS_KEY]
+        args = [part for pid in product_ids for part in (pid, changes[pid])]
+        args.append(_movement_meta(order_id, request_id))
+        try:
+            result = self._apply(keys=keys, args=args)
+        except redis.RedisError as e:
+            self._count("redis_errors")
+            logger.warning("Hot stock: Redis apply failed: %s", e)
+            return NOT_HOT
+        if result[0] == -1:
+            return NOT_HOT
+        if result[0] == 0:
+            self._count("hot_rejected")
+            raise InsufficientStock(product_ids[result[1] - 1], result[2])
+        self._count("hot_updates")
+        return dict(zip(product_ids, result[1:]))
+
+    def hot_subset(self, product_ids: List[int]) -> List[int]:
+        return list(self.get_quantities(product_ids))
+
+    def revert(
+        self, changes: Dict[int, int], order_id: Optional[int] = None, request_id: Optional[str] = None
+    ):
+        """Hoàn lại các thay đổi đã apply (truyền đúng delta đã apply)"""
+        if not changes:
+            return
+        product_ids = list(changes)
+        keys = [QTY_KEY.format(pid) for pid in product_ids] + [PENDING_KEY, MOVEMENTS_KEY]
+        args = [part for pid in product_ids for part in (pid, -changes[pid])]
+        args.append(_movement_meta(order_id, request_id))
+        self._revert(keys=keys, args=args)
+        self._count("reverts")
+
+    def is_marked(self, db: Session, product_ids: List[int]) -> bool:
+        """
+        Có SKU nào trong danh sách đang ở chế độ nóng không (đọc có khóa chia sẻ để thấy
+        promote vừa commit). Gọi sau khi đã khóa/UPDATE hàng inventory tương ứng.
+        """
+        if not self.enabled or not product_ids:
+            return False
+        return (
+            db.query(models.InventoryHotSku.product_id)
+            .filter(models.InventoryHotSku.product_id.in_(product_ids))
+            .with_for_update(read=True)
+            .first()
+            is not None
+        )
+
+    # --- Flush (write-behind) ---
+
+    @contextmanager
+    def _exclusive(self):
+        token = uuid.uuid4().hex
+        if not self.redis.set(LOCK_KEY, token, nx=True, px=LOCK_TTL_MS):
+            raise HotStockBusy("hot stock flush/reconcile already running")
+        try:
+            yield
+        finally:
+            self._release_lock(keys=[LOCK_KEY], args=[token])
+
+    def flush(self) -> int:
+        """Ghi các delta đang chờ vào MySQL; trả về số SKU đã ghi (0 nếu tiến trình khác đang giữ khóa)"""
+        try:
+            with self._exclusive():
+                return self._flush_locked()
+        except HotStockBusy:
+            return 0
+
+    def _flush_locked(self) -> int:
+        flushed = 0
+        # Vòng lặp: batch dang dở từ lần trước (nếu có) rồi tới batch mới
+        for _ in range(2):
+            batch = self._take_batch(
+                keys=[PENDING_KEY, FLUSHING_KEY, FLUSHING_BATCH_KEY, MOVEMENTS_KEY,
+                      FLUSHING_MOVEMENTS_KEY],
+                args=[str(uuid.uuid4())],
+            )
+            if not batch:
+                break
+            batch_id = batch[0].decode()
+            raw = batch[1]
+            deltas = {
+                int(raw[i]): int(raw[i + 1]) for i in range(0, len(raw), 2) if int(raw[i + 1])
+            }
+            movements = [_parse_movement(entry) for entry in batch[2]]
+            if self._write_batch(batch_id, deltas, movements):
+                flushed += len(deltas)
+                self._count("flushed_batches")
+                self._count("flushed_skus", len(deltas))
+            self._finish_batch(
+                keys=[FLUSHING_KEY, FLUSHING_BATCH_KEY, FLUSHING_MOVEMENTS_KEY], args=[batch_id]
+            )
+        self.last_flush_at = time.time()
+        return flushed
+
+    def _write_batch(self, batch_id: str, deltas: Dict[int, int], movements: List[dict]) -> bool:
+        """
+        Cộng delta vào inventory + ghi các dòng sổ cái + batch_id trong 1 transaction;
+        False nếu batch đã được ghi
+        """
+        db = self.session_factory()
+        try:
+            state = (
+                db.query(models.InventoryFlushState)
+                .filter(models.InventoryFlushState.id == FLUSH_STATE_ID)
+                .with_for_update()
+                .first()
+            )
+            if state is None:
+                state = models.InventoryFlushState(id=FLUSH_STATE_ID)
+                db.add(state)
+            elif state.last_batch_id == batch_id:
+                self._count("replayed_batches")
+                return False
+
+            for product_id in sorted(deltas):
+                updated = (
+                    db.query(models.Inventory)
+                    .filter(models.Inventory.product_id == product_id)
+                    .update(
+                        {models.Inventory.quantity: models.Inventory.quantity + deltas[product_id]},
+                        synchronize_session=False,
+                    )
+                )
+                if not updated:
+                    db.add(models.Inventory(product_id=product_id, quantity=deltas[product_id]))
+            # Sau các UPDATE inventory (cùng thứ tự khóa với compaction của sổ cái)
+            stock_ledger.insert_movements(db, movements)
+            state.last_batch_id = batch_id
+            db.commit()
+            return True
+        finally:
+            db.close()
+
+    # --- Đối soát ---
+
+    def reconcile(self) -> List[list]:
+        """
+        Ghi hết pending, rồi so số lượng Redis với MySQL + pending cho mọi SKU nóng:
+        key mất (Redis restart) -> nạp lại; lệch -> đưa vào pending để ghi bù.
+        """
+        with self._exclusive():
+            self._flush_locked()
+            db = self.session_factory()
+            try:
+                hot_ids = [pid for (pid,) in db.query(models.InventoryHotSku.product_id)]
+                repaired = self._reconcile_locked(db, hot_ids)
+            finally:
+                db.close()
+        self._count("reconcile_runs")
+        self._count("reconcile_repairs", len(repaired))
+        for product_id, kind, amount in repaired:
+            logger.warning(
+                "Hot stock reconcile: product %s %s %s", product_id.decode(), kind.decode(), amount
+            )
+        return repaired
+
+    def _reconcile_locked(self, db: Session, product_ids: List[int]) -> List[list]:
+        if not product_ids:
+            return []
+        quantities = dict(
+            db.query(models.Inventory.product_id, models.Inventory.quantity)
+            .filter(models.Inventory.product_id.in_(product_ids))
+            .all()
+        )
+        for product_id, pending in stock_ledger.pending_totals(db, product_ids).items():
+            quantities[product_id] = quantities.get(product_id, 0) + pending
+        keys = [QTY_KEY.format(pid) for pid in product_ids] + [PENDING_KEY, MOVEMENTS_KEY]
+        args = [part for pid in product_ids for part in (pid, quantities.get(pid, 0))]
+        args.append(_movement_meta(request_id="hot-stock-reconcile"))
+        return self._reconcile(keys=keys, args=args)
+
+    # --- Chuyển chế độ (runtime) ---
+
+    def promote(self, product_id: int) -> int:
+        """Chuyển SKU sang chế độ nóng; trả về số lượng hiện tại"""
+        with self._exclusive():
+            self._flush_locked()
+            db = self.session_factory()
+            try:
+                # Khóa hàng inventory: các lệnh trừ MySQL đang chạy xong trước, lệnh sau thấy dấu nóng
+                item = (
+                    db.query(models.Inventory)
+                    .filter(models.Inventory.product_id == product_id)
+                    .with_for_update()
+                    .first()
+                )
+                if item is None:
+                    db.add(models.Inventory(product_id=product_id, quantity=0))
+                if db.get(models.InventoryHotSku, product_id) is None:
+                    db.add(models.InventoryHotSku(product_id=product_id))
+                db.commit()
+                # Nạp key sau khi commit (chỉ khi chưa có); trong khoảng giữa, lệnh trừ chờ
+                self._reconcile_locked(db, [product_id])
+            finally:
+                db.close()
+        return self.get_quantities([product_id])[product_id]
+
+    def demote(self, product_id: int) -> bool:
+        """Trả SKU về MySQL: ngừng nhận lệnh trừ ở Redis, ghi hết pending, bỏ dấu nóng"""
+        with self._exclusive():
+            # Xóa key trước: lệnh trừ mới thấy "không nóng" -> đường MySQL -> thấy dấu -> chờ
+            self.redis.delete(QTY_KEY.format(product_id))
+            self._flush_locked()
+            db = self.session_factory()
+            try:
+                (
+                    db.query(models.Inventory)
+                    .filter(models.Inventory.product_id == product_id)
+                    .with_for_update()
+                    .first()
+                )
+                removed = (
+                    db.query(models.InventoryHotSku)
+                    .filter(models.InventoryHotSku.product_id == product_id)
+                    .delete(synchronize_session=False)
+                )
+                db.commit()
+            finally:
+                db.close()
+        return bool(removed)
+
+    def list_hot(self, db: Session) -> List[dict]:
+        product_ids = [pid for (pid,) in db.query(models.InventoryHotSku.product_id)]
+        quantities = self.get_quantities(product_ids)
+        pending = self.redis.hgetall(PENDING_KEY) if product_ids else {}
+        return [
+            {
+                "product_id": pid,
+                "quantity": quantities.get(pid),
+                "pending_delta": int(pending.get(str(pid).encode(), 0)),
+            }
+            for pid in product_ids
+        ]
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            counters = dict(self.stats_counters)
+        counters["enabled"] = self.enabled
+        counters["last_flush_at"] = self.last_flush_at
+        if self.enabled:
+            try:
+                counters["pending_skus"] = self.redis.hlen(PENDING_KEY)
+            except redis.RedisError:
+                counters["pending_skus"] = None
+        return counters
+
+    # --- Tiến trình nền ---
+
+    def run_background(self, stop: threading.Event):
+        """Flush mỗi HOT_STOCK_FLUSH_INTERVAL giây, đối soát lúc khởi động và định kỳ"""
+        next_reconcile = 0.0
+        while not stop.is_set():
+            try:
+                if time.monotonic() >= next_reconcile:
+                    self.reconcile()
+                    next_reconcile = time.monotonic() + settings.HOT_STOCK_RECONCILE_INTERVAL
+                else:
+                    self.flush()
+            except HotStockBusy:
+                pass
+            except Exception:
+                logger.exception("Hot stock background flush/reconcile failed")
+            stop.wait(settings.HOT_STOCK_FLUSH_INTERVAL)
+
+
+hot_stock = HotStock(redis_client, enabled=settings.HOT_STOCK_ENABLED)
@@ -1,8 +1,20 @@
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings
 from app.db import models
-from app.models.inventory import InventoryUpdate
+from app.models.inventory import InventoryBulkUpdate, InventoryUpdate
+from app.services import stock_ledger
+from app.services.hot_stock import NOT_HOT, InsufficientStock, hot_stock
+from app.services.low_stock import low_stock
 from fastapi import HTTPException, status
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
+# Chờ giữa 2 lần thử khi SKU đang promote/demote
+TRANSITION_RETRY_DELAY = 0.05
+
 
 def get_stock(db: Session, product_id: int) -> models.Inventory:
     """Lấy số lượng tồn kho theo product_id"""
@@ -15,12 +27,217 @@ def get_stock(db: Session, product_id: int) -> models.Inventory:
     if not item:
         # Nếu sản phẩm chưa có trong kho, tạo mới với số lượng 0
         # (Không commit vội, chỉ trả về object)
-        return models.Inventory(product_id=product_id, quantity=0)
-    return item
+        item = models.Inventory(product_id=product_id, quantity=0)
+    return _current_quantities(db, [item])[0]
+
+
+def _current_quantities(db: Session, items: List[models.Inventory]) -> List[models.Inventory]:
+    """
+    Số lượng hiện tại = snapshot (bảng inventory) + phần sổ cái chưa gộp.
+    SKU nóng: số lượng chuẩn ở Redis (MySQL có thể chậm hơn tới 1 chu kỳ flush).
+    Kèm reserved = tổng các hold chưa trả hàng (đã bị trừ khỏi số lượng có thể bán).
+    """
+    product_ids = [item.product_id for item in items]
+    quantities = stock_ledger.pending_totals(db, product_ids)
+    for item in items:
+        if item.product_id in quantities:
+            quantities[item.product_id] += item.quantity
+    quantities.update(hot_stock.get_quantities(product_ids))
+    reserved = _reserved_totals(db, product_ids)
+    if not quantities and not reserved:
+        return items
+    # Object mới (transient) thay vì sửa object trong session, tránh bị ghi ngược vào MySQL
+    result = []
+    for item in items:
+        if item.product_id in quantities or item.product_id in reserved:
+            item = models.Inventory(
+                product_id=item.product_id,
+                quantity=quantities.get(item.product_id, item.quantity),
+            )
+            item.reserved = reserved.get(item.product_id, 0)
+        result.append(item)
+    return result
+
+
+def _reserved_totals(db: Session, product_ids: List[int]) -> Dict[int, int]:
+    if not product_ids:
+        return {}
+    rows = (
+        db.query(models.InventoryHoldItem.product_id, func.sum(models.InventoryHoldItem.quantity))
+        .join(models.InventoryHold, models.InventoryHold.id == models.InventoryHoldItem.hold_id)
+        .filter(
+            models.InventoryHoldItem.product_id.in_(product_ids),
+            # RESERVING: đang trừ kho; RELEASING / EXPIRING: hàng chưa được trả lại, vẫn đang bị giữ
+            models.InventoryHold.status.in_(("RESERVING", "ACTIVE", "RELEASING", "EXPIRING")),
+        )
+        .group_by(models.InventoryHoldItem.product_id)
+        .all()
+    )
+    return {product_id: int(total) for product_id, total in rows}
+
+
+def get_stock_bulk(db: Session, product_ids: List[int]) -> List[models.Inventory]:
+    """
+    Lấy tồn kho của nhiều sản phẩm bằng 1 câu IN, giữ thứ tự yêu cầu (bỏ id trùng).
+    Sản phẩm chưa có trong kho trả về số lượng 0 giống get_stock.
+    """
+    product_ids = list(dict.fromkeys(product_ids))
+    if not product_ids:
+        return []
+    rows = (
+        db.query(models.Inventory)
+        .filter(models.Inventory.product_id.in_(product_ids))
+        .all()
+    )
+    items = {row.product_id: row for row in rows}
+    return _current_quantities(db, [
+        items.get(product_id) or models.Inventory(product_id=product_id, quantity=0)
+        for product_id in product_ids
+    ])
+
+
+def list_stock(
+    db: Session, after: int = 0, limit: int = 100
+) -> Tuple[List[models.Inventory], Optional[int]]:
+    """
+    Liệt kê toàn bộ kho theo product_id tăng dần, phân trang keyset
+    (WHERE product_id > :after, dùng index của product_id thay vì OFFSET).
+    Sản phẩm chỉ có trong sổ cái (chưa compaction) cũng được liệt kê.
+    """
+    rows = (
+        db.query(models.Inventory)
+        .filter(models.Inventory.product_id > after)
+        .order_by(models.Inventory.product_id)
+        .limit(limit + 1)
+        .all()
+    )
+    items = {row.product_id: row for row in rows}
+    for product_id in stock_ledger.pending_product_ids(db, after, limit + 1):
+        items.setdefault(product_id, models.Inventory(product_id=product_id, quantity=0))
+    product_ids = sorted(items)
+    page = [items[product_id] for product_id in product_ids[:limit]]
+    next_after = page[-1].product_id if len(product_ids) > limit else None
+    return _current_quantities(db, page), next_after
+
+
+def _retry_during_transition(attempt: Callable[[], Optional[object]]):
+    """
+    Chạy attempt() tới khi có kết quả khác None. None = có SKU đang chuyển chế độ
+    (promote/demote chưa xong); quá HOT_STOCK_TRANSITION_WAIT giây thì trả 503.
+    """
+    deadline = time.monotonic() + settings.HOT_STOCK_TRANSITION_WAIT
+    while True:
+        result = attempt()
+        if result is not None:
+            return result
+        if time.monotonic() >= deadline:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Sản phẩm đang chuyển chế độ tồn kho, vui lòng thử lại",
+            )
+        time.sleep(TRANSITION_RETRY_DELAY)
+
+
+def _update_hot_stock(update_data: InventoryUpdate) -> Optional[models.Inventory]:
+    """Trừ/cộng ở Redis nếu là SKU nóng; None nếu không phải (đi đường MySQL)"""
+    try:
+        quantities = hot_stock.apply(
+            {update_data.product_id: update_data.change_quantity},
+            order_id=update_data.order_id,
+            request_id=update_data.request_id,
+        )
+    except InsufficientStock:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Không đủ hàng trong kho"
+        )
+    if quantities is NOT_HOT:
+        return None
+    return models.Inventory(
+        product_id=update_data.product_id, quantity=quantities[update_data.product_id]
+    )
 
 
 def update_stock(db: Session, update_data: InventoryUpdate) -> models.Inventory:
-    """Cập nhật số lượng (tăng hoặc giảm)"""
+    """
+    Cập nhật số lượng (tăng hoặc giảm).
+    SKU nóng: kiểm tra-rồi-trừ nguyên tử ở Redis, không chạm MySQL.
+    Nhập kho (có sổ cái): chỉ INSERT 1 dòng inventory_movements, không khóa hàng inventory.
+    Đường nhanh: 1 câu UPDATE có điều kiện, không giữ khóa hàng qua nhiều round-trip
+    (UPDATE inventory SET quantity = quantity + :d
+     WHERE product_id = :id AND quantity + :d + <phần sổ cái chưa gộp> >= 0).
+    Chỉ khi không có dòng nào được cập nhật (chưa có trong kho / không đủ hàng)
+    mới chuyển sang đường khóa FOR UPDATE để tạo mới hoặc báo lỗi.
+    Sau khi ghi xong, số lượng mới được đưa vào tập dưới ngưỡng (low_stock).
+    """
+    item = _retry_during_transition(lambda: _update_stock_once(db, update_data))
+    low_stock.observe({item.product_id: item.quantity})
+    return item
+
+
+def _update_stock_once(db: Session, update_data: InventoryUpdate) -> Optional[models.Inventory]:
+    item = _update_hot_stock(update_data)
+    if item is not None:
+        return item
+    if settings.STOCK_LEDGER_ENABLED and update_data.change_quantity > 0:
+        return _append_stock(db, update_data)
+
+    new_quantity = models.Inventory.quantity + update_data.change_quantity
+    available = new_quantity + stock_ledger.pending_total_expr(update_data.product_id)
+    updated_rows = (
+        db.query(models.Inventory)
+        .filter(
+            models.Inventory.product_id == update_data.product_id,
+            available >= 0,
+        )
+        .update({models.Inventory.quantity: new_quantity}, synchronize_session=False)
+    )
+    if updated_rows:
+        # Đã giữ khóa hàng: SKU vừa được promote thì bỏ, thử lại ở Redis
+        if hot_stock.is_marked(db, [update_data.product_id]):
+            db.rollback()
+            return None
+        _record(db, update_data)
+        db.commit()
+        return get_stock(db, update_data.product_id)
+
+    db.rollback()
+    return _update_stock_locked_once(db, update_data)
+
+
+def _record(db: Session, update_data: InventoryUpdate, compacted: bool = True):
+    stock_ledger.record_movements(
+        db,
+        {update_data.product_id: update_data.change_quantity},
+        order_id=update_data.order_id,
+        request_id=update_data.request_id,
+        compacted=compacted,
+    )
+
+
+def _append_stock(db: Session, update_data: InventoryUpdate) -> Optional[models.Inventory]:
+    """Nhập kho chỉ bằng 1 dòng sổ cái chưa gộp (không cần kiểm tra âm kho, không khóa hàng inventory)"""
+    # Đọc dấu SKU nóng có khóa chia sẻ: promote (INSERT dấu) phải chờ dòng này commit
+    if hot_stock.is_marked(db, [update_data.product_id]):
+        db.rollback()
+        return None
+    _record(db, update_data, compacted=False)
+    db.commit()
+    return get_stock(db, update_data.product_id)
+
+
+def update_stock_locked(db: Session, update_data: InventoryUpdate) -> models.Inventory:
+    """Cập nhật số lượng bằng cách khóa hàng (SELECT ... FOR UPDATE)"""
+    item = _retry_during_transition(lambda: _update_stock_locked_once(db, update_data))
+    low_stock.observe({item.product_id: item.quantity})
+    return item
+
+
+def _update_stock_locked_once(
+    db: Session, update_data: InventoryUpdate
+) -> Optional[models.Inventory]:
+    item = _update_hot_stock(update_data)
+    if item is not None:
+        return item
 
     # Dùng FOR UPDATE để khóa hàng (row) này lại, tránh 2 đơn hàng
     # cùng lúc trừ kho (ngăn ngừa race condition)
@@ -30,10 +247,17 @@ def update_stock(db: Session, update_data: InventoryUpdate) -> models.Inventory:
         .with_for_update()
         .first()
     )
+    if hot_stock.is_marked(db, [update_data.product_id]):
+        db.rollback()
+        return None
+    # Đọc sau khi đã khóa hàng: compaction (cũng khóa hàng này trước) không thể chen vào giữa
+    pending = stock_ledger.pending_totals(db, [update_data.product_id]).get(
+        update_data.product_id, 0
+    )
 
     # Nếu sản phẩm chưa có trong kho
     if not item:
-        if update_data.change_quantity < 0:
+        if update_data.change_quantity + pending < 0:
             # Không thể trừ kho nếu số lượng là 0
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST, detail="Hết hàng"
@@ -49,11 +273,166 @@ def update_stock(db: Session, update_data: InventoryUpdate) -> models.Inventory:
         item.quantity += update_data.change_quantity
 
     # Kiểm tra xem có bị âm kho không
-    if item.quantity < 0:
+    if item.quantity + pending < 0:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Không đủ hàng trong kho"
         )
 
+    _record(db, update_data)
     db.commit()
-    db.refresh(item)
-    return item
+    return get_stock(db, update_data.product_id)
+
+
+def update_stock_bulk(
+    db: Session, bulk_data: InventoryBulkUpdate
+) -> List[models.Inventory]:
+    """
+    Cập nhật nhiều sản phẩm trong 1 transaction: tất cả thành công hoặc không gì cả.
+    Các dòng được khóa theo thứ tự product_id tăng dần để 2 đơn hàng
+    cùng lúc không bị deadlock.
+    SKU nóng được trừ trước ở Redis (1 lệnh Lua cho cả nhóm); phần MySQL thất bại
+    thì hoàn lại phần Redis.
+    Idempotent theo request_id: request đã áp dụng (kể cả khi client mất response rồi gửi lại)
+    chỉ trả về số lượng hiện tại.
+    """
+    # Gộp các dòng trùng product_id
+    changes: Dict[int, int] = {}
+    for update_data in bulk_data.items:
+        changes[update_data.product_id] = (
+            changes.get(update_data.product_id, 0) + update_data.change_quantity
+        )
+    if not changes:
+        return []
+    if _is_applied(db, bulk_data.request_id):
+        return get_stock_bulk(db, sorted(changes))
+    items = _retry_during_transition(lambda: _update_stock_bulk_once(db, changes, bulk_data))
+    low_stock.observe({item.product_id: item.quantity for item in items})
+    return items
+
+
+def _update_stock_bulk_once(
+    db: Session, changes: Dict[int, int], bulk_data: InventoryBulkUpdate
+) -> Optional[List[models.Inventory]]:
+    ids = {"order_id": bulk_data.order_id, "request_id": bulk_data.request_id}
+    product_ids = sorted(changes)
+    hot_changes = {
+        product_id: changes[product_id] for product_id in hot_stock.hot_subset(product_ids)
+    }
+    hot_items: Dict[int, models.Inventory] = {}
+    if hot_changes:
+        try:
+            quantities = hot_stock.apply(hot_changes, **ids)
+        except InsufficientStock as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Không đủ hàng trong kho (sản phẩm ID {e.product_id})",
+            )
+        if quantities is NOT_HOT:
+            # Có SKU vừa bị demote giữa 2 lệnh Redis
+            return None
+        hot_items = {
+            product_id: models.Inventory(product_id=product_id, quantity=quantity)
+            for product_id, quantity in quantities.items()
+        }
+
+    cold_ids = [product_id for product_id in product_ids if product_id not in hot_items]
+    try:
+        items = _update_cold_stock_bulk(db, changes, cold_ids, **ids)
+    except DuplicateRequest:
+        # Request song song cùng request_id đã commit trước
+        hot_stock.revert(hot_changes, **ids)
+        return get_stock_bulk(db, product_ids)
+    except Exception:
+        hot_stock.revert(hot_changes, **ids)
+        raise
+    if items is None:
+        hot_stock.revert(hot_changes, **ids)
+        return None
+
+    items.update(hot_items)
+    return [items[product_id] for product_id in product_ids]
+
+
+class DuplicateRequest(Exception):
+    """request_id của bulk-update đã được áp dụng"""
+
+
+def _is_applied(db: Session, request_id: Optional[str]) -> bool:
+    return bool(request_id) and db.get(models.InventoryRequest, request_id) is not None
+
+
+def _update_cold_stock_bulk(
+    db: Session,
+    changes: Dict[int, int],
+    product_ids: List[int],
+    order_id: Optional[int] = None,
+    request_id: Optional[str] = None,
+) -> Optional[Dict[int, models.Inventory]]:
+    """
+    Phần MySQL của update_stock_bulk; None nếu có SKU vừa được promote.
+    Có sổ cái: sản phẩm được nhập thêm chỉ ghi dòng sổ cái, chỉ các dòng bị trừ mới bị khóa.
+    Có request_id: ghi dấu InventoryRequest cùng transaction (kể cả khi toàn bộ là SKU nóng);
+    request trùng commit sau -> DuplicateRequest.
+    """
+    if not product_ids and not request_id:
+        return {}
+    if settings.STOCK_LEDGER_ENABLED:
+        appended = {pid: changes[pid] for pid in product_ids if changes[pid] > 0}
+    else:
+        appended = {}
+    locked_ids = [product_id for product_id in product_ids if product_id not in appended]
+
+    rows = (
+        db.query(models.Inventory)
+        .filter(models.Inventory.product_id.in_(locked_ids))
+        .order_by(models.Inventory.product_id)
+        .with_for_update()
+        .all()
+    ) if locked_ids else []
+    if hot_stock.is_marked(db, product_ids):
+        db.rollback()
+        return None
+    pending = stock_ledger.pending_totals(db, locked_ids)
+    items = {row.product_id: row for row in rows}
+
+    for product_id in locked_ids:
+        change_quantity = changes[product_id]
+        item = items.get(product_id)
+
+        if not item:
+            if change_quantity + pending.get(product_id, 0) < 0:
+                db.rollback()
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Hết hàng (sản phẩm ID {product_id})",
+                )
+            item = models.Inventory(product_id=product_id, quantity=change_quantity)
+            db.add(item)
+            items[product_id] = item
+        else:
+            item.quantity += change_quantity
+
+        if item.quantity + pending.get(product_id, 0) < 0:
+            db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Không đủ hàng trong kho (sản phẩm ID {product_id})",
+            )
+
+    stock_ledger.record_movements(
+        db, {pid: changes[pid] for pid in locked_ids}, order_id=order_id, request_id=request_id
+    )
+    stock_ledger.record_movements(
+        db, appended, order_id=order_id, request_id=request_id, compacted=False
+    )
+    if request_id:
+        # Cùng transaction: request trùng (song song) vi phạm khóa chính lúc commit
+        db.add(models.InventoryRequest(request_id=request_id))
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        if _is_applied(db, request_id):
+            raise DuplicateRequest(request_id)
+        raise
+    return {item.product_id: item for item in get_stock_bulk(db, product_ids)}
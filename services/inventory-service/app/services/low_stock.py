@@ -0,0 +1,320 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.db import models
+from app.db.database import SessionLocal, redis_client
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+EVENT_LOW = "low"
+EVENT_RECOVERED = "recovered"
+
+# Kênh Redis pub/sub: mọi instance nhận sự kiện vượt ngưỡng của nhau (cho client SSE của mình)
+EVENTS_CHANNEL = "inventory:low-stock"
+# Số sự kiện tối đa chờ gửi cho 1 client SSE chậm (đầy thì bỏ sự kiện mới của client đó)
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+
+class LowStockMonitor:
+    """
+    Tập sản phẩm dưới ngưỡng đặt hàng lại, duy trì dần thay vì quét kho:
+    - observe() được gọi sau mỗi lần cập nhật kho với số lượng mới; chỉ khi sản phẩm vượt qua
+      ngưỡng (theo ngưỡng / tập thành viên cache trong bộ nhớ) mới INSERT / DELETE 1 dòng
+      inventory_low_stock. Kết quả câu lệnh đó (dòng đã có / không còn dòng để xóa) quyết định
+      instance nào phát sự kiện, nên mỗi lần vượt ngưỡng chỉ có 1 sự kiện dù nhiều instance.
+    - Sự kiện được đẩy tới các client SSE qua hàng đợi asyncio (qua Redis pub/sub nếu có Redis).
+    - Định kỳ nạp lại ngưỡng + tập thành viên (thay đổi từ instance khác) và kiểm tra lại số lượng
+      của các thành viên (sửa thành viên thừa do cập nhật song song / đối soát SKU nóng).
+    """
+
+    def __init__(self, redis_client=None, session_factory=SessionLocal):
+        self.redis = redis_client
+        self.session_factory = session_factory
+        self._lock = threading.Lock()
+        self._thresholds: Dict[int, int] = {}
+        self._members: Set[int] = set()
+        self._subscribers: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]] = set()
+        self._stats = {"crossed_low": 0, "recovered": 0, "events_dropped": 0, "errors": 0}
+        self.last_refresh_at: Optional[float] = None
+
+    def threshold(self, product_id: int) -> int:
+        with self._lock:
+            return self._thresholds.get(product_id, settings.LOW_STOCK_DEFAULT_THRESHOLD)
+
+    # --- Cập nhật tập dưới ngưỡng ---
+
+    def observe(self, quantities: Dict[int, int], emit: bool = True):
+        """
+        Đánh giá lại các sản phẩm vừa đổi số lượng {product_id: quantity}. Không bao giờ làm
+        lệnh cập nhật kho thất bại: lỗi chỉ được log, lần refresh kế tiếp sẽ sửa.
+        """
+        crossed_low: Dict[int, int] = {}
+        recovered: List[int] = []
+        with self._lock:
+            for product_id, quantity in quantities.items():
+                threshold = self._thresholds.get(product_id, settings.LOW_STOCK_DEFAULT_THRESHOLD)
+                is_low = threshold >= 0 and quantity <= threshold
+                if is_low and product_id not in self._members:
+                    crossed_low[product_id] = threshold
+                elif not is_low and product_id in self._members:
+                    recovered.append(product_id)
+        if not crossed_low and not recovered:
+            return
+
+        db = self.session_factory()
+        try:
+            for product_id, threshold in crossed_low.items():
+                if self._mark_low(db, product_id, threshold) and emit:
+                    self._count("crossed_low")
+                    self.publish(EVENT_LOW, product_id, quantities[product_id], threshold)
+            for product_id in recovered:
+                threshold = self.threshold(product_id)
+                if self._mark_recovered(db, product_id) and emit:
+                    self._count("recovered")
+                    self.publish(EVENT_RECOVERED, product_id, quantities[product_id], threshold)
+        except Exception:
+            db.rollback()
+            self._count("errors")
+            logger.exception("Failed to update low-stock set for %s", sorted(quantities))
+        finally:
+            db.close()
+
+    def _mark_low(self, db: Session, product_id: int, threshold: int) -> bool:
+        """Thêm vào tập; False nếu instance khác đã thêm trước (không phát sự kiện lần 2)"""
+        db.add(models.InventoryLowStock(product_id=product_id, threshold=threshold))
+        try:
+            db.commit()
+            added = True
+        except IntegrityError:
+            db.rollback()
+            added = False
+        with self._lock:
+            self._members.add(product_id)
+        return added
+
+    def _mark_recovered(self, db: Session, product_id: int) -> bool:
+        deleted = (
+            db.query(models.InventoryLowStock)
+            .filter(models.InventoryLowStock.product_id == product_id)
+            .delete(synchronize_session=False)
+        )
+        db.commit()
+        with self._lock:
+            self._members.discard(product_id)
+        return bool(deleted)
+
+    # --- Ngưỡng ---
+
+    def set_threshold(self, db: Session, product_id: int, threshold: int):
+        item = db.get(models.InventoryThreshold, product_id)
+        if item is None:
+            db.add(models.InventoryThreshold(product_id=product_id, threshold=threshold))
+        else:
+            item.threshold = threshold
+        try:
+            db.commit()
+        except IntegrityError:
+            # Đặt ngưỡng song song cho cùng sản phẩm
+            db.rollback()
+            db.get(models.InventoryThreshold, product_id).threshold = threshold
+            db.commit()
+        with self._lock:
+            self._thresholds[product_id] = threshold
+        self._update_member_threshold(db, product_id, threshold)
+
+    def clear_threshold(self, db: Session, product_id: int) -> bool:
+        """Bỏ ngưỡng riêng (về ngưỡng mặc định); False nếu sản phẩm chưa có ngưỡng riêng"""
+        deleted = (
+            db.query(models.InventoryThreshold)
+            .filter(models.InventoryThreshold.product_id == product_id)
+            .delete(synchronize_session=False)
+        )
+        db.commit()
+        with self._lock:
+            self._thresholds.pop(product_id, None)
+        self._update_member_threshold(db, product_id, settings.LOW_STOCK_DEFAULT_THRESHOLD)
+        return bool(deleted)
+
+    def _update_member_threshold(self, db: Session, product_id: int, threshold: int):
+        (
+            db.query(models.InventoryLowStock)
+            .filter(models.InventoryLowStock.product_id == product_id)
+            .update({models.InventoryLowStock.threshold: threshold}, synchronize_session=False)
+        )
+        db.commit()
+
+    # --- Đọc ---
+
+    def list_members(
+        self, db: Session, after: int = 0, limit: int = 100
+    ) -> Tuple[List[models.InventoryLowStock], Optional[int]]:
+        """Các sản phẩm dưới ngưỡng theo product_id tăng dần, phân trang keyset"""
+        rows = (
+            db.query(models.InventoryLowStock)
+            .filter(models.InventoryLowStock.product_id > after)
+            .order_by(models.InventoryLowStock.product_id)
+            .limit(limit + 1)
+            .all()
+        )
+        next_after = rows[limit - 1].product_id if len(rows) > limit else None
+        return rows[:limit], next_after
+
+    # --- Nạp lại / dựng lại ---
+
+    def refresh(self, get_stock_bulk: Callable[[Session, List[int]], List[models.Inventory]]):
+        """Nạp lại ngưỡng + tập thành viên từ DB rồi kiểm tra lại số lượng của các thành viên"""
+        db = self.session_factory()
+        try:
+            thresholds = {
+                product_id: threshold
+                for product_id, threshold in db.query(
+                    models.InventoryThreshold.product_id, models.InventoryThreshold.threshold
+                )
+            }
+            members = [
+                product_id for (product_id,) in db.query(models.InventoryLowStock.product_id)
+            ]
+            with self._lock:
+                self._thresholds = thresholds
+                self._members = set(members)
+            quantities: Dict[int, int] = {}
+            for start in range(0, len(members), settings.LOW_STOCK_REBUILD_BATCH):
+                chunk = members[start:start + settings.LOW_STOCK_REBUILD_BATCH]
+                for item in get_stock_bulk(db, chunk):
+                    quantities[item.product_id] = item.quantity
+        finally:
+            db.close()
+        self.observe(quantities)
+        self.last_refresh_at = time.time()
+
+    def rebuild(
+        self,
+        list_stock: Callable[..., Tuple[List[models.Inventory], Optional[int]]],
+        batch_size: Optional[int] = None,
+    ) -> int:
+        """
+        Dựng lại tập dưới ngưỡng bằng 1 lượt quét toàn kho theo trang (lúc khởi động, để bắt
+        các thay đổi xảy ra khi service tắt / ngưỡng mặc định vừa đổi). Không phát sự kiện.
+        Trả về số sản phẩm đã kiểm tra.
+        """
+        batch_size = batch_size or settings.LOW_STOCK_REBUILD_BATCH
+        checked = 0
+        after = 0
+        while True:
+            db = self.session_factory()
+            try:
+                items, next_after = list_stock(db, after=after, limit=batch_size)
+            finally:
+                db.close()
+            self.observe({item.product_id: item.quantity for item in items}, emit=False)
+            checked += len(items)
+            if next_after is None:
+                return checked
+            after = next_after
+
+    def run(
+        self,
+        stop: threading.Event,
+        list_stock: Callable[..., Tuple[List[models.Inventory], Optional[int]]],
+        get_stock_bulk: Callable[[Session, List[int]], List[models.Inventory]],
+    ):
+        """Thread nền: nạp + dựng lại lúc khởi động, rồi refresh mỗi LOW_STOCK_REFRESH_INTERVAL giây"""
+        try:
+            self.refresh(get_stock_bulk)
+            checked = self.rebuild(list_stock)
+            logger.info("Low-stock set rebuilt from %s products", checked)
+        except Exception:
+            logger.exception("Low-stock rebuild failed")
+        while not stop.wait(settings.LOW_STOCK_REFRESH_INTERVAL):
+            try:
+                self.refresh(get_stock_bulk)
+            except Exception:
+                logger.exception("Low-stock refresh failed")
+
+    # --- Sự kiện ---
+
+    def publish(self, event: str, product_id: int, quantity: int, threshold: int):
+        payload = {
+            "event": event,
+            "product_id": product_id,
+            "quantity": quantity,
+            "threshold": threshold,
+            "at": time.time(),
+        }
+        if self.redis is not None:
+            try:
+                self.redis.publish(EVENTS_CHANNEL, json.dumps(payload))
+                return
+            except Exception:
+                # Redis lỗi: ít nhất client SSE của instance này vẫn nhận được
+                logger.exception("Failed to publish low-stock event to Redis")
+        self._dispatch(payload)
+
+    def listen(self, stop: threading.Event):
+        """Thread nền (khi có Redis): nhận sự kiện của mọi instance, đẩy tới client SSE của instance này"""
+        while not stop.is_set():
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(EVENTS_CHANNEL)
+                while not stop.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message["type"] == "message":
+                        self._dispatch(json.loads(message["data"]))
+            except Exception:
+                logger.exception("Low-stock event listener failed, reconnecting")
+                stop.wait(1)
+            finally:
+                pubsub.close()
+
+    def subscribe(self) -> asyncio.Queue:
+        """Đăng ký 1 client SSE (gọi trong event loop của request)"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        with self._lock:
+            self._subscribers = {
+                subscriber for subscriber in self._subscribers if subscriber[1] is not queue
+            }
+
+    def _dispatch(self, payload: dict):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._put, queue, payload)
+            except RuntimeError:
+                # Event loop đã đóng
+                self.unsubscribe(queue)
+
+    def _put(self, queue: asyncio.Queue, payload: dict):
+        try:
+            queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            self._count("events_dropped")
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            result = dict(self._stats)
+            result["members"] = len(self._members)
+            result["thresholds"] = len(self._thresholds)
+            result["subscribers"] = len(self._subscribers)
+        result["default_threshold"] = settings.LOW_STOCK_DEFAULT_THRESHOLD
+        result["last_refresh_at"] = self.last_refresh_at
+        return result
+
+
+low_stock = LowStockMonitor(redis_client)
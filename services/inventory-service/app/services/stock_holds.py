@@ -0,0 +1,378 @@
+import heapq
+import logging
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.db import models
+from app.db.database import SessionLocal
+from app.models.inventory import HoldCreate, InventoryBulkUpdate, InventoryUpdate
+from app.services import inventory_service as crud
+from fastapi import HTTPException, status
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# Đã ghi hold nhưng chưa trừ xong kho (create_hold lỗi / crash giữa chừng -> sweeper dọn khi hết hạn)
+HOLD_RESERVING = "RESERVING"
+HOLD_ACTIVE = "ACTIVE"
+HOLD_CONFIRMED = "CONFIRMED"
+HOLD_RELEASED = "RELEASED"
+HOLD_EXPIRED = "EXPIRED"
+# Đã hủy / hết hạn nhưng chưa trả xong hàng về kho (lần trả hàng trước lỗi -> sweeper thử lại)
+HOLD_RELEASING = "RELEASING"
+HOLD_EXPIRING = "EXPIRING"
+PENDING_STATUS = {HOLD_RELEASED: HOLD_RELEASING, HOLD_EXPIRED: HOLD_EXPIRING}
+FINAL_STATUS = {pending: final for final, pending in PENDING_STATUS.items()}
+
+# Số hold quá hạn xử lý trong 1 lần quét DB
+SWEEP_BATCH = 500
+
+
+def get_hold(db: Session, hold_id: str) -> models.InventoryHold:
+    hold = db.get(models.InventoryHold, hold_id)
+    if hold is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Không tìm thấy hold")
+    return hold
+
+
+def create_hold(db: Session, hold_in: HoldCreate) -> models.InventoryHold:
+    """
+    Giữ hàng cho 1 lần checkout: ghi hold RESERVING, trừ số lượng có thể bán của tất cả món
+    (1 lần cập nhật nhiều sản phẩm, tất cả hoặc không gì cả - đi qua cùng đường SKU nóng /
+    sổ cái như bulk-update) rồi chuyển hold sang ACTIVE. Không đủ hàng -> 400 như bulk-update.
+    Ghi hold TRƯỚC rồi mới trừ kho: crash giữa 2 bước để lại hold RESERVING đã có hạn,
+    sweeper trả lại hàng (nếu đã trừ) khi hết hạn, kho không bị giữ mãi.
+    """
+    if hold_in.request_id:
+        existing = (
+            db.query(models.InventoryHold)
+            .filter(models.InventoryHold.request_id == hold_in.request_id)
+            .first()
+        )
+        if existing is not None:
+            return existing
+
+    ttl = hold_in.ttl_seconds or settings.STOCK_HOLD_DEFAULT_TTL
+    if ttl > settings.STOCK_HOLD_MAX_TTL:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"ttl_seconds tối đa {settings.STOCK_HOLD_MAX_TTL}",
+        )
+
+    quantities: Dict[int, int] = {}
+    for item in hold_in.items:
+        quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+
+    hold = models.InventoryHold(
+        id=str(uuid.uuid4()),
+        status=HOLD_RESERVING,
+        expires_at=datetime.utcnow() + timedelta(seconds=ttl),
+        order_id=hold_in.order_id,
+        request_id=hold_in.request_id,
+        items=[
+            models.InventoryHoldItem(product_id=product_id, quantity=quantity)
+            for product_id, quantity in sorted(quantities.items())
+        ],
+    )
+    db.add(hold)
+    try:
+        db.commit()
+    except IntegrityError:
+        # Request trùng request_id vừa tạo hold song song -> dùng hold kia (chưa trừ kho gì)
+        db.rollback()
+        return (
+            db.query(models.InventoryHold)
+            .filter(models.InventoryHold.request_id == hold_in.request_id)
+            .one()
+        )
+    hold_id, expires_at = hold.id, hold.expires_at
+    hold_sweeper.schedule(hold_id, expires_at)
+
+    try:
+        _change_stock(db, hold_id, quantities, sign=-1, order_id=hold_in.order_id, reason="reserve")
+    except Exception:
+        db.rollback()
+        _abort_reserve(db, hold_id)
+        raise
+
+    activated = (
+        db.query(models.InventoryHold)
+        .filter(models.InventoryHold.id == hold_id, models.InventoryHold.status == HOLD_RESERVING)
+        .update({models.InventoryHold.status: HOLD_ACTIVE}, synchronize_session=False)
+    )
+    db.commit()
+    hold = get_hold(db, hold_id)
+    if not activated:
+        # Hold đã bị hủy / sweeper dọn trong lúc đang trừ kho (hàng đã được trả lại nếu có trừ)
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT, detail=f"Hold đã ở trạng thái {hold.status}"
+        )
+    return hold
+
+
+def _abort_reserve(db: Session, hold_id: str):
+    """
+    Trừ kho lúc tạo hold bị lỗi: hủy hold như release (chưa trừ thì không trả gì) rồi bỏ
+    request_id để client tạo lại được với cùng request_id. Lỗi ở đây để lại hold cho sweeper.
+    """
+    try:
+        if finish_hold(db, hold_id, HOLD_RELEASED) == HOLD_RELEASED:
+            (
+                db.query(models.InventoryHold)
+                .filter(models.InventoryHold.id == hold_id)
+                .update({models.InventoryHold.request_id: None}, synchronize_session=False)
+            )
+            db.commit()
+    except Exception:
+        db.rollback()
+        logger.exception("Failed to abort hold %s, left for the sweeper", hold_id)
+
+
+def confirm_hold(db: Session, hold_id: str, order_id: Optional[int] = None) -> models.InventoryHold:
+    """
+    Xác nhận hold (đơn hàng đã thanh toán): số lượng đã trừ lúc tạo hold trở thành hàng đã bán.
+    Gọi lại với hold đã CONFIRMED trả về kết quả cũ; hold đã hết hạn / đã hủy -> 409.
+    """
+    values = {models.InventoryHold.status: HOLD_CONFIRMED}
+    if order_id is not None:
+        values[models.InventoryHold.order_id] = order_id
+    confirmed = (
+        db.query(models.InventoryHold)
+        .filter(
+            models.InventoryHold.id == hold_id,
+            models.InventoryHold.status == HOLD_ACTIVE,
+            models.InventoryHold.expires_at > datetime.utcnow(),
+        )
+        .update(values, synchronize_session=False)
+    )
+    db.commit()
+    hold = get_hold(db, hold_id)
+    if confirmed or hold.status == HOLD_CONFIRMED:
+        return hold
+    if hold.status == HOLD_ACTIVE:
+        # Đã quá hạn nhưng sweeper chưa chạy tới
+        finish_hold(db, hold_id, HOLD_EXPIRED)
+        db.refresh(hold)
+    raise HTTPException(
+        status_code=status.HTTP_409_CONFLICT, detail=f"Hold đã ở trạng thái {hold.status}"
+    )
+
+
+def release_hold(db: Session, hold_id: str) -> models.InventoryHold:
+    """Hủy hold (checkout thất bại / người dùng bỏ giỏ): trả hàng lại kho. Gọi lại nhiều lần an toàn."""
+    finish_hold(db, hold_id, HOLD_RELEASED)
+    hold = get_hold(db, hold_id)
+    if hold.status == HOLD_CONFIRMED:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT, detail="Hold đã được xác nhận, không thể hủy"
+        )
+    return hold
+
+
+def finish_hold(db: Session, hold_id: str, new_status: str) -> Optional[str]:
+    """
+    ACTIVE / RESERVING -> RELEASING / EXPIRING -> trả hàng lại kho -> RELEASED / EXPIRED.
+    Câu UPDATE có điều kiện status = ACTIVE / RESERVING quyết định 1 bên thắng duy nhất giữa
+    confirm / release / sweeper / create_hold lỗi. Hàng được trả bằng bulk-update với request_id cố định
+    ("hold:<id>:<status>", idempotent), nên nếu lần trả hàng lỗi (DB lỗi, 503 khi SKU đang
+    chuyển chế độ) hold nằm lại ở RELEASING / EXPIRING và lần gọi sau / sweeper trả tiếp
+    mà không trả 2 lần. Hold chưa trừ kho (từ RESERVING) chỉ chuyển trạng thái, không trả gì.
+    Trả về trạng thái cuối, None nếu hold không còn gì để làm.
+    """
+    (
+        db.query(models.InventoryHold)
+        .filter(
+            models.InventoryHold.id == hold_id,
+            models.InventoryHold.status.in_((HOLD_ACTIVE, HOLD_RESERVING)),
+        )
+        .update({models.InventoryHold.status: PENDING_STATUS[new_status]}, synchronize_session=False)
+    )
+    db.commit()
+
+    hold = db.get(models.InventoryHold, hold_id)
+    if hold is None or hold.status not in FINAL_STATUS:
+        return None
+    pending, final = hold.status, FINAL_STATUS[hold.status]
+    if _void_reserve(db, hold_id, pending, final):
+        return final
+    quantities = {item.product_id: item.quantity for item in hold.items}
+    try:
+        _change_stock(db, hold_id, quantities, sign=1, order_id=hold.order_id, reason=final.lower())
+    except Exception:
+        logger.exception("Hold %s is %s but its stock could not be returned yet", hold_id, pending)
+        raise
+    (
+        db.query(models.InventoryHold)
+        .filter(models.InventoryHold.id == hold_id, models.InventoryHold.status == pending)
+        .update({models.InventoryHold.status: final}, synchronize_session=False)
+    )
+    db.commit()
+    return final
+
+
+def _void_reserve(db: Session, hold_id: str, pending: str, final: str) -> bool:
+    """
+    Hold chưa trừ kho (create_hold lỗi / crash trước khi trừ): chiếm request_id giữ hàng cùng
+    transaction với chuyển sang trạng thái cuối, lần trừ kho muộn (nếu có) thành no-op.
+    False nếu kho đã bị trừ (request_id giữ hàng đã được áp dụng) -> phải trả hàng.
+    """
+    request_id = _request_id(hold_id, "reserve")
+    if db.get(models.InventoryRequest, request_id) is not None:
+        return False
+    db.add(models.InventoryRequest(request_id=request_id))
+    (
+        db.query(models.InventoryHold)
+        .filter(models.InventoryHold.id == hold_id, models.InventoryHold.status == pending)
+        .update({models.InventoryHold.status: final}, synchronize_session=False)
+    )
+    try:
+        db.commit()
+    except IntegrityError:
+        # Lần trừ kho vừa commit song song
+        db.rollback()
+        return False
+    return True
+
+
+def _request_id(hold_id: str, reason: str) -> str:
+    return f"hold:{hold_id}:{reason}"
+
+
+def _change_stock(
+    db: Session, hold_id: str, quantities: Dict[int, int], sign: int, order_id: Optional[int], reason: str
+):
+    crud.update_stock_bulk(
+        db,
+        InventoryBulkUpdate(
+            items=[
+                InventoryUpdate(product_id=product_id, change_quantity=sign * quantity)
+                for product_id, quantity in quantities.items()
+            ],
+            order_id=order_id,
+            request_id=_request_id(hold_id, reason),
+        ),
+    )
+
+
+class HoldSweeper:
+    """
+    Hết hạn hold đúng giờ: min-heap (expires_at, hold_id) trong bộ nhớ cho các hold do instance
+    này tạo / còn ACTIVE lúc khởi động, thread nền ngủ tới hạn gần nhất (được đánh thức khi có
+    hold hết hạn sớm hơn). Thêm 1 lần quét DB (index status, expires_at) mỗi
+    STOCK_HOLD_SWEEP_INTERVAL giây cho hold do instance khác tạo.
+    Hold đã confirm / release trước hạn vẫn nằm trong heap; tới hạn UPDATE có điều kiện bỏ qua.
+    Lần quét DB cũng trả tiếp hàng cho các hold kẹt ở RELEASING / EXPIRING, và dọn hold
+    RESERVING quá hạn (create_hold chết giữa chừng).
+    """
+
+    def __init__(self, session_factory=SessionLocal):
+        self.session_factory = session_factory
+        self._heap: List[Tuple[datetime, str]] = []
+        self._cond = threading.Condition()
+        self._stopped = False
+        self.expired = 0
+
+    def schedule(self, hold_id: str, expires_at: datetime):
+        with self._cond:
+            heapq.heappush(self._heap, (expires_at, hold_id))
+            if self._heap[0][1] == hold_id:
+                self._cond.notify()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+    def _pop_due(self, now: datetime) -> List[str]:
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            due.append(heapq.heappop(self._heap)[1])
+        return due
+
+    def load_active(self):
+        db = self.session_factory()
+        try:
+            rows = (
+                db.query(models.InventoryHold.expires_at, models.InventoryHold.id)
+                .filter(models.InventoryHold.status.in_((HOLD_ACTIVE, HOLD_RESERVING)))
+                .all()
+            )
+        finally:
+            db.close()
+        with self._cond:
+            self._heap.extend((expires_at, hold_id) for expires_at, hold_id in rows)
+            heapq.heapify(self._heap)
+        return len(rows)
+
+    def expire(self, hold_ids: List[str]):
+        db = self.session_factory()
+        try:
+            for hold_id in hold_ids:
+                try:
+                    if finish_hold(db, hold_id, HOLD_EXPIRED) == HOLD_EXPIRED:
+                        self.expired += 1
+                except Exception:
+                    db.rollback()
+                    logger.exception("Failed to expire hold %s", hold_id)
+        finally:
+            db.close()
+
+    def sweep_db(self):
+        db = self.session_factory()
+        try:
+            hold_ids = [
+                hold_id
+                for (hold_id,) in db.query(models.InventoryHold.id)
+                .filter(
+                    or_(
+                        and_(
+                            models.InventoryHold.status.in_((HOLD_ACTIVE, HOLD_RESERVING)),
+                            models.InventoryHold.expires_at <= datetime.utcnow(),
+                        ),
+                        # Lần trả hàng trước lỗi
+                        models.InventoryHold.status.in_(list(FINAL_STATUS)),
+                    )
+                )
+                .order_by(models.InventoryHold.expires_at)
+                .limit(SWEEP_BATCH)
+            ]
+        finally:
+            db.close()
+        self.expire(hold_ids)
+
+    def run(self):
+        next_db_sweep = datetime.utcnow()
+        while True:
+            with self._cond:
+                if self._stopped:
+                    return
+                now = datetime.utcnow()
+                wake_at = next_db_sweep
+                if self._heap and self._heap[0][0] < wake_at:
+                    wake_at = self._heap[0][0]
+                if wake_at > now:
+                    self._cond.wait((wake_at - now).total_seconds())
+                    continue
+                due = self._pop_due(now)
+            try:
+                if due:
+                    self.expire(due)
+                if now >= next_db_sweep:
+                    next_db_sweep = now + timedelta(seconds=settings.STOCK_HOLD_SWEEP_INTERVAL)
+                    self.sweep_db()
+            except Exception:
+                logger.exception("Hold sweeper failed")
+
+    def stats(self) -> dict:
+        with self._cond:
+            scheduled = len(self._heap)
+            next_expiry = self._heap[0][0] if self._heap else None
+        return {"scheduled": scheduled, "next_expiry": next_expiry, "expired": self.expired}
+
+
+hold_sweeper = HoldSweeper()
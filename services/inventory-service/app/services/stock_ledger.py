@@ -0,0 +1,244 @@
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from app.core.config import settings
+from app.db import models
+from app.db.database import SessionLocal
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# Giới hạn số id trong 1 câu UPDATE ... WHERE id IN (...) khi đánh dấu đã gộp
+MARK_CHUNK = 1000
+
+_stats_lock = threading.Lock()
+_stats = {"runs": 0, "compacted_movements": 0, "compacted_products": 0, "conflicts": 0}
+_last_compaction_at: Optional[float] = None
+
+
+def record_movements(
+    db: Session,
+    changes: Dict[int, int],
+    order_id: Optional[int] = None,
+    request_id: Optional[str] = None,
+    compacted: bool = True,
+):
+    """
+    Ghi các thay đổi {product_id: delta} vào sổ cái trong transaction hiện tại (1 câu INSERT nhiều dòng).
+    compacted=True: delta đã được cộng vào inventory.quantity trong cùng transaction;
+    False: chỉ có ở sổ cái, compaction sẽ gộp vào sau.
+    """
+    if not settings.STOCK_LEDGER_ENABLED or not changes:
+        return
+    db.execute(
+        models.InventoryMovement.__table__.insert(),
+        [
+            {
+                "product_id": product_id,
+                "change_quantity": change_quantity,
+                "order_id": order_id,
+                "request_id": request_id,
+                "compacted": compacted,
+            }
+            for product_id, change_quantity in changes.items()
+        ],
+    )
+
+
+def insert_movements(db: Session, rows: List[dict]):
+    """Ghi sẵn nhiều dòng (vd: batch SKU nóng từ Redis, đã có created_at) trong transaction hiện tại"""
+    if not settings.STOCK_LEDGER_ENABLED or not rows:
+        return
+    db.execute(models.InventoryMovement.__table__.insert(), rows)
+
+
+def pending_totals(db: Session, product_ids: Iterable[int]) -> Dict[int, int]:
+    """Tổng delta chưa gộp của từng sản phẩm (sản phẩm không có phần chưa gộp thì không có trong kết quả)"""
+    product_ids = list(product_ids)
+    if not settings.STOCK_LEDGER_ENABLED or not product_ids:
+        return {}
+    rows = (
+        db.query(models.InventoryMovement.product_id, func.sum(models.InventoryMovement.change_quantity))
+        .filter(
+            models.InventoryMovement.product_id.in_(product_ids),
+            models.InventoryMovement.compacted.is_(False),
+        )
+        .group_by(models.InventoryMovement.product_id)
+        .all()
+    )
+    # MySQL trả SUM dạng Decimal
+    return {product_id: int(total) for product_id, total in rows}
+
+
+def pending_product_ids(db: Session, after: int, limit: int) -> List[int]:
+    """Các product_id (> after, tăng dần) đang có phần chưa gộp, cho phân trang keyset"""
+    if not settings.STOCK_LEDGER_ENABLED:
+        return []
+    return [
+        product_id
+        for (product_id,) in db.query(models.InventoryMovement.product_id)
+        .filter(
+            models.InventoryMovement.product_id > after,
+            models.InventoryMovement.compacted.is_(False),
+        )
+        .group_by(models.InventoryMovement.product_id)
+        .order_by(models.InventoryMovement.product_id)
+        .limit(limit)
+    ]
+
+
+def pending_total_expr(product_id: int):
+    """Biểu thức SQL (subquery) tổng delta chưa gộp, dùng trong điều kiện UPDATE trừ kho"""
+    if not settings.STOCK_LEDGER_ENABLED:
+        return 0
+    return (
+        select(func.coalesce(func.sum(models.InventoryMovement.change_quantity), 0))
+        .where(
+            models.InventoryMovement.product_id == product_id,
+            models.InventoryMovement.compacted.is_(False),
+        )
+        .scalar_subquery()
+    )
+
+
+def list_movements(
+    db: Session, product_id: int, before: Optional[int] = None, limit: int = 100
+) -> List[models.InventoryMovement]:
+    query = db.query(models.InventoryMovement).filter(
+        models.InventoryMovement.product_id == product_id
+    )
+    if before is not None:
+        query = query.filter(models.InventoryMovement.id < before)
+    return query.order_by(models.InventoryMovement.id.desc()).limit(limit).all()
+
+
+def compact_batch(db: Session, batch_size: int) -> int:
+    """
+    Gộp tối đa ~batch_size dòng chưa gộp vào inventory trong 1 transaction; trả về số dòng đã gộp.
+    Khóa hàng inventory trước (theo product_id tăng dần) rồi mới khóa các dòng sổ cái, cùng thứ tự
+    với lệnh trừ kho (khóa hàng inventory rồi đọc phần chưa gộp), nên 2 bên không deadlock.
+    """
+    product_ids = sorted({
+        product_id
+        for (product_id,) in db.query(models.InventoryMovement.product_id)
+        .filter(models.InventoryMovement.compacted.is_(False))
+        .order_by(models.InventoryMovement.id)
+        .limit(batch_size)
+    })
+    if not product_ids:
+        db.rollback()
+        return 0
+
+    rows = (
+        db.query(models.Inventory)
+        .filter(models.Inventory.product_id.in_(product_ids))
+        .order_by(models.Inventory.product_id)
+        .with_for_update()
+        .all()
+    )
+    items = {row.product_id: row for row in rows}
+    movements = (
+        db.query(models.InventoryMovement.id, models.InventoryMovement.product_id,
+                 models.InventoryMovement.change_quantity)
+        .filter(
+            models.InventoryMovement.product_id.in_(product_ids),
+            models.InventoryMovement.compacted.is_(False),
+        )
+        .with_for_update()
+        .all()
+    )
+    totals: Dict[int, int] = defaultdict(int)
+    for _, product_id, change_quantity in movements:
+        totals[product_id] += change_quantity
+
+    for product_id in sorted(totals):
+        if product_id in items:
+            items[product_id].quantity += totals[product_id]
+        else:
+            db.add(models.Inventory(product_id=product_id, quantity=totals[product_id]))
+    ids = [movement_id for movement_id, _, _ in movements]
+    for start in range(0, len(ids), MARK_CHUNK):
+        (
+            db.query(models.InventoryMovement)
+            .filter(models.InventoryMovement.id.in_(ids[start:start + MARK_CHUNK]))
+            .update({models.InventoryMovement.compacted: True}, synchronize_session=False)
+        )
+    db.commit()
+
+    with _stats_lock:
+        _stats["compacted_movements"] += len(ids)
+        _stats["compacted_products"] += len(totals)
+    return len(ids)
+
+
+def compact(session_factory=SessionLocal, batch_size: Optional[int] = None) -> int:
+    """Gộp toàn bộ phần chưa gộp (nhiều batch); trả về tổng số dòng đã gộp"""
+    global _last_compaction_at
+    batch_size = batch_size or settings.STOCK_LEDGER_COMPACT_BATCH
+    total = 0
+    db = session_factory()
+    try:
+        while True:
+            try:
+                compacted = compact_batch(db, batch_size)
+            except IntegrityError:
+                # Lệnh khác vừa tạo hàng inventory cho cùng sản phẩm -> để lần sau
+                db.rollback()
+                with _stats_lock:
+                    _stats["conflicts"] += 1
+                break
+            total += compacted
+            if compacted == 0:
+                break
+    finally:
+        db.close()
+    with _stats_lock:
+        _stats["runs"] += 1
+    _last_compaction_at = time.time()
+    return total
+
+
+def run_compactor(stop: threading.Event):
+    """Gộp định kỳ mỗi STOCK_LEDGER_COMPACT_INTERVAL giây"""
+    while not stop.wait(settings.STOCK_LEDGER_COMPACT_INTERVAL):
+        try:
+            compact()
+        except Exception:
+            logger.exception("Stock ledger compaction failed")
+
+
+def stats(db: Session) -> dict:
+    with _stats_lock:
+        result = dict(_stats)
+    result["enabled"] = settings.STOCK_LEDGER_ENABLED
+    result["last_compaction_at"] = _last_compaction_at
+    result["pending_movements"] = (
+        db.query(func.count(models.InventoryMovement.id))
+        .filter(models.InventoryMovement.compacted.is_(False))
+        .scalar()
+    )
+    return result
+
+
+def movement_row(
+    product_id: int,
+    change_quantity: int,
+    created_at: datetime,
+    order_id: Optional[int] = None,
+    request_id: Optional[str] = None,
+) -> dict:
+    """1 dòng đã cộng vào inventory (compacted), cho insert_movements"""
+    return {
+        "product_id": product_id,
+        "change_quantity": change_quantity,
+        "order_id": order_id,
+        "request_id": request_id,
+        "compacted": True,
+        "created_at": created_at,
+    }
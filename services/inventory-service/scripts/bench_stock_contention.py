@@ -0,0 +1,114 @@
+"""
+Benchmark tranh chấp kho: nhiều luồng cùng trừ kho 1 product_id.
+
+So sánh đường nhanh (UPDATE có điều kiện) với đường khóa FOR UPDATE cũ, và
+(khi HOT_STOCK_ENABLED=true, có REDIS_URL) chế độ SKU nóng trừ ở Redis.
+Chạy trong container inventory-service (cần các biến môi trường MYSQL_*):
+
+    PYTHONPATH=. python scripts/bench_stock_contention.py --workers 32 --ops 4000
+"""
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.core.config import settings
+from app.db import models
+from app.db.database import Base
+from app.models.inventory import InventoryUpdate
+from app.services import inventory_service as crud
+from app.services.hot_stock import hot_stock
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+MODES = {
+    "conditional-update": crud.update_stock,
+    "select-for-update": crud.update_stock_locked,
+}
+
+
+def reset_stock(SessionLocal, product_id: int, quantity: int):
+    db = SessionLocal()
+    try:
+        db.query(models.Inventory).filter(models.Inventory.product_id == product_id).delete()
+        db.add(models.Inventory(product_id=product_id, quantity=quantity))
+        db.commit()
+    finally:
+        db.close()
+
+
+def run_mode(SessionLocal, update_fn, product_id: int, workers: int, ops: int):
+    latencies = []
+    rejected = 0
+
+    def one_decrement(_):
+        db = SessionLocal()
+        start = time.perf_counter()
+        try:
+            update_fn(db, InventoryUpdate(product_id=product_id, change_quantity=-1))
+            return time.perf_counter() - start, False
+        except HTTPException:
+            return time.perf_counter() - start, True
+        finally:
+            db.close()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for latency, was_rejected in pool.map(one_decrement, range(ops)):
+            latencies.append(latency)
+            rejected += was_rejected
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "ops_per_sec": ops / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "rejected": rejected,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--product-id", type=int, default=999999)
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--ops", type=int, default=4000)
+    args = parser.parse_args()
+
+    engine = create_engine(
+        settings.DATABASE_URL, pool_size=args.workers, max_overflow=0
+    )
+    Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    modes = dict(MODES)
+    if hot_stock.enabled:
+        modes["redis-hot"] = crud.update_stock
+
+    print(f"product_id={args.product_id} workers={args.workers} ops={args.ops}")
+    for name, update_fn in modes.items():
+        # Đủ hàng cho mọi lệnh trừ, để đo thuần tranh chấp khóa
+        reset_stock(SessionLocal, args.product_id, args.ops)
+        if name == "redis-hot":
+            hot_stock.promote(args.product_id)
+        result = run_mode(SessionLocal, update_fn, args.product_id, args.workers, args.ops)
+        db = SessionLocal()
+        try:
+            final = crud.get_stock(db, args.product_id).quantity
+        finally:
+            db.close()
+        if name == "redis-hot":
+            # Demote = ghi hết delta vào MySQL; final_quantity ở trên đọc từ Redis
+            hot_stock.demote(args.product_id)
+        print(
+            f"{name:>20}: {result['ops_per_sec']:8.0f} ops/s  "
+            f"p50={result['p50_ms']:6.2f}ms  p99={result['p99_ms']:7.2f}ms  "
+            f"rejected={result['rejected']}  final_quantity={final}"
+        )
+
+    reset_stock(SessionLocal, args.product_id, 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,18 @@
-from typing import List
+import logging
+from typing import List, Optional
+
+import httpx
 from app.api.deps import get_current_user_email
-from app.db.database import get_db
+from app.core.http_client import get_http_client
+from app.db.database import get_async_db
 from app.models.order import OrderCreate, OrderRead
+from app.services import idempotency_service
 from app.services import order_service as crud
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
@@ -15,35 +22,89 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 @router.post("/orders/", response_model=OrderRead)
 async def create_order_endpoint(
     order_in: OrderCreate,
-    db: Session = Depends(get_db),
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
     current_user_email: str = Depends(get_current_user_email),
     token: str = Depends(oauth2_scheme),
+    client: httpx.AsyncClient = Depends(get_http_client),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255),
 ):
     """
     Tạo đơn hàng. Yêu cầu có Token đăng nhập.
+    Nếu có header Idempotency-Key: các lần gửi lại (retry) với cùng key sẽ chờ lần đầu
+    chạy xong rồi nhận lại đúng kết quả đó, không tạo thêm đơn hàng.
     """
+    lease = None
     try:
-        new_order = await crud.create_new_order(
-            db=db, order_in=order_in, user_id=current_user_email, token=token
+        if idempotency_key:
+            request_hash = idempotency_service.hash_request(order_in.model_dump_json())
+            replay, lease = await idempotency_service.begin(
+                db, current_user_email, idempotency_key, request_hash
+            )
+            if replay is not None:
+                response.headers["Idempotent-Replayed"] = "true"
+                return replay
+
+        order_id = await crud.create_new_order(
+            db=db,
+            order_in=order_in,
+            user_id=current_user_email,
+            token=token,
+            client=client,
         )
-        return new_order
     except HTTPException as e:
+        if lease:
+            await idempotency_service.release(db, current_user_email, idempotency_key, lease)
         raise e  # Gửi lại lỗi (ví dụ: "Hết hàng")
     except Exception as e:
+        if lease:
+            await idempotency_service.release(db, current_user_email, idempotency_key, lease)
         raise HTTPException(status_code=500, detail=str(e))
 
+    # Đơn hàng đã được commit: từ đây không trả key nữa (client retry sẽ tạo đơn thứ 2),
+    # lỗi khi nạp lại đơn / lưu kết quả chỉ làm key giữ IN_PROGRESS tới hết hạn khóa.
+    # Nạp lại kèm items (AsyncSession không hỗ trợ lazy load khi serialize)
+    new_order = await crud.get_order_by_id(db, order_id)
+    if lease:
+        try:
+            saved = await idempotency_service.complete(
+                db,
+                current_user_email,
+                idempotency_key,
+                lease,
+                OrderRead.model_validate(new_order).model_dump(mode="json"),
+            )
+            if not saved:
+                logger.warning(
+                    f"Idempotency-Key of order {new_order.id} expired before the order was created"
+                )
+        except Exception:
+            logger.exception(f"Failed to save idempotent response of order {new_order.id}")
+    return new_order
+
+
 # GET /api/orders/my-orders
 @router.get("/orders/my-orders", response_model=List[OrderRead])
-def read_my_orders(
-    db: Session = Depends(get_db),
+async def read_my_orders(
+    response: Response,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
     current_user_email: str = Depends(get_current_user_email)
 ):
     """
-    Lấy danh sách đơn hàng của người dùng đang đăng nhập.
+    Lấy danh sách đơn hàng của người dùng đang đăng nhập (theo từng trang).
     Sử dụng current_user_email từ Token để đảm bảo bảo mật (chống IDOR/BOLA).
+    Cursor của trang kế tiếp trả về trong header X-Next-Cursor (không có = trang cuối).
     """
     try:
-        orders = crud.get_orders_by_user(db, user_id=current_user_email)
+        orders, next_cursor = await crud.get_orders_by_user(
+            db, user_id=current_user_email, limit=limit, cursor=cursor
+        )
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
         return orders
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Lỗi khi lấy danh sách đơn hàng: {str(e)}")
\ No newline at end of file
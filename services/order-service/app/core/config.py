@@ -1,16 +1,91 @@
 import os
 
+# Gọi thẳng các service nội bộ (vd: http://inventory-service:8003/api) thay vì
+# vòng qua firewall -> nginx -> auth_request. Request được ký bằng
+# INTERNAL_SERVICE_SECRET để service nhận tin tưởng (xem app/core/internal_auth.py).
+INTERNAL_ROUTING = os.environ.get("INTERNAL_ROUTING", "false").lower() == "true"
+
+
+def _service_url(name: str, direct_default: str) -> str:
+    """URL của service phía sau: gọi thẳng (INTERNAL_ROUTING) hoặc qua firewall/gateway"""
+    if INTERNAL_ROUTING:
+        return os.environ.get(f"{name}_DIRECT_URL", direct_default)
+    return os.environ.get(f"{name}_URL")
+
 
 class Settings:
     DATABASE_URL: str = os.environ.get("DATABASE_URL")
-    USER_SERVICE_URL: str = os.environ.get("USER_SERVICE_URL")
-    PRODUCT_SERVICE_URL: str = os.environ.get("PRODUCT_SERVICE_URL")
-    INVENTORY_SERVICE_URL: str = os.environ.get("INVENTORY_SERVICE_URL")
-    CART_SERVICE_URL: str = os.environ.get("CART_SERVICE_URL")
-    PAYMENT_SERVICE_URL: str = os.environ.get("PAYMENT_SERVICE_URL")
+    # URL cho async engine (asyncpg); mặc định suy ra từ DATABASE_URL
+    ASYNC_DATABASE_URL: str = os.environ.get("ASYNC_DATABASE_URL") or (
+        DATABASE_URL or ""
+    ).replace("postgresql://", "postgresql+asyncpg://", 1)
+    DB_POOL_SIZE: int = int(os.environ.get("DB_POOL_SIZE", 10))
+    DB_MAX_OVERFLOW: int = int(os.environ.get("DB_MAX_OVERFLOW", 20))
+    SERVICE_NAME: str = "order-service"
+    INTERNAL_ROUTING: bool = INTERNAL_ROUTING
+    USER_SERVICE_URL: str = _service_url("USER_SERVICE", "http://user-service:8000/api")
+    PRODUCT_SERVICE_URL: str = _service_url(
+        "PRODUCT_SERVICE", "http://product-service:8002/api"
+    )
+    INVENTORY_SERVICE_URL: str = _service_url(
+        "INVENTORY_SERVICE", "http://inventory-service:8003/api"
+    )
+    CART_SERVICE_URL: str = _service_url("CART_SERVICE", "http://cart-service:8004/api")
+    PAYMENT_SERVICE_URL: str = _service_url(
+        "PAYMENT_SERVICE", "http://payment-service:8006/api"
+    )
+    # Ký / xác thực request giữa các service nội bộ
+    INTERNAL_SERVICE_SECRET: str = os.environ.get("INTERNAL_SERVICE_SECRET", "")
+    INTERNAL_SIGNATURE_MAX_AGE: int = int(os.environ.get("INTERNAL_SIGNATURE_MAX_AGE", 30))
     # --NEW--#
     JWT_SECRET_KEY: str = os.environ.get("JWT_SECRET_KEY")
     JWT_ALGORITHM: str = os.environ.get("JWT_ALGORITHM", "HS256")
 
+    # httpx client dùng chung cho các lời gọi nội bộ (tạo 1 lần trong lifespan)
+    HTTP_MAX_CONNECTIONS: int = int(os.environ.get("HTTP_MAX_CONNECTIONS", 100))
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = int(
+        os.environ.get("HTTP_MAX_KEEPALIVE_CONNECTIONS", 20)
+    )
+    HTTP_KEEPALIVE_EXPIRY: float = float(os.environ.get("HTTP_KEEPALIVE_EXPIRY", 30))
+    HTTP_CONNECT_TIMEOUT: float = float(os.environ.get("HTTP_CONNECT_TIMEOUT", 3))
+    HTTP_READ_TIMEOUT: float = float(os.environ.get("HTTP_READ_TIMEOUT", 10))
+    HTTP_POOL_TIMEOUT: float = float(os.environ.get("HTTP_POOL_TIMEOUT", 5))
+    # HTTP/2 chỉ được dùng với downstream https (httpx thương lượng qua ALPN)
+    HTTP2_ENABLED: bool = os.environ.get("HTTP2_ENABLED", "false").lower() == "true"
+
+    # Giữ hàng (hold) ở Inventory Service ngay khi checkout thay vì kiểm tra kho rồi trừ sau;
+    # outbox worker xác nhận hold. TTL phải đủ dài cho cả các lần retry của outbox
+    # (hold hết hạn trước thì worker quay về trừ kho trực tiếp)
+    STOCK_HOLD_ENABLED: bool = os.environ.get("STOCK_HOLD_ENABLED", "true").lower() == "true"
+    STOCK_HOLD_TTL: int = int(os.environ.get("STOCK_HOLD_TTL", 900))
+
+    # Outbox worker (trừ kho + xóa giỏ hàng sau khi đơn hàng đã lưu)
+    OUTBOX_WORKER_ENABLED: bool = (
+        os.environ.get("OUTBOX_WORKER_ENABLED", "true").lower() == "true"
+    )
+    OUTBOX_POLL_INTERVAL: float = float(os.environ.get("OUTBOX_POLL_INTERVAL", 0.5))
+    OUTBOX_BATCH_SIZE: int = int(os.environ.get("OUTBOX_BATCH_SIZE", 20))
+    OUTBOX_MAX_ATTEMPTS: int = int(os.environ.get("OUTBOX_MAX_ATTEMPTS", 8))
+    OUTBOX_BACKOFF_BASE: float = float(os.environ.get("OUTBOX_BACKOFF_BASE", 1))
+    OUTBOX_BACKOFF_MAX: float = float(os.environ.get("OUTBOX_BACKOFF_MAX", 300))
+    # Thời gian giữ 1 sự kiện đã nhận; quá hạn (worker chết) thì worker khác lấy lại
+    OUTBOX_LEASE_SECONDS: float = float(os.environ.get("OUTBOX_LEASE_SECONDS", 60))
+
+    # Idempotency-Key cho POST /api/orders/
+    IDEMPOTENCY_KEY_TTL_SECONDS: int = int(
+        os.environ.get("IDEMPOTENCY_KEY_TTL_SECONDS", 24 * 3600)
+    )
+    # Thời gian tối đa 1 request giữ key (quá hạn coi như đã chết)
+    IDEMPOTENCY_LOCK_SECONDS: float = float(
+        os.environ.get("IDEMPOTENCY_LOCK_SECONDS", 60)
+    )
+    # Request trùng chờ request đầu tiên tối đa bao lâu
+    IDEMPOTENCY_WAIT_TIMEOUT: float = float(
+        os.environ.get("IDEMPOTENCY_WAIT_TIMEOUT", 30)
+    )
+    IDEMPOTENCY_POLL_INTERVAL: float = float(
+        os.environ.get("IDEMPOTENCY_POLL_INTERVAL", 0.1)
+    )
+
 
 settings = Settings()
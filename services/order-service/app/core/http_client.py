@@ -0,0 +1,62 @@
+import httpx
+from app.core.config import settings
+from app.core.internal_auth import sign_internal_request
+from fastapi import Request
+
+
+async def _sign_request(request: httpx.Request):
+    """Ký mọi request nội bộ (để service nhận tin tưởng khi gọi thẳng, không qua gateway)"""
+    request.headers.update(
+        sign_internal_request(
+            settings.SERVICE_NAME,
+            request.method,
+            request.url.path,
+            request.url.query,
+            request.content,
+        )
+    )
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """Tạo httpx client dùng chung cho cả process (giữ kết nối keep-alive)"""
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=settings.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(
+            connect=settings.HTTP_CONNECT_TIMEOUT,
+            read=settings.HTTP_READ_TIMEOUT,
+            write=settings.HTTP_READ_TIMEOUT,
+            pool=settings.HTTP_POOL_TIMEOUT,
+        ),
+        http2=settings.HTTP2_ENABLED,
+        event_hooks={"request": [_sign_request]},
+    )
+
+
+def get_http_client(request: Request) -> httpx.AsyncClient:
+    """Dependency: lấy client đã được tạo trong lifespan của app"""
+    return request.app.state.http_client
+
+
+def get_pool_stats(client: httpx.AsyncClient) -> dict:
+    """
+    Thống kê connection pool để chọn kích thước pool khi chạy tải:
+    - active/idle: số kết nối đang dùng / đang rảnh
+    - waiting: số request đang xếp hàng chờ kết nối
+    """
+    pool = getattr(client._transport, "_pool", None)
+    connections = list(pool.connections) if pool is not None else []
+    requests = list(getattr(pool, "_requests", []))
+
+    idle = sum(1 for connection in connections if connection.is_idle())
+    waiting = sum(1 for request in requests if request.is_queued())
+    return {
+        "active": len(connections) - idle,
+        "idle": idle,
+        "waiting": waiting,
+        "max_connections": settings.HTTP_MAX_CONNECTIONS,
+        "max_keepalive_connections": settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    }
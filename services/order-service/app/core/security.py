@@ -0,0 +1,16 @@
+from datetime import datetime, timedelta, timezone
+
+from app.core.config import settings
+from jose import jwt
+
+
+def create_user_token(user_id: str, expires_delta: timedelta = timedelta(minutes=5)) -> str:
+    """
+    Tạo token ngắn hạn thay mặt người dùng (cùng secret với auth-service).
+    Dùng cho background worker gọi các API cần token người dùng (vd: xóa giỏ hàng),
+    vì token gốc của request có thể đã hết hạn khi worker chạy.
+    """
+    to_encode = {"sub": user_id, "exp": datetime.now(timezone.utc) + expires_delta}
+    return jwt.encode(
+        to_encode, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM
+    )
@@ -1,12 +1,28 @@
 from app.core.config import settings
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
-engine = create_engine(settings.DATABASE_URL)
+# Engine đồng bộ: dùng cho create_all và các script
+engine = create_engine(
+    settings.DATABASE_URL,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Engine bất đồng bộ (asyncpg): dùng cho các endpoint async, không chặn event loop
+async_engine = create_async_engine(
+    settings.ASYNC_DATABASE_URL,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+)
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False, class_=AsyncSession
+)
+
 
 # Dependency
 def get_db():
@@ -15,3 +31,9 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+# Dependency (async)
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
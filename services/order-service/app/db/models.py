@@ -1,7 +1,7 @@
 # File: services/order-service/app/db/models.py
 from app.db.database import Base
-from sqlalchemy import (Column, DateTime, ForeignKey, Integer, Numeric, String,
-                        func)
+from sqlalchemy import (JSON, Boolean, Column, DateTime, ForeignKey, Index,
+                        Integer, Numeric, String, Text, func)
 from sqlalchemy.orm import relationship
 
 
@@ -15,7 +15,7 @@ class Order(Base):
     total_price = Column(Numeric(10, 2), nullable=False)
     status = Column(
         String(50), nullable=False, default="PENDING"
-    )  # (PENDING, COMPLETED, CANCELLED)
+    )  # (PENDING, PROCESSING, COMPLETED, CANCELLED)
 
     shipping_address = Column(String(255), nullable=True)  # (Sẽ lấy từ user-service)
 
@@ -25,6 +25,16 @@ class Order(Base):
     # Mối quan hệ: Một Order có nhiều OrderItem
     items = relationship("OrderItem", back_populates="order")
 
+    # Index cho lịch sử đơn hàng (lọc theo user, mới nhất trước, phân trang keyset)
+    __table_args__ = (
+        Index(
+            "ix_orders_user_id_created_at",
+            user_id,
+            created_at.desc(),
+            id.desc(),
+        ),
+    )
+
 
 class OrderItem(Base):
     __tablename__ = "order_items"
@@ -40,3 +50,53 @@ class OrderItem(Base):
 
     # Mối quan hệ: Một OrderItem thuộc về một Order
     order = relationship("Order", back_populates="items")
+
+
+class OutboxEvent(Base):
+    """
+    Transactional outbox: ghi cùng transaction với Order,
+    background worker sẽ đọc và gọi Inventory/Cart Service (có retry + backoff).
+    """
+
+    __tablename__ = "order_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    order_id = Column(Integer, ForeignKey("orders.id"), nullable=False, index=True)
+    event_type = Column(String(50), nullable=False)  # (ORDER_PAID)
+    payload = Column(JSON, nullable=False)
+    status = Column(
+        String(20), nullable=False, default="PENDING"
+    )  # (PENDING, PROCESSING, DONE, FAILED)
+
+    # Các bước đã xong, để retry không làm lại (vd: không trừ kho 2 lần)
+    inventory_done = Column(Boolean, nullable=False, default=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, server_default=func.now())
+    last_error = Column(Text, nullable=True)
+
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        Index("ix_order_outbox_status_next_attempt_at", status, next_attempt_at),
+    )
+
+
+class IdempotencyKey(Base):
+    """
+    Idempotency-Key của POST /api/orders/ (theo từng user).
+    IN_PROGRESS: request đầu tiên đang chạy (các request trùng sẽ chờ).
+    COMPLETED: lưu OrderRead để trả lại y hệt cho các request trùng sau đó.
+    """
+
+    __tablename__ = "order_idempotency_keys"
+
+    user_id = Column(String, primary_key=True)
+    key = Column(String(255), primary_key=True)
+    request_hash = Column(String(64), nullable=False)
+    status = Column(String(20), nullable=False, default="IN_PROGRESS")
+    response_body = Column(JSON, nullable=True)
+    # IN_PROGRESS: hạn khóa (process chết giữa chừng thì key được giải phóng)
+    # COMPLETED: hạn lưu kết quả (TTL)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    created_at = Column(DateTime, server_default=func.now())
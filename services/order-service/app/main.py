@@ -1,8 +1,13 @@
+import asyncio
 import logging
 import time
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from app.api.v1 import orders
-from app.db.database import Base, engine
+from app.core.config import settings
+from app.core.http_client import create_http_client, get_pool_stats
+from app.db.database import AsyncSessionLocal, Base, async_engine, engine
+from app.services.outbox_worker import OutboxWorker
 
 # --- 1. LOGGING CONFIGURATION ---
 # Create a custom logger with request_id in the format
@@ -12,10 +17,42 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Logs emitted outside a request (e.g. the outbox worker) have no request_id
+_base_record_factory = logging.getLogRecordFactory()
+
+
+def _background_record_factory(*args, **kwargs):
+    record = _base_record_factory(*args, **kwargs)
+    record.request_id = "background"
+    return record
+
+
+logging.setLogRecordFactory(_background_record_factory)
+
 # Create tables for "orders" and "order_items"
 Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title="Order Service")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One shared httpx client (connection pool) per process for downstream calls
+    app.state.http_client = create_http_client()
+    # Background worker draining the order outbox (inventory + cart after checkout)
+    outbox_worker = OutboxWorker(AsyncSessionLocal, app.state.http_client)
+    outbox_task = None
+    if settings.OUTBOX_WORKER_ENABLED:
+        outbox_task = asyncio.create_task(outbox_worker.run())
+    try:
+        yield
+    finally:
+        outbox_worker.stop()
+        if outbox_task is not None:
+            await outbox_task
+        await app.state.http_client.aclose()
+        await async_engine.dispose()
+
+
+app = FastAPI(title="Order Service", lifespan=lifespan)
 
 # --- 2. TRACE AND SAMPLE MIDDLEWARE ---
 @app.middleware("http")
@@ -71,4 +108,10 @@ app.include_router(orders.router, prefix="/api", tags=["orders"])
 @app.get("/")
 def read_root():
     """Healthcheck Endpoint"""
-    return {"service": "Order Service is running"}
\ No newline at end of file
+    return {"service": "Order Service is running"}
+
+
+@app.get("/metrics/http-pool")
+def read_http_pool_stats():
+    """Connection pool stats (active, idle, waiting) of the shared httpx client"""
+    return get_pool_stats(app.state.http_client)
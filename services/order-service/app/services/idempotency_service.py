@@ -0,0 +1,166 @@
+# File: services/order-service/app/services/idempotency_service.py
+import asyncio
+import hashlib
+import time
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from app.core.config import settings
+from app.db import models
+from fastapi import HTTPException, status
+from sqlalchemy import delete, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+def hash_request(body: str) -> str:
+    """Dấu vân tay của request body, để phát hiện 1 key bị dùng cho request khác"""
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def _new_lease() -> datetime:
+    """
+    Hạn khóa IN_PROGRESS, đồng thời là "lease" của request đang giữ key: complete / release chỉ
+    tác động lên dòng còn đúng lease này, nên request chạy quá IDEMPOTENCY_LOCK_SECONDS (key đã
+    bị request khác lấy lại) không ghi đè / xóa key của request kia.
+    So sánh bằng trên đúng giá trị này: timestamp của PostgreSQL giữ tới micro giây như datetime.
+    """
+    return datetime.utcnow() + timedelta(seconds=settings.IDEMPOTENCY_LOCK_SECONDS)
+
+
+def _same_key(user_id: str, key: str):
+    return (models.IdempotencyKey.user_id == user_id, models.IdempotencyKey.key == key)
+
+
+async def _try_acquire(
+    db: AsyncSession, user_id: str, key: str, request_hash: str
+) -> Optional[datetime]:
+    """INSERT key với trạng thái IN_PROGRESS; trả về lease, None nếu key đã tồn tại"""
+    lease = _new_lease()
+    db.add(
+        models.IdempotencyKey(
+            user_id=user_id,
+            key=key,
+            request_hash=request_hash,
+            status="IN_PROGRESS",
+            expires_at=lease,
+        )
+    )
+    try:
+        await db.commit()
+        return lease
+    except IntegrityError:
+        await db.rollback()
+        return None
+
+
+async def _try_take_over(
+    db: AsyncSession, user_id: str, key: str, request_hash: str
+) -> Optional[datetime]:
+    """
+    Lấy lại key đã hết hạn (IN_PROGRESS của lần chạy đã chết / quá chậm, hoặc COMPLETED quá TTL)
+    bằng 1 câu UPDATE có điều kiện expires_at <= now: nhiều request cùng thấy dòng hết hạn thì chỉ
+    1 request thắng (các request kia thấy lease mới, chưa hết hạn).
+    """
+    lease = _new_lease()
+    result = await db.execute(
+        update(models.IdempotencyKey)
+        .where(*_same_key(user_id, key), models.IdempotencyKey.expires_at <= datetime.utcnow())
+        .values(
+            request_hash=request_hash,
+            status="IN_PROGRESS",
+            response_body=None,
+            expires_at=lease,
+        )
+    )
+    await db.commit()
+    return lease if result.rowcount else None
+
+
+async def begin(
+    db: AsyncSession, user_id: str, key: str, request_hash: str
+) -> Tuple[Optional[dict], Optional[datetime]]:
+    """
+    Bắt đầu xử lý request có Idempotency-Key, trả về (kết quả cũ, lease).
+    - (None, lease): request này giữ key và phải chạy pipeline tạo đơn hàng, rồi gọi
+      complete / release với lease này.
+    - (dict, None): kết quả (OrderRead) đã lưu của lần chạy trước -> trả lại y hệt.
+    Request trùng đến khi lần đầu còn đang chạy sẽ chờ lần đầu xong.
+    """
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_TIMEOUT
+    while True:
+        lease = await _try_acquire(db, user_id, key, request_hash)
+        if lease is not None:
+            return None, lease
+
+        while True:
+            record = await db.get(
+                models.IdempotencyKey, (user_id, key), populate_existing=True
+            )
+            if record is None:
+                # Lần chạy trước thất bại và đã trả key -> thử giữ lại
+                break
+            if record.expires_at <= datetime.utcnow():
+                db.expunge(record)
+                lease = await _try_take_over(db, user_id, key, request_hash)
+                if lease is not None:
+                    return None, lease
+                # Request khác vừa lấy lại key -> đọc lại
+                continue
+            if record.request_hash != request_hash:
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail="Idempotency-Key đã được dùng cho một request khác",
+                )
+            if record.status == "COMPLETED":
+                return record.response_body, None
+
+            # IN_PROGRESS: chờ lần chạy đầu tiên
+            if time.monotonic() >= deadline:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="Đơn hàng với Idempotency-Key này đang được xử lý",
+                )
+            await db.rollback()  # Kết thúc transaction đọc để lần sau thấy dữ liệu mới
+            await asyncio.sleep(settings.IDEMPOTENCY_POLL_INTERVAL)
+
+
+async def complete(
+    db: AsyncSession, user_id: str, key: str, lease: datetime, response_body: dict
+) -> bool:
+    """
+    Lưu kết quả của lần chạy đầu tiên, giữ trong IDEMPOTENCY_KEY_TTL_SECONDS.
+    False nếu key không còn thuộc request này (đã chạy quá IDEMPOTENCY_LOCK_SECONDS).
+    """
+    result = await db.execute(
+        update(models.IdempotencyKey)
+        .where(
+            *_same_key(user_id, key),
+            models.IdempotencyKey.status == "IN_PROGRESS",
+            models.IdempotencyKey.expires_at == lease,
+        )
+        .values(
+            status="COMPLETED",
+            response_body=response_body,
+            expires_at=datetime.utcnow()
+            + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL_SECONDS),
+        )
+    )
+    await db.commit()
+    return bool(result.rowcount)
+
+
+async def release(db: AsyncSession, user_id: str, key: str, lease: datetime):
+    """
+    Trả key (khi tạo đơn thất bại, chưa có đơn hàng) để client có thể thử lại với cùng key.
+    Chỉ xóa nếu key vẫn thuộc request này.
+    """
+    await db.rollback()
+    await db.execute(
+        delete(models.IdempotencyKey).where(
+            *_same_key(user_id, key),
+            models.IdempotencyKey.status == "IN_PROGRESS",
+            models.IdempotencyKey.expires_at == lease,
+        )
+    )
+    await db.commit()
@@ -1,11 +1,21 @@
 # File: services/order-service/app/services/order_service.py
+import asyncio
+import base64
+import logging
+from datetime import datetime
 from decimal import Decimal
+from typing import List, Optional, Tuple
+
 import httpx
 from app.core.config import settings
 from app.db import models
 from app.models.order import OrderCreate
 from fastapi import HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+logger = logging.getLogger(__name__)
 
 # --- Các hàm gọi API nội bộ ---
 
@@ -31,34 +41,112 @@ async def fetch_user_address(client: httpx.AsyncClient, user_id: str) -> str:
     return "123 Đường ABC, Quận 1, TPHCM"  # Giả định
 
 
-async def validate_item(
-    client: httpx.AsyncClient, product_id: int, quantity_requested: int
-) -> Decimal:
+# Số id tối đa trong 1 request đọc nhiều (giới hạn của Product Service / Inventory Service);
+# giỏ hàng lớn hơn được chia thành nhiều request chạy song song
+PRODUCT_BATCH_MAX_IDS = 200
+INVENTORY_BULK_MAX_IDS = 500
+
+
+def _chunks(product_ids: List[int], size: int) -> List[List[int]]:
+    return [product_ids[start:start + size] for start in range(0, len(product_ids), size)]
+
+
+async def fetch_products(client: httpx.AsyncClient, product_ids: List[int]) -> dict:
     """
-    Kiểm tra giá và kho hàng.
-    Trả về giá (nếu hợp lệ) hoặc ném Exception (nếu lỗi).
+    Gọi Product Service lấy giá MỚI NHẤT của nhiều sản phẩm (1 request mỗi 200 id).
+    Trả về dict {product_id: product}; sản phẩm không tồn tại sẽ không có trong dict.
     """
-
-    # 1. Gọi Product Service lấy giá MỚI NHẤT
-    product_url = f"{settings.PRODUCT_SERVICE_URL}/products/{product_id}"
-    product_response = await client.get(product_url)
-    if product_response.status_code != 200:
-        raise HTTPException(
-            status_code=400, detail=f"Sản phẩm ID {product_id} không tồn tại"
+    url = f"{settings.PRODUCT_SERVICE_URL}/products/batch"
+    responses = await asyncio.gather(*[
+        client.get(url, params={"ids": ",".join(str(pid) for pid in chunk)})
+        for chunk in _chunks(product_ids, PRODUCT_BATCH_MAX_IDS)
+    ])
+    products = {}
+    for response in responses:
+        if response.status_code != 200:
+            raise HTTPException(
+                status_code=400, detail="Không lấy được thông tin sản phẩm"
+            )
+        products.update(
+            {int(pid): product for pid, product in response.json()["items"].items()}
         )
+    return products
+
+
+async def fetch_stock(client: httpx.AsyncClient, product_ids: List[int]) -> dict:
+    """
+    Gọi Inventory Service lấy tồn kho của nhiều sản phẩm (1 request mỗi 500 id).
+    Trả về dict {product_id: quantity}; sản phẩm chưa có trong kho có số lượng 0.
+    """
+    url = f"{settings.INVENTORY_SERVICE_URL}/inventory"
+    responses = await asyncio.gather(*[
+        client.get(url, params={"ids": ",".join(str(pid) for pid in chunk)})
+        for chunk in _chunks(product_ids, INVENTORY_BULK_MAX_IDS)
+    ])
+    stock = {}
+    for response in responses:
+        if response.status_code != 200:
+            raise HTTPException(status_code=400, detail="Không lấy được thông tin tồn kho")
+        stock.update({item["product_id"]: item["quantity"] for item in response.json()["items"]})
+    return stock
+
+
+async def create_stock_hold(client: httpx.AsyncClient, cart_items: List[dict]) -> str:
+    """
+    Gọi Inventory Service giữ hàng cho cả giỏ (tất cả hoặc không món nào), trả về hold_id.
+    Hết hàng -> 400 với thông báo của Inventory Service.
+    """
+    url = f"{settings.INVENTORY_SERVICE_URL}/inventory/holds"
+    payload = {
+        "items": [
+            {"product_id": item["product_id"], "quantity": item["quantity"]}
+            for item in cart_items
+        ],
+        "ttl_seconds": settings.STOCK_HOLD_TTL,
+    }
+    response = await client.post(url, json=payload)
+    if response.status_code == 400:
+        raise HTTPException(status_code=400, detail=response.json().get("detail"))
+    if response.status_code != 201:
+        raise HTTPException(status_code=400, detail="Không giữ được hàng trong kho")
+    return response.json()["id"]
+
+
+async def release_stock_hold(client: httpx.AsyncClient, hold_id: str):
+    """Trả lại hàng đã giữ (checkout thất bại). Lỗi chỉ ghi log: hold sẽ tự hết hạn."""
+    url = f"{settings.INVENTORY_SERVICE_URL}/inventory/holds/{hold_id}/release"
+    try:
+        response = await client.post(url)
+        response.raise_for_status()
+    except httpx.HTTPError as e:
+        logger.warning(f"Release stock hold {hold_id} failed (will expire on its own): {e}")
 
-    price = Decimal(product_response.json()["price"])
 
-    # 2. Gọi Inventory Service kiểm tra kho
-    inventory_url = f"{settings.INVENTORY_SERVICE_URL}/inventory/{product_id}"
-    inventory_response = await client.get(inventory_url)
-    if inventory_response.status_code != 200:
+async def confirm_stock_hold(client: httpx.AsyncClient, hold_id: str, order_id: int):
+    """Xác nhận hold (đơn hàng đã lưu): hàng đã giữ thành hàng đã bán"""
+    url = f"{settings.INVENTORY_SERVICE_URL}/inventory/holds/{hold_id}/confirm"
+    response = await client.post(url, json={"order_id": order_id})
+    response.raise_for_status()
+
+
+def validate_item(
+    product_id: int, quantity_requested: int, products: dict, stock: Optional[dict]
+) -> Decimal:
+    """
+    Kiểm tra giá và kho hàng của 1 món (dữ liệu đã lấy sẵn cho cả giỏ).
+    stock = None: hàng đã được giữ bằng hold, không cần kiểm tra kho.
+    Trả về giá (nếu hợp lệ) hoặc ném Exception (nếu lỗi).
+    """
+    # 1. Giá MỚI NHẤT
+    product = products.get(product_id)
+    if product is None:
         raise HTTPException(
-            status_code=400, detail=f"Không tìm thấy kho cho sản phẩm ID {product_id}"
+            status_code=400, detail=f"Sản phẩm ID {product_id} không tồn tại"
         )
+    price = Decimal(product["price"])
 
-    stock_quantity = inventory_response.json()["quantity"]
-
+    # 2. Tồn kho
+    stock_quantity = stock.get(product_id, 0) if stock is not None else quantity_requested
     if quantity_requested > stock_quantity:
         raise HTTPException(
             status_code=400,
@@ -69,19 +157,99 @@ async def validate_item(
     return price
 
 
-async def decrease_inventory(client: httpx.AsyncClient, product_id: int, quantity: int):
-    """Gọi Inventory Service để TRỪ KHO"""
-    url = f"{settings.INVENTORY_SERVICE_URL}/inventory/update"
-    payload = {"product_id": product_id, "change_quantity": -abs(quantity)}  # Gửi số âm
+async def validate_items(client: httpx.AsyncClient, cart_items: List[dict]) -> List[dict]:
+    """
+    Kiểm tra tất cả món hàng trong giỏ: giá (request batch tới Product Service)
+    và tồn kho (request bulk tới Inventory Service) chạy song song.
+    Trả về danh sách đã kiểm tra theo đúng thứ tự giỏ hàng.
+    Nếu có lỗi: ném lỗi của món đứng đầu tiên trong giỏ bị lỗi.
+    """
+    product_ids = list(dict.fromkeys(item["product_id"] for item in cart_items))
+    products_task = asyncio.create_task(fetch_products(client, product_ids))
+    stock_task = asyncio.create_task(fetch_stock(client, product_ids))
+    try:
+        products, stock = await asyncio.gather(products_task, stock_task)
+    finally:
+        # 1 request lỗi -> không chờ request còn lại
+        for task in (products_task, stock_task):
+            if not task.done():
+                task.cancel()
+
+    return _priced_items(cart_items, products, stock)
+
+
+def _priced_items(cart_items: List[dict], products: dict, stock: Optional[dict]) -> List[dict]:
+    return [
+        {
+            "product_id": item["product_id"],
+            "quantity": item["quantity"],
+            "price_at_purchase": validate_item(
+                item["product_id"], item["quantity"], products, stock
+            ),
+        }
+        for item in cart_items
+    ]
+
+
+async def reserve_items(
+    client: httpx.AsyncClient, cart_items: List[dict]
+) -> Tuple[List[dict], str]:
+    """
+    Như validate_items nhưng giữ hàng (hold) thay vì chỉ đọc tồn kho: lấy giá và tạo hold
+    chạy song song. 2 người mua cùng lúc không thể cùng qua bước này với món hàng cuối cùng.
+    Trả về (danh sách đã kiểm tra, hold_id); lỗi thì hold (nếu đã tạo) được trả lại ngay.
+    """
+    product_ids = list(dict.fromkeys(item["product_id"] for item in cart_items))
+    # Không hủy request tạo hold giữa chừng (có thể đã giữ hàng): chờ cả 2 rồi mới xử lý lỗi
+    products, hold_id = await asyncio.gather(
+        fetch_products(client, product_ids),
+        create_stock_hold(client, cart_items),
+        return_exceptions=True,
+    )
+    try:
+        if isinstance(products, BaseException):
+            raise products
+        validated_items = _priced_items(cart_items, products, None)
+    except BaseException:
+        if isinstance(hold_id, str):
+            await release_stock_hold(client, hold_id)
+        raise
+    if isinstance(hold_id, BaseException):
+        raise hold_id
+    return validated_items, hold_id
+
+
+async def decrease_inventory(
+    client: httpx.AsyncClient,
+    validated_items: List[dict],
+    order_id: Optional[int] = None,
+    request_id: Optional[str] = None,
+):
+    """
+    Gọi Inventory Service để TRỪ KHO cả đơn hàng trong 1 transaction.
+    order_id / request_id được lưu vào sổ cái tồn kho (đối soát kho theo đơn hàng);
+    gửi lại cùng request_id không trừ kho lần 2.
+    """
+    url = f"{settings.INVENTORY_SERVICE_URL}/inventory/bulk-update"
+    payload = {
+        "items": [
+            # Gửi số âm
+            {"product_id": v_item["product_id"], "change_quantity": -abs(v_item["quantity"])}
+            for v_item in validated_items
+        ],
+        "order_id": order_id,
+        "request_id": request_id,
+    }
     response = await client.post(url, json=payload)
-    response.raise_for_status()  # Ném lỗi nếu trừ kho thất bại
+    response.raise_for_status()  # Ném lỗi nếu trừ kho thất bại (không món nào bị trừ)
 
 
 async def clear_cart(client: httpx.AsyncClient, user_id: str, token: str):
     """Gọi Cart Service để XÓA GIỎ HÀNG"""
     url = f"{settings.CART_SERVICE_URL}/cart/"
     headers = {"Authorization": f"Bearer {token}"}
-    await client.delete(url, headers=headers)
+    response = await client.delete(url, headers=headers)
+    response.raise_for_status()
 
 
 async def call_payment_service(
@@ -110,126 +278,154 @@ async def call_payment_service(
 
 
 async def create_new_order(
-    db: Session, order_in: OrderCreate, user_id: str, token: str
-) -> models.Order:
-
-    async with httpx.AsyncClient() as client:
-
-        # 1. Lấy giỏ hàng
-        cart = await fetch_cart(client, user_id, token)
-        cart_items = cart.get("items", [])
-        if not cart_items:
-            raise HTTPException(status_code=400, detail="Giỏ hàng trống")
-
-        # 2. Lấy địa chỉ
-        shipping_address = await fetch_user_address(client, user_id)
-
-        total_price = Decimal(0)
-        validated_items = []
-
-        # 3. Kiểm tra từng món hàng
-        for item in cart_items:
-            product_id = item["product_id"]
-            quantity = item["quantity"]
-            price = await validate_item(client, product_id, quantity)
-            total_price += price * quantity
-            validated_items.append(
-                {
-                    "product_id": product_id,
-                    "quantity": quantity,
-                    "price_at_purchase": price,
-                }
-            )
+    db: AsyncSession,
+    order_in: OrderCreate,
+    user_id: str,
+    token: str,
+    client: httpx.AsyncClient,
+) -> int:
+    """
+    `client` là httpx client dùng chung của process (tạo trong lifespan),
+    nên các lời gọi nội bộ được tái sử dụng kết nối keep-alive.
+    Trả về ID đơn hàng vừa commit; lỗi ném ra từ hàm này nghĩa là chưa có đơn hàng.
+    """
 
-        # 4. Lưu Order (với trạng thái PENDING)
-        # Chúng ta phải lưu trước để lấy Order ID
-        db_order = models.Order(
-            user_id=user_id,
-            total_price=total_price,
-            shipping_address=shipping_address,
-            status="PENDING",  # Trạng thái chờ thanh toán
+    # 1. Lấy giỏ hàng
+    cart = await fetch_cart(client, user_id, token)
+    cart_items = cart.get("items", [])
+    if not cart_items:
+        raise HTTPException(status_code=400, detail="Giỏ hàng trống")
+
+    # 2. Lấy địa chỉ
+    shipping_address = await fetch_user_address(client, user_id)
+
+    # 3. Kiểm tra các món hàng (song song, giữ nguyên thứ tự giỏ hàng) và giữ hàng
+    hold_id = None
+    if settings.STOCK_HOLD_ENABLED:
+        validated_items, hold_id = await reserve_items(client, cart_items)
+    else:
+        validated_items = await validate_items(client, cart_items)
+    try:
+        order_id = await _save_order(db, user_id, shipping_address, validated_items, hold_id)
+    except BaseException:
+        # Đơn hàng không được tạo -> trả hàng đã giữ (outbox chưa được ghi nên không ai confirm)
+        if hold_id is not None:
+            await release_stock_hold(client, hold_id)
+        raise
+    return order_id
+
+
+async def _save_order(
+    db: AsyncSession,
+    user_id: str,
+    shipping_address: str,
+    validated_items: List[dict],
+    hold_id: Optional[str],
+) -> int:
+    total_price = sum(
+        (v_item["price_at_purchase"] * v_item["quantity"] for v_item in validated_items),
+        Decimal(0),
+    )
+
+    # 4. Lưu Order, OrderItems và sự kiện outbox trong CÙNG 1 transaction.
+    # flush để lấy Order ID (chưa commit): lỗi ở bất kỳ bước nào thì không còn đơn PENDING rỗng.
+    # Trừ kho (xác nhận hold) và xóa giỏ hàng do outbox worker thực hiện sau (có retry),
+    # nên thời gian checkout không phụ thuộc service chậm nhất phía sau.
+    db_order = models.Order(
+        user_id=user_id,
+        total_price=total_price,
+        shipping_address=shipping_address,
+        status="PENDING",  # Trạng thái chờ thanh toán
+    )
+    db.add(db_order)
+    await db.flush()
+
+    for v_item in validated_items:
+        db_item = models.OrderItem(
+            product_id=v_item["product_id"],
+            quantity=v_item["quantity"],
+            price_at_purchase=v_item["price_at_purchase"],
+            order_id=db_order.id,
         )
-        db.add(db_order)
-        db.commit()  # Commit để lấy ID
-        db.refresh(db_order)
-
-        # 5. Gọi Payment Service
-        try:
-            # payment_result = await call_payment_service(client, order_id=db_order.id, amount=total_price)
-            db_order.status = "COMPLETED"  # Cập nhật trạng thái
-            db.add(db_order)
-
-        except HTTPException as e:
-            # Nếu thanh toán thất bại (lỗi 402)
-            db_order.status = "PAYMENT_FAILED"
-            db.add(db_order)
-            db.commit()
-            raise e  # Ném lỗi 402 về cho client
-        except Exception as e:
-            db_order.status = "PAYMENT_ERROR"
-            db.add(db_order)
-            db.commit()
-            raise HTTPException(
-                status_code=500, detail=f"Loi he thong khi thanh toan {str(e)}"
-            )
-        # 6. Lưu OrderItems (chỉ sau khi thanh toán gần như OK)
-        for v_item in validated_items:
-            db_item = models.OrderItem(
-                product_id=v_item["product_id"],
-                quantity=v_item["quantity"],
-                price_at_purchase=v_item["price_at_purchase"],
-                order_id=db_order.id,
-            )
-            db.add(db_item)
-
-        # 7. Trừ kho và Xóa giỏ hàng (Sau khi đã chắc chắn)
-        try:
-            for v_item in validated_items:
-                await decrease_inventory(
-                    client, v_item["product_id"], v_item["quantity"]
-                )
-
-            await clear_cart(client, user_id, token)
-
-        except httpx.HTTPStatusError as e:
-            # Nếu trừ kho lỗi (rất nghiêm trọng)
-            db.rollback()
-            db_order.status = "INVENTORY_FAILED"
-            db.add(db_order)
-            db.commit()
-            raise HTTPException(
-                status_code=500, detail=f"Thanh toán thành công nhưng lỗi trừ kho: {e}"
-            )
-        except httpx.ReadError as e:
-            db.rollback()
-            raise HTTPException(
-                status_code=500, detail=f"Loi ket noi khi tru kho/xoa don hang {e}"
-            )
-        except Exception as e:
-            db.rollback()
-            db_order.status = "UNKNOWN ERROR"
-            db.add(db_order)
-            db.commit()
-            raise HTTPException(
-                status_code=500, detail=f"Loi he thong khong xac dinh {e}"
-            )
+        db.add(db_item)
+
+    db.add(
+        models.OutboxEvent(
+            order_id=db_order.id,
+            event_type="ORDER_PAID",
+            payload={
+                "user_id": user_id,
+                "items": [
+                    {"product_id": v_item["product_id"], "quantity": v_item["quantity"]}
+                    for v_item in validated_items
+                ],
+                # Có hold: worker xác nhận hold thay vì trừ kho
+                "hold_id": hold_id,
+            },
+            status="PENDING",
+            next_attempt_at=datetime.utcnow(),
+        )
+    )
+    db_order.status = "PROCESSING"  # Worker sẽ cập nhật COMPLETED / INVENTORY_FAILED
 
-        # 8. Hoàn tất
-        db.commit()
-        db.refresh(db_order)
-        return db_order
+    # 5. Hoàn tất
+    await db.commit()
+    return db_order.id
 
-def get_orders_by_user(db: Session, user_id: str):
+
+def encode_order_cursor(order: models.Order) -> str:
+    """Cursor của trang kế tiếp = (created_at, id) của đơn hàng cuối trang"""
+    raw = f"{order.created_at.isoformat()}|{order.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_order_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        created_at, order_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(order_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor không hợp lệ")
+
+
+async def get_orders_by_user(
+    db: AsyncSession, user_id: str, limit: int = 20, cursor: Optional[str] = None
+) -> Tuple[List[models.Order], Optional[str]]:
     """
-    Lấy danh sách tất cả đơn hàng của một người dùng, sắp xếp mới nhất lên đầu.
+    Lấy 1 trang đơn hàng của người dùng, sắp xếp mới nhất lên đầu.
+    Phân trang keyset theo (created_at, id); items được nạp bằng 1 query selectin.
+    Trả về (danh sách đơn hàng, cursor trang kế tiếp hoặc None).
     """
-    return db.query(models.Order).filter(
-        models.Order.user_id == user_id
-    ).order_by(models.Order.created_at.desc()).all()
+    query = (
+        select(models.Order)
+        .options(selectinload(models.Order.items))
+        .filter(models.Order.user_id == user_id)
+    )
+    if cursor:
+        created_at, order_id = decode_order_cursor(cursor)
+        query = query.filter(
+            tuple_(models.Order.created_at, models.Order.id) < tuple_(created_at, order_id)
+        )
+    query = query.order_by(
+        models.Order.created_at.desc(), models.Order.id.desc()
+    ).limit(limit + 1)
+
+    result = await db.execute(query)
+    orders = result.scalars().all()
+    next_cursor = None
+    if len(orders) > limit:
+        orders = orders[:limit]
+        next_cursor = encode_order_cursor(orders[-1])
+    return orders, next_cursor
 
 
-def get_order_by_id(db: Session, order_id: int):
+async def get_order_by_id(db: AsyncSession, order_id: int):
     """
     Lấy chi tiết 1 đơn hàng cụ thể (để sau này phục vụ tính năng xem chi tiết).
     """
-    return db.query(models.Order).filter(models.Order.id == order_id).first()
\ No newline at end of file
+    result = await db.execute(
+        select(models.Order)
+        .options(selectinload(models.Order.items))
+        .filter(models.Order.id == order_id)
+        .execution_options(populate_existing=True)
+    )
+    return result.scalars().first()
@@ -0,0 +1,169 @@
+# File: services/order-service/app/services/outbox_worker.py
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import List
+
+import httpx
+from app.core.config import settings
+from app.core.security import create_user_token
+from app.db import models
+from app.services.order_service import (clear_cart, confirm_stock_hold,
+                                        decrease_inventory)
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+logger = logging.getLogger(__name__)
+
+
+class PermanentOutboxError(Exception):
+    """Lỗi không thể retry (vd: Inventory Service trả về 4xx - không đủ hàng)"""
+
+
+def _backoff(attempts: int) -> timedelta:
+    """Exponential backoff: base * 2^(attempts-1), tối đa OUTBOX_BACKOFF_MAX giây"""
+    delay = settings.OUTBOX_BACKOFF_BASE * (2 ** max(0, attempts - 1))
+    return timedelta(seconds=min(delay, settings.OUTBOX_BACKOFF_MAX))
+
+
+class OutboxWorker:
+    """
+    Background worker đọc bảng order_outbox và thực hiện các bước sau thanh toán:
+    1. Trừ kho cả đơn hàng (xác nhận hold đã giữ lúc checkout, hoặc trừ trực tiếp trong 1 transaction)
+    2. Xóa giỏ hàng (Cart Service)
+    rồi ghi trạng thái cuối cùng cho Order (COMPLETED / INVENTORY_FAILED).
+    Nhiều worker (nhiều process uvicorn) chạy cùng lúc an toàn nhờ FOR UPDATE SKIP LOCKED.
+    """
+
+    def __init__(self, session_factory: async_sessionmaker, client: httpx.AsyncClient):
+        self.session_factory = session_factory
+        self.client = client
+        self._stopping = asyncio.Event()
+
+    def stop(self):
+        self._stopping.set()
+
+    async def run(self):
+        while not self._stopping.is_set():
+            try:
+                processed = await self.run_once()
+            except Exception:
+                logger.exception("Outbox worker error")
+                processed = 0
+            if processed < settings.OUTBOX_BATCH_SIZE:
+                # Hết việc -> nghỉ 1 chút (hoặc dừng ngay nếu được yêu cầu)
+                try:
+                    await asyncio.wait_for(
+                        self._stopping.wait(), timeout=settings.OUTBOX_POLL_INTERVAL
+                    )
+                except asyncio.TimeoutError:
+                    pass
+
+    async def run_once(self) -> int:
+        """Nhận 1 lô sự kiện đến hạn và xử lý, trả về số sự kiện đã xử lý"""
+        event_ids = await self._claim_batch()
+        for event_id in event_ids:
+            await self._process(event_id)
+        return len(event_ids)
+
+    async def _claim_batch(self) -> List[int]:
+        now = datetime.utcnow()
+        async with self.session_factory() as db:
+            result = await db.execute(
+                select(models.OutboxEvent)
+                .filter(
+                    # PROCESSING quá hạn lease = worker trước đã chết giữa chừng
+                    models.OutboxEvent.status.in_(("PENDING", "PROCESSING")),
+                    models.OutboxEvent.next_attempt_at <= now,
+                )
+                .order_by(models.OutboxEvent.id)
+                .limit(settings.OUTBOX_BATCH_SIZE)
+                .with_for_update(skip_locked=True)
+            )
+            events = result.scalars().all()
+            for event in events:
+                event.status = "PROCESSING"
+                event.next_attempt_at = now + timedelta(
+                    seconds=settings.OUTBOX_LEASE_SECONDS
+                )
+            await db.commit()
+            return [event.id for event in events]
+
+    async def _process(self, event_id: int):
+        async with self.session_factory() as db:
+            event = await db.get(models.OutboxEvent, event_id)
+            order = await db.get(models.Order, event.order_id)
+            user_id = event.payload["user_id"]
+
+            try:
+                if not event.inventory_done:
+                    await self._decrease_inventory(event)
+                    event.inventory_done = True
+                    order.status = "COMPLETED"
+                    await db.commit()
+
+                await clear_cart(self.client, user_id, create_user_token(user_id))
+            except PermanentOutboxError as e:
+                await self._fail(db, event, order, str(e))
+            except (httpx.HTTPError, asyncio.TimeoutError) as e:
+                await self._retry(db, event, order, f"{type(e).__name__}: {e}")
+            else:
+                event.status = "DONE"
+                event.last_error = None
+                await db.commit()
+
+    async def _decrease_inventory(self, event: models.OutboxEvent):
+        hold_id = event.payload.get("hold_id")
+        if hold_id:
+            try:
+                await confirm_stock_hold(self.client, hold_id, event.order_id)
+                return
+            except httpx.HTTPStatusError as e:
+                # 409/404: hold đã hết hạn (hàng đã trả lại kho) -> thử trừ kho trực tiếp
+                if e.response.status_code not in (404, 409):
+                    raise
+                logger.warning(
+                    f"Stock hold {hold_id} of order {event.order_id} is no longer active, "
+                    f"falling back to a direct decrement"
+                )
+        try:
+            # request_id cố định cho mọi lần thử: lần trước đã trừ kho nhưng mất response
+            # (timeout) thì Inventory Service nhận ra và không trừ lần 2
+            await decrease_inventory(
+                self.client,
+                event.payload["items"],
+                order_id=event.order_id,
+                request_id=f"outbox-{event.id}",
+            )
+        except httpx.HTTPStatusError as e:
+            # 4xx (hết hàng, dữ liệu sai) thì retry cũng vô ích
+            if e.response.status_code < 500:
+                raise PermanentOutboxError(
+                    f"Inventory Service trả về {e.response.status_code}: {e.response.text}"
+                )
+            raise
+
+    async def _retry(
+        self, db: AsyncSession, event: models.OutboxEvent, order: models.Order, error: str
+    ):
+        event.attempts += 1
+        if event.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+            await self._fail(db, event, order, error)
+            return
+        event.status = "PENDING"
+        event.last_error = error
+        event.next_attempt_at = datetime.utcnow() + _backoff(event.attempts)
+        logger.warning(
+            f"Outbox event {event.id} (order {order.id}) failed, retry #{event.attempts}: {error}"
+        )
+        await db.commit()
+
+    async def _fail(
+        self, db: AsyncSession, event: models.OutboxEvent, order: models.Order, error: str
+    ):
+        event.status = "FAILED"
+        event.last_error = error
+        if not event.inventory_done:
+            order.status = "INVENTORY_FAILED"
+        logger.error(f"Outbox event {event.id} (order {order.id}) failed permanently: {error}")
+        await db.commit()
@@ -0,0 +1,100 @@
+"""
+Benchmark độ trễ gọi nội bộ cho 1 đơn hàng: qua firewall/gateway vs gọi thẳng service.
+
+Mỗi "đơn hàng" lặp lại phần đọc của create_new_order: lấy giỏ hàng, lấy giá (batch)
+và kiểm tra kho song song cho từng sản phẩm. Không có lệnh ghi (không trừ kho).
+Chạy trong container order-service (cần JWT_SECRET_KEY, INTERNAL_SERVICE_SECRET):
+
+    docker compose exec order-service python scripts/bench_internal_routing.py --product-ids 1,2,3,4
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+from app.core.config import settings
+from app.core.internal_auth import sign_internal_request
+from app.core.security import create_user_token
+
+ROUTES = {
+    "gateway": {
+        "cart": "http://firewall:8888/api",
+        "product": "http://firewall:8888/api",
+        "inventory": "http://firewall:8888/api",
+    },
+    "direct": {
+        "cart": "http://cart-service:8004/api",
+        "product": "http://product-service:8002/api",
+        "inventory": "http://inventory-service:8003/api",
+    },
+}
+
+
+async def _sign_request(request: httpx.Request):
+    request.headers.update(
+        sign_internal_request(
+            settings.SERVICE_NAME, request.method, request.url.path, request.url.query, request.content
+        )
+    )
+
+
+async def one_order(client: httpx.AsyncClient, urls: dict, token: str, product_ids: list) -> float:
+    start = time.perf_counter()
+    headers = {"Authorization": f"Bearer {token}"}
+    (await client.get(f"{urls['cart']}/cart/", headers=headers)).raise_for_status()
+    await asyncio.gather(
+        client.get(
+            f"{urls['product']}/products/batch",
+            params={"ids": ",".join(str(pid) for pid in product_ids)},
+        ),
+        *[client.get(f"{urls['inventory']}/inventory/{pid}") for pid in product_ids],
+    )
+    return time.perf_counter() - start
+
+
+async def run_mode(name: str, token: str, product_ids: list, iterations: int, warmup: int):
+    async with httpx.AsyncClient(event_hooks={"request": [_sign_request]}) as client:
+        for _ in range(warmup):
+            await one_order(client, ROUTES[name], token, product_ids)
+        latencies = sorted(
+            [await one_order(client, ROUTES[name], token, product_ids) for _ in range(iterations)]
+        )
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+    return {
+        "mean": statistics.mean(latencies) * 1000,
+        "p50": pct(0.50),
+        "p95": pct(0.95),
+        "p99": pct(0.99),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--user-id", default="bench@example.com")
+    parser.add_argument("--product-ids", default="1,2,3,4")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=20)
+    args = parser.parse_args()
+
+    product_ids = [int(pid) for pid in args.product_ids.split(",")]
+    token = create_user_token(args.user_id)
+
+    results = {}
+    for name in ROUTES:
+        results[name] = await run_mode(name, token, product_ids, args.iterations, args.warmup)
+        r = results[name]
+        print(
+            f"{name:>8}: mean={r['mean']:7.2f}ms  p50={r['p50']:7.2f}ms  "
+            f"p95={r['p95']:7.2f}ms  p99={r['p99']:7.2f}ms"
+        )
+
+    saved = results["gateway"]["p50"] - results["direct"]["p50"]
+    print(f"direct routing saves {saved:.2f}ms per order at p50 ({len(product_ids)} items)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
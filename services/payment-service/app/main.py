@@ -1,4 +1,5 @@
 from app.api.v1 import payments
+from app.core.internal_auth import internal_caller_middleware
 from app.db.database import Base, engine
 from fastapi import FastAPI
 
@@ -7,6 +8,9 @@ Base.metadata.create_all(bind=engine)
 
 app = FastAPI(title="Payment Service")
 
+# Xác thực header ký của service nội bộ (khi được gọi thẳng, không qua gateway)
+app.middleware("http")(internal_caller_middleware)
+
 # Đặt prefix chuẩn
 app.include_router(payments.router, prefix="/api", tags=["payments"])
 
@@ -0,0 +1,61 @@
+import os
+from typing import Optional
+
+from app.core.config import settings
+from app.services import image_variants
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import FileResponse, RedirectResponse
+from fastapi.staticfiles import StaticFiles
+from starlette.concurrency import run_in_threadpool
+
+router = APIRouter()
+
+# Ảnh gốc (không có ?size=) vẫn do StaticFiles phục vụ (có ETag / 304 sẵn)
+uploads_static = StaticFiles(directory=settings.UPLOAD_DIR, check_dir=False)
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+# Redirect ?size= -> tên đã băm: cache ngắn vì ảnh gốc có thể bị thay
+REDIRECT_CACHE = "public, max-age=300"
+
+
+# GET biến thể theo tên đã băm nội dung -> cache vĩnh viễn phía trình duyệt
+@router.get("/products/images/v/{name}")
+def read_image_variant_endpoint(name: str):
+    path = image_variants.variant_path(name)
+    fmt = name.rsplit(".", 1)[-1]
+    if path is None or fmt not in image_variants.FORMATS or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Image not found")
+    return FileResponse(
+        path,
+        media_type=image_variants.FORMATS[fmt][1],
+        headers={"Cache-Control": IMMUTABLE_CACHE},
+    )
+
+
+# GET ảnh sản phẩm: ?size=320 chọn biến thể (tạo lần đầu nếu chưa có), không có size -> ảnh gốc
+# format: webp | jpeg, bỏ trống thì chọn theo header Accept
+@router.get("/products/images/{filename}")
+async def read_image_endpoint(
+    filename: str,
+    request: Request,
+    size: Optional[int] = Query(None, ge=1),
+    format: Optional[str] = None,
+):
+    if size is None:
+        return await uploads_static.get_response(filename, request.scope)
+
+    if format is None:
+        format = "webp" if "image/webp" in request.headers.get("accept", "") else "jpeg"
+    if format not in image_variants.FORMATS:
+        raise HTTPException(status_code=400, detail="format must be webp or jpeg")
+
+    width = image_variants.pick_width(size)
+    # Resize tốn CPU -> chạy trong threadpool
+    name = await run_in_threadpool(image_variants.ensure_variant, filename, width, format)
+    if name is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    return RedirectResponse(
+        url=f"/api/products/images/v/{name}",
+        status_code=302,
+        headers={"Cache-Control": REDIRECT_CACHE, "Vary": "Accept"},
+    )
@@ -1,13 +1,22 @@
-from typing import List
+from typing import List, Optional
 
 from app.db.database import get_db
 from app.models import product as schemas
+from app.core.config import settings
+from app.services import change_feed, product_import
 from app.services import product_service as crud
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.orm import Session
 
 router = APIRouter()
 
+# Giới hạn số id trong 1 request batch (tránh mệnh đề IN quá lớn)
+MAX_BATCH_IDS = 200
+SEARCH_SORTS = ("relevance", "price")
+SEARCH_TOTAL_MODES = ("exact", "cached", "estimate")
+MAX_PRICE_BUCKETS = 20
+MAX_CHANGES_LIMIT = 1000
+
 
 # POST (Tạo sản phẩm)
 @router.post("/products/", response_model=schemas.ProductRead)
@@ -20,6 +29,27 @@ def create_product_endpoint(
     return crud.create_product(db=db, product=product)
 
 
+# POST (Import hàng loạt từ CSV hoặc NDJSON, body gửi thẳng dạng stream)
+# CSV cần dòng tiêu đề: name,price,description,category,image_url
+# Trùng tên -> cập nhật toàn bộ các trường còn lại (upsert)
+@router.post("/products/import")
+async def import_products_endpoint(
+    request: Request,
+    format: Optional[str] = None,
+    batch_size: Optional[int] = Query(None, ge=1),
+    db: Session = Depends(get_db),
+):
+    if format is None:
+        content_type = request.headers.get("content-type", "")
+        format = "ndjson" if "ndjson" in content_type or "jsonl" in content_type else "csv"
+    if format not in product_import.IMPORT_FORMATS:
+        raise HTTPException(
+            status_code=400, detail=f"format must be one of {product_import.IMPORT_FORMATS}"
+        )
+    batch_size = min(batch_size or settings.IMPORT_BATCH_SIZE, settings.IMPORT_MAX_BATCH_SIZE)
+    return await product_import.import_products(db, request.stream(), format, batch_size)
+
+
 # GET (Lấy danh sách sản phẩm)
 @router.get("/products/", response_model=List[schemas.ProductRead])
 def read_products_endpoint(
@@ -30,6 +60,9 @@ def read_products_endpoint(
 
 
 # GET (Tìm kiếm sản phẩm) — phải đặt TRƯỚC /{product_id} để tránh xung đột path
+# Trang sau: truyền lại next_cursor (keyset) thay vì page để không phải OFFSET
+# total_mode: exact (COUNT mỗi lần) | cached (COUNT được cache) | estimate (ước lượng)
+# facets=true: thêm số lượng theo category + histogram giá (mốc tùy chọn qua price_buckets=a,b,c)
 @router.get("/products/search")
 def search_products_endpoint(
     q: str = "",
@@ -37,35 +70,119 @@ def search_products_endpoint(
     brand: str = "",  # brand chua co trong model, nhan nhung khong filter
     min_price: float = 0,
     max_price: float = 999999999,
-    page: int = 1,
-    page_size: int = 20,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    sort: str = "relevance",
+    total_mode: str = "exact",
+    facets: bool = False,
+    price_buckets: Optional[str] = None,
     db: Session = Depends(get_db),
 ):
-    items, total, total_pages = crud.search_products(
-        db,
-        q=q,
-        category=category,
-        min_price=min_price,
-        max_price=max_price,
-        page=page,
-        page_size=page_size,
-    )
-    return {
+    if sort not in SEARCH_SORTS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of {SEARCH_SORTS}")
+    if total_mode not in SEARCH_TOTAL_MODES:
+        raise HTTPException(
+            status_code=400, detail=f"total_mode must be one of {SEARCH_TOTAL_MODES}"
+        )
+    boundaries = None
+    if price_buckets:
+        try:
+            boundaries = [float(edge) for edge in price_buckets.split(",") if edge.strip()]
+        except ValueError:
+            raise HTTPException(status_code=400, detail="price_buckets must be comma-separated numbers")
+        if len(boundaries) > MAX_PRICE_BUCKETS:
+            raise HTTPException(
+                status_code=400, detail=f"Too many price buckets (max {MAX_PRICE_BUCKETS})"
+            )
+    try:
+        items, total, total_pages, next_cursor, total_is_estimate = crud.search_products(
+            db,
+            q=q,
+            category=category,
+            min_price=min_price,
+            max_price=max_price,
+            page=page,
+            page_size=page_size,
+            cursor=cursor,
+            sort=sort,
+            total_mode=total_mode,
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    result = {
         "items": [schemas.ProductRead.model_validate(item) for item in items],
         "total": total,
         "page": page,
         "page_size": page_size,
         "total_pages": total_pages,
+        "next_cursor": next_cursor,
+        "total_is_estimate": total_is_estimate,
     }
+    if facets:
+        result["facets"] = crud.search_facets(
+            db,
+            q=q,
+            category=category,
+            min_price=min_price,
+            max_price=max_price,
+            boundaries=boundaries,
+        )
+    return result
+
+
+# GET (Change feed, vd: /products/changes?since=120&limit=500)
+# Các thay đổi có seq > since theo thứ tự (mỗi sản phẩm chỉ giữ thay đổi cuối trong trang),
+# "delete" = sản phẩm đã bị xóa. Consumer lưu next_since và gọi lại tới khi has_more = False.
+@router.get("/products/changes", response_model=schemas.ProductChangesRead)
+def read_product_changes_endpoint(
+    since: int = Query(0, ge=0),
+    limit: int = Query(500, ge=1, le=MAX_CHANGES_LIMIT),
+    db: Session = Depends(get_db),
+):
+    try:
+        return change_feed.read_changes(db, since=since, limit=limit)
+    except change_feed.FeedAheadError as e:
+        # Feed đã bị dựng lại (seq reset) -> consumer phải đồng bộ lại từ since=0
+        raise HTTPException(status_code=410, detail=str(e))
+
+
+# GET (Gợi ý khi gõ ô tìm kiếm, vd: /products/suggest?prefix=iph)
+# Khớp đầu tên sản phẩm / category (không dấu); sản phẩm mới cập nhật trước, category nhiều sản phẩm trước
+@router.get("/products/suggest")
+def suggest_products_endpoint(
+    prefix: str = "",
+    limit: int = Query(10, ge=1, le=crud.MAX_SUGGESTIONS),
+    db: Session = Depends(get_db),
+):
+    return {"prefix": prefix, **crud.suggest_products(db, prefix=prefix, limit=limit)}
+
+
+# GET (Lấy nhiều sản phẩm 1 lần, vd: /products/batch?ids=1,2,3)
+# Dùng cho order-service và trang giỏ hàng/thanh toán thay vì gọi từng sản phẩm
+@router.get("/products/batch", response_model=schemas.ProductBatchRead)
+def read_products_batch_endpoint(ids: str = "", db: Session = Depends(get_db)):
+    try:
+        product_ids = [int(part) for part in ids.split(",") if part.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be a comma-separated list of integers")
+    if len(product_ids) > MAX_BATCH_IDS:
+        raise HTTPException(
+            status_code=400, detail=f"Too many ids (max {MAX_BATCH_IDS})"
+        )
+
+    products = crud.get_products_by_ids_cached(db, product_ids=product_ids)
+    missing = [pid for pid in dict.fromkeys(product_ids) if pid not in products]
+    return {"items": products, "missing": missing}
 
 
 # GET (Lấy 1 sản phẩm)
 @router.get("/products/{product_id}", response_model=schemas.ProductRead)
 def read_product_endpoint(product_id: int, db: Session = Depends(get_db)):
-    db_product = crud.get_product(db, product_id=product_id)
-    if db_product is None:
+    product = crud.get_product_cached(db, product_id=product_id)
+    if product is None:
         raise HTTPException(status_code=404, detail="Product not found")
-    return db_product
+    return product
 
 
 # PUT (Cập nhật sản phẩm)
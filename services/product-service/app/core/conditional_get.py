@@ -0,0 +1,61 @@
+import hashlib
+
+from app.core.config import settings
+from app.services.catalog_version import catalog_version
+from fastapi import Request, Response
+from starlette.concurrency import run_in_threadpool
+
+# Các GET catalog có ETag (ảnh tĩnh đã có ETag riêng của StaticFiles)
+CATALOG_PREFIX = "/api/products"
+EXCLUDED_PREFIXES = ("/api/products/images",)
+
+
+def build_etag(version: str, request: Request) -> str:
+    """ETag mạnh = hash(phiên bản catalog + path + query đã sắp xếp)"""
+    query = "&".join(sorted(request.url.query.split("&"))) if request.url.query else ""
+    digest = hashlib.sha256(f"{version}|{request.url.path}|{query}".encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+async def conditional_get_middleware(request: Request, call_next):
+    """
+    GET/HEAD catalog: trả ETag + Cache-Control; If-None-Match khớp -> 304 ngay,
+    không gọi endpoint (không mở session DB).
+
+    Phiên bản được đọc TRƯỚC khi endpoint đọc dữ liệu nên body luôn mới ít nhất
+    bằng phiên bản trong ETag; ghi xen giữa chỉ làm lần sau phải tải lại.
+    """
+    path = request.url.path
+    if (
+        request.method not in ("GET", "HEAD")
+        or not path.startswith(CATALOG_PREFIX)
+        or path.startswith(EXCLUDED_PREFIXES)
+    ):
+        return await call_next(request)
+
+    # Có Redis thì đọc phiên bản ở threadpool để không chặn event loop
+    if catalog_version.redis is None:
+        version = catalog_version.current()
+    else:
+        version = await run_in_threadpool(catalog_version.current)
+    if version is None:
+        return await call_next(request)
+
+    etag = build_etag(version, request)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={settings.CATALOG_MAX_AGE}, must-revalidate",
+    }
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    response = await call_next(request)
+    if response.status_code == 200:
+        response.headers.update(headers)
+    return response
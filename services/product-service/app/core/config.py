@@ -16,6 +16,54 @@ DATABASE_URL = (
 
 class Settings:
     DATABASE_URL: str = DATABASE_URL
+    # Ký / xác thực request giữa các service nội bộ
+    INTERNAL_SERVICE_SECRET: str = os.environ.get("INTERNAL_SERVICE_SECRET", "")
+    INTERNAL_SIGNATURE_MAX_AGE: int = int(os.environ.get("INTERNAL_SIGNATURE_MAX_AGE", 30))
+    # Tìm kiếm: "index" = inverted index trong bộ nhớ, "sql" = LIKE như cũ
+    SEARCH_BACKEND: str = os.environ.get("SEARCH_BACKEND", "index")
+    # Số dòng đọc mỗi lần khi dựng index lúc khởi động
+    SEARCH_INDEX_BUILD_BATCH: int = int(os.environ.get("SEARCH_INDEX_BUILD_BATCH", 5000))
+    # Thời gian giữ tổng số kết quả khi client chọn total_mode=cached (giây)
+    SEARCH_COUNT_CACHE_TTL: int = int(os.environ.get("SEARCH_COUNT_CACHE_TTL", 60))
+    # Gợi ý khi gõ (/products/suggest): index prefix trong bộ nhớ, false = dùng LIKE 'prefix%'
+    SUGGEST_ENABLED: bool = os.environ.get("SUGGEST_ENABLED", "true").lower() == "true"
+    # Prefix khớp nhiều hơn mức này thì top-k được cache lại (vd "i", "sam")
+    SUGGEST_SCAN_LIMIT: int = int(os.environ.get("SUGGEST_SCAN_LIMIT", 2000))
+    SUGGEST_CACHE_MAX_ENTRIES: int = int(os.environ.get("SUGGEST_CACHE_MAX_ENTRIES", 20000))
+    # Chu kỳ (giây) đọc change feed để search/suggest index bắt kịp ghi từ instance khác; 0 = tắt
+    CHANGE_FEED_POLL_INTERVAL: float = float(os.environ.get("CHANGE_FEED_POLL_INTERVAL", 5))
+    # Cache kết quả tìm kiếm (Redis nếu có, không thì LRU trong process); key gồm phiên bản catalog
+    SEARCH_CACHE_ENABLED: bool = os.environ.get("SEARCH_CACHE_ENABLED", "true").lower() == "true"
+    SEARCH_CACHE_TTL: int = int(os.environ.get("SEARCH_CACHE_TTL", 60))
+    SEARCH_CACHE_MAX_ENTRIES: int = int(os.environ.get("SEARCH_CACHE_MAX_ENTRIES", 2000))
+    # Redis dùng chung (tầng 2 của cache sản phẩm, phiên bản catalog); để trống = tắt
+    REDIS_URL: str = os.environ.get("REDIS_URL", "")
+    # Facet tìm kiếm: mốc giá mặc định (đ) và cache theo truy vấn đã chuẩn hóa
+    FACET_PRICE_BUCKETS: list = [
+        float(edge)
+        for edge in os.environ.get(
+            "FACET_PRICE_BUCKETS", "1000000,5000000,10000000,20000000,50000000"
+        ).split(",")
+    ]
+    FACET_CACHE_TTL: int = int(os.environ.get("FACET_CACHE_TTL", 60))
+    FACET_CACHE_MAX_ENTRIES: int = int(os.environ.get("FACET_CACHE_MAX_ENTRIES", 1000))
+    # Cache đọc sản phẩm: LRU trong process (+ Redis nếu có REDIS_URL)
+    PRODUCT_CACHE_ENABLED: bool = os.environ.get("PRODUCT_CACHE_ENABLED", "true").lower() == "true"
+    PRODUCT_CACHE_MAX_ENTRIES: int = int(os.environ.get("PRODUCT_CACHE_MAX_ENTRIES", 10000))
+    # TTL ngắn vì instance khác cập nhật sản phẩm sẽ không xóa được LRU của instance này
+    PRODUCT_CACHE_TTL: int = int(os.environ.get("PRODUCT_CACHE_TTL", 30))
+    PRODUCT_CACHE_REDIS_TTL: int = int(os.environ.get("PRODUCT_CACHE_REDIS_TTL", 300))
+    PRODUCT_CACHE_COALESCE_TIMEOUT: float = float(os.environ.get("PRODUCT_CACHE_COALESCE_TIMEOUT", 5))
+    # Cache-Control cho các GET catalog (0 = client phải hỏi lại bằng If-None-Match mỗi lần)
+    CATALOG_MAX_AGE: int = int(os.environ.get("CATALOG_MAX_AGE", 0))
+    # Import sản phẩm hàng loạt: số dòng mỗi câu INSERT ... ON DUPLICATE KEY UPDATE
+    IMPORT_BATCH_SIZE: int = int(os.environ.get("IMPORT_BATCH_SIZE", 1000))
+    IMPORT_MAX_BATCH_SIZE: int = int(os.environ.get("IMPORT_MAX_BATCH_SIZE", 5000))
+    # Số lỗi từng dòng tối đa trả về trong báo cáo (vẫn đếm hết trong "failed")
+    IMPORT_MAX_REPORTED_ERRORS: int = int(os.environ.get("IMPORT_MAX_REPORTED_ERRORS", 1000))
+    # Ảnh sản phẩm gốc và các biến thể thu nhỏ (nằm trong volume uploads để giữ qua rebuild)
+    UPLOAD_DIR: str = os.environ.get("UPLOAD_DIR", "/code/uploads")
+    IMAGE_VARIANTS_DIR: str = os.environ.get("IMAGE_VARIANTS_DIR", "/code/uploads/_variants")
 
 
 settings = Settings()
@@ -0,0 +1,97 @@
+import hashlib
+import hmac
+import time
+from typing import Mapping, Optional
+
+from app.core.config import settings
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse
+
+# Header do service gọi (order-service, auth-service, ...) gắn vào request nội bộ.
+# Khi gọi thẳng service (INTERNAL_ROUTING, không qua firewall/gateway/auth_request)
+# bên nhận dựa vào chữ ký HMAC này để tin đây là service nội bộ.
+INTERNAL_CALLER_HEADER = "X-Internal-Caller"
+INTERNAL_TIMESTAMP_HEADER = "X-Internal-Timestamp"
+INTERNAL_SIGNATURE_HEADER = "X-Internal-Signature"
+
+
+def _signature(
+    caller: str, timestamp: str, method: str, path: str, query: bytes, body: bytes
+) -> str:
+    # Ký cả query string và body (dạng hash): header bắt được không dùng lại được
+    # cho body / tham số khác trên cùng path trong thời gian còn hạn
+    message = "\n".join([
+        caller,
+        timestamp,
+        method.upper(),
+        path,
+        hashlib.sha256(query).hexdigest(),
+        hashlib.sha256(body).hexdigest(),
+    ]).encode()
+    return hmac.new(
+        settings.INTERNAL_SERVICE_SECRET.encode(), message, hashlib.sha256
+    ).hexdigest()
+
+
+def sign_internal_request(
+    caller: str, method: str, path: str, query: bytes = b"", body: bytes = b""
+) -> dict:
+    """Tạo các header ký request nội bộ (rỗng nếu chưa cấu hình secret)"""
+    if not settings.INTERNAL_SERVICE_SECRET:
+        return {}
+    timestamp = str(int(time.time()))
+    return {
+        INTERNAL_CALLER_HEADER: caller,
+        INTERNAL_TIMESTAMP_HEADER: timestamp,
+        INTERNAL_SIGNATURE_HEADER: _signature(caller, timestamp, method, path, query, body),
+    }
+
+
+def verify_internal_request(
+    headers: Mapping[str, str], method: str, path: str, query: bytes = b"", body: bytes = b""
+) -> Optional[str]:
+    """Trả về tên service gọi nếu chữ ký hợp lệ và còn hạn, ngược lại None"""
+    caller = headers.get(INTERNAL_CALLER_HEADER)
+    timestamp = headers.get(INTERNAL_TIMESTAMP_HEADER, "")
+    signature = headers.get(INTERNAL_SIGNATURE_HEADER, "")
+    if not caller or not settings.INTERNAL_SERVICE_SECRET or not timestamp.isdigit():
+        return None
+    if abs(time.time() - int(timestamp)) > settings.INTERNAL_SIGNATURE_MAX_AGE:
+        return None
+    expected = _signature(caller, timestamp, method, path, query, body)
+    if not hmac.compare_digest(expected, signature):
+        return None
+    return caller
+
+
+async def internal_caller_middleware(request: Request, call_next):
+    """
+    Xác thực header service nội bộ (nếu có).
+    Request mang X-Internal-Caller nhưng chữ ký sai/hết hạn bị từ chối (401);
+    hợp lệ thì tên service được lưu ở request.state.internal_caller.
+    Chỉ request có header này mới bị đọc body trước (để kiểm tra hash body).
+    """
+    request.state.internal_caller = None
+    if settings.INTERNAL_SERVICE_SECRET and INTERNAL_CALLER_HEADER in request.headers:
+        caller = verify_internal_request(
+            request.headers,
+            request.method,
+            request.url.path,
+            request.scope["query_string"],
+            await request.body(),
+        )
+        if caller is None:
+            return JSONResponse(
+                status_code=401, content={"detail": "Invalid internal caller signature"}
+            )
+        request.state.internal_caller = caller
+    return await call_next(request)
+
+
+def require_internal_caller(request: Request):
+    """
+    Dependency cho API chỉ dành cho service nội bộ: khi đã cấu hình INTERNAL_SERVICE_SECRET,
+    request không có chữ ký hợp lệ bị từ chối (403).
+    """
+    if settings.INTERNAL_SERVICE_SECRET and request.state.internal_caller is None:
+        raise HTTPException(status_code=403, detail="Forbidden: internal API")
@@ -1,3 +1,4 @@
+import redis
 from app.core.config import settings
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
@@ -7,6 +8,13 @@ engine = create_engine(settings.DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Redis là tùy chọn: không cấu hình REDIS_URL thì các tính năng dùng Redis chạy trong process
+redis_client = (
+    redis.Redis.from_url(settings.REDIS_URL, socket_timeout=0.2, socket_connect_timeout=0.2)
+    if settings.REDIS_URL
+    else None
+)
+
 
 # Dependency
 def get_db():
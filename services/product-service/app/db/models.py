@@ -1,9 +1,11 @@
 from app.db.database import Base
-from sqlalchemy import Column, DateTime, Integer, Numeric, String, Text, func
+from sqlalchemy import BigInteger, Column, DateTime, Index, Integer, Numeric, String, Text, func
 
 
 class Product(Base):
     __tablename__ = "products_official"
+    # Phan trang keyset khi tim kiem sap xep theo gia (price, id)
+    __table_args__ = (Index("ix_products_official_price_id", "price", "id"),)
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(100), unique=True, nullable=False, index=True)
@@ -14,3 +16,22 @@ class Product(Base):
     category = Column(String(50), nullable=True)
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
+# Nhat ky thay doi catalog (change feed): moi lan ghi san pham them 1 dong, seq tang dan
+# theo dung thu tu commit; xoa san pham -> dong "delete" (tombstone)
+class ProductChange(Base):
+    __tablename__ = "product_changes"
+
+    seq = Column(BigInteger, primary_key=True, autoincrement=False)
+    product_id = Column(Integer, nullable=False, index=True)
+    op = Column(String(10), nullable=False)  # upsert | delete
+    changed_at = Column(DateTime, server_default=func.now())
+
+
+# 1 dong duy nhat giu seq cuoi cung da cap; khoa dong nay (FOR UPDATE) de cap seq theo thu tu commit
+class ProductChangeSequence(Base):
+    __tablename__ = "product_change_sequence"
+
+    id = Column(Integer, primary_key=True)
+    last_seq = Column(BigInteger, nullable=False, default=0)
@@ -1,19 +1,87 @@
-from app.api.v1 import products
-from app.db.database import Base, engine
+from app.api.v1 import images, products
+from app.core.conditional_get import conditional_get_middleware
+from app.core.config import settings
+from app.core.internal_auth import internal_caller_middleware
+from app.db.database import Base, SessionLocal, engine
+from app.services import change_feed, product_service
+from app.services.product_cache import product_cache
+from app.services.search_cache import search_cache
+from app.services.search_index import product_index
+from app.services.suggest_index import suggest_index
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 import os 
-from fastapi.staticfiles import StaticFiles
+import threading
 
 Base.metadata.create_all(bind=engine)
 
 
-app = FastAPI(title="Product Service")
-os.makedirs("/code/uploads", exist_ok=True)
-app.mount("/api/products/images", StaticFiles(directory="/code/uploads"), name="images")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Change feed: tạo sequence (lần đầu ghi sẵn toàn bộ catalog), lấy seq hiện tại TRƯỚC khi
+    # dựng index để follower áp lại mọi thay đổi xảy ra trong lúc dựng
+    db = SessionLocal()
+    try:
+        change_feed.ensure_change_feed(db)
+        feed_seq = change_feed.latest_seq(db)
+    finally:
+        db.close()
 
+    # Dựng search index ở thread nền; trong lúc chờ, /products/search dùng SQL như cũ
+    if settings.SEARCH_BACKEND == "index":
+        threading.Thread(
+            target=product_service.load_search_index, name="search-index-build", daemon=True
+        ).start()
+    if settings.SUGGEST_ENABLED:
+        threading.Thread(
+            target=product_service.load_suggest_index, name="suggest-index-build", daemon=True
+        ).start()
+    stop_follower = threading.Event()
+    uses_index = settings.SEARCH_BACKEND == "index" or settings.SUGGEST_ENABLED
+    if uses_index and settings.CHANGE_FEED_POLL_INTERVAL > 0:
+        threading.Thread(
+            target=product_service.follow_change_feed,
+            args=(feed_seq, stop_follower),
+            name="change-feed-follower",
+            daemon=True,
+        ).start()
+    yield
+    stop_follower.set()
+
+
+app = FastAPI(title="Product Service", lifespan=lifespan)
+
+# ETag / If-None-Match cho các GET catalog (đăng ký trước -> chạy sau xác thực nội bộ)
+app.middleware("http")(conditional_get_middleware)
+# Xác thực header ký của service nội bộ (khi được gọi thẳng, không qua gateway)
+app.middleware("http")(internal_caller_middleware)
+os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+
+# Router ảnh đăng ký trước router sản phẩm (/products/{product_id} không bắt /products/images/...)
+app.include_router(images.router, prefix="/api", tags=["images"])
 app.include_router(products.router, prefix="/api", tags=["products"])
 
 
 @app.get("/")
 def read_root():
     return {"service": "Product Service is running"}
+
+
+@app.get("/metrics/search-index")
+def read_search_index_stats():
+    return product_index.stats()
+
+
+@app.get("/metrics/product-cache")
+def read_product_cache_stats():
+    return product_cache.stats()
+
+
+@app.get("/metrics/suggest-index")
+def read_suggest_index_stats():
+    return suggest_index.stats()
+
+
+@app.get("/metrics/search-cache")
+def read_search_cache_stats():
+    return search_cache.stats()
@@ -1,5 +1,6 @@
+from datetime import datetime
 from decimal import Decimal  # Sửa: Dùng Decimal
-from typing import Optional
+from typing import Dict, List, Optional
 from pydantic import BaseModel
 
 
@@ -30,3 +31,26 @@ class ProductRead(ProductBase):
 
     class Config:
         from_attributes = True  # Cho phép Pydantic đọc từ SQLAlchemy model
+
+
+# Schema tra ve cho API lay nhieu san pham (batch)
+class ProductBatchRead(BaseModel):
+    items: Dict[int, ProductRead] = {}
+    missing: List[int] = []
+
+
+# 1 thay đổi trong change feed; product = trạng thái hiện tại (None nếu op = "delete")
+class ProductChangeRead(BaseModel):
+    seq: int
+    product_id: int
+    op: str
+    changed_at: Optional[datetime] = None
+    product: Optional[ProductRead] = None
+
+
+# Trang change feed: gọi lại với since = next_since cho tới khi has_more = False
+class ProductChangesRead(BaseModel):
+    changes: List[ProductChangeRead] = []
+    next_since: int
+    has_more: bool
+    latest_seq: int
@@ -0,0 +1,81 @@
+import logging
+import threading
+import uuid
+from typing import Callable, List, Optional
+
+import redis
+from app.db.database import redis_client
+
+logger = logging.getLogger(__name__)
+
+REDIS_KEY = "catalog:version"
+
+
+class CatalogVersion:
+    """
+    Phiên bản catalog sản phẩm, tăng mỗi lần create/update/delete.
+
+    Có Redis: lưu trong hash "catalog:version" (epoch ngẫu nhiên + bộ đếm) nên
+    mọi instance thấy cùng 1 giá trị. Không có Redis: bộ đếm trong process,
+    kèm id ngẫu nhiên của lần khởi động để ETag cũ không trùng sau khi restart.
+    Khi thấy phiên bản đổi (do instance khác ghi), gọi các listener để xóa cache cục bộ.
+    """
+
+    def __init__(self, redis_client=None):
+        self.redis = redis_client
+        self._lock = threading.Lock()
+        self._boot_id = uuid.uuid4().hex[:12]
+        self._local = 0
+        # Phiên bản thấy lần gần nhất, để phát hiện instance khác đã ghi
+        self._last_seen: Optional[str] = None
+        self._listeners: List[Callable[[], None]] = []
+
+    def on_change(self, listener: Callable[[], None]):
+        self._listeners.append(listener)
+
+    def current(self) -> Optional[str]:
+        """Trả về None nếu Redis lỗi (khi đó không nên trả ETag)"""
+        if self.redis is None:
+            version = f"{self._boot_id}.{self._local}"
+        else:
+            try:
+                epoch, counter = self.redis.hmget(REDIS_KEY, "epoch", "version")
+                if epoch is None:
+                    self.redis.hsetnx(REDIS_KEY, "epoch", uuid.uuid4().hex[:12])
+                    epoch, counter = self.redis.hmget(REDIS_KEY, "epoch", "version")
+            except redis.RedisError as e:
+                logger.warning("Catalog version: Redis read failed: %s", e)
+                return None
+            version = f"{epoch.decode()}.{int(counter or 0)}"
+
+        with self._lock:
+            changed = self._last_seen is not None and self._last_seen != version
+            self._last_seen = version
+        if changed:
+            for listener in self._listeners:
+                listener()
+        return version
+
+    def bump(self):
+        """
+        Gọi sau khi ghi catalog đã commit. Nếu không có ghi nào khác xen giữa thì
+        ghi nhận luôn phiên bản mới (không xóa cache cục bộ vì chính mình ghi).
+        """
+        if self.redis is None:
+            with self._lock:
+                self._local += 1
+                self._last_seen = f"{self._boot_id}.{self._local}"
+            return
+        try:
+            counter = self.redis.hincrby(REDIS_KEY, "version", 1)
+        except redis.RedisError as e:
+            logger.error("Catalog version: Redis bump failed, ETags may be stale: %s", e)
+            return
+        with self._lock:
+            if self._last_seen is not None:
+                epoch, _, seen = self._last_seen.rpartition(".")
+                if int(seen) + 1 == counter:
+                    self._last_seen = f"{epoch}.{counter}"
+
+
+catalog_version = CatalogVersion(redis_client)
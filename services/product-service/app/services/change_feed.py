@@ -0,0 +1,125 @@
+import logging
+from typing import Dict, List
+
+from app.db import models
+from app.models import product as schemas
+from sqlalchemy import func, literal, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+OP_UPSERT = "upsert"
+OP_DELETE = "delete"
+SEQUENCE_ROW_ID = 1
+
+
+class FeedAheadError(ValueError):
+    """since lớn hơn seq mới nhất (vd: DB đã bị dựng lại) -> consumer phải đồng bộ lại từ 0"""
+
+
+# Ghi nhan thay doi trong CUNG transaction voi lenh ghi san pham (goi truoc commit).
+# Khoa dong sequence toi khi commit -> seq cap theo dung thu tu commit, consumer doc
+# "seq > since" khong bao gio bo sot 1 transaction commit muon hon nhung co seq nho hon.
+def record_changes(db: Session, product_ids: List[int], op: str):
+    if not product_ids:
+        return
+    sequence = (
+        db.query(models.ProductChangeSequence)
+        .filter(models.ProductChangeSequence.id == SEQUENCE_ROW_ID)
+        .with_for_update()
+        .one()
+    )
+    first_seq = sequence.last_seq + 1
+    sequence.last_seq += len(product_ids)
+    db.execute(
+        models.ProductChange.__table__.insert(),
+        [
+            {"seq": first_seq + i, "product_id": product_id, "op": op}
+            for i, product_id in enumerate(product_ids)
+        ],
+    )
+
+
+# Chay luc khoi dong: tao dong sequence; lan dau bat feed thi ghi 1 "upsert" cho moi san pham
+# da co (seq = id) de consumer doc tu since=0 nhan duoc toan bo catalog
+def ensure_change_feed(db: Session):
+    if db.get(models.ProductChangeSequence, SEQUENCE_ROW_ID) is not None:
+        return
+    try:
+        max_id = db.query(func.coalesce(func.max(models.Product.id), 0)).scalar()
+        db.add(models.ProductChangeSequence(id=SEQUENCE_ROW_ID, last_seq=max_id))
+        db.flush()
+        db.execute(
+            models.ProductChange.__table__.insert().from_select(
+                ["seq", "product_id", "op"],
+                select(
+                    models.Product.id.label("seq"),
+                    models.Product.id.label("product_id"),
+                    literal(OP_UPSERT),
+                ),
+            )
+        )
+        db.commit()
+        logger.info("Change feed initialised with %s existing products", max_id)
+    except IntegrityError:
+        # Instance khac vua khoi tao cung luc
+        db.rollback()
+
+
+def latest_seq(db: Session) -> int:
+    sequence = db.get(models.ProductChangeSequence, SEQUENCE_ROW_ID)
+    return sequence.last_seq if sequence else 0
+
+
+def read_change_rows(db: Session, since: int, limit: int) -> List[models.ProductChange]:
+    return (
+        db.query(models.ProductChange)
+        .filter(models.ProductChange.seq > since)
+        .order_by(models.ProductChange.seq)
+        .limit(limit)
+        .all()
+    )
+
+
+def latest_per_product(rows: List[models.ProductChange]) -> List[models.ProductChange]:
+    """Trong 1 trang chỉ giữ thay đổi cuối của mỗi sản phẩm (vẫn theo thứ tự seq)"""
+    last: Dict[int, models.ProductChange] = {}
+    for row in rows:
+        last.pop(row.product_id, None)
+        last[row.product_id] = row
+    return list(last.values())
+
+
+# Doc feed: cac thay doi seq > since (toi da limit dong), kem trang thai hien tai cua san pham.
+# Doc thang DB (khong qua cache) de body khong cu hon seq vua tra ve.
+def read_changes(db: Session, since: int, limit: int) -> dict:
+    latest = latest_seq(db)
+    if since > latest:
+        raise FeedAheadError(f"since={since} is ahead of the feed (latest_seq={latest})")
+
+    rows = read_change_rows(db, since, limit)
+    changes = latest_per_product(rows)
+    upsert_ids = [change.product_id for change in changes if change.op == OP_UPSERT]
+    products = {
+        product.id: product
+        for product in db.query(models.Product).filter(models.Product.id.in_(upsert_ids))
+    } if upsert_ids else {}
+
+    items = []
+    for change in changes:
+        product = products.get(change.product_id) if change.op == OP_UPSERT else None
+        items.append({
+            "seq": change.seq,
+            "product_id": change.product_id,
+            # Da bi xoa o 1 thay doi sau (ngoai trang nay) -> bao luon la delete
+            "op": OP_UPSERT if product is not None else OP_DELETE,
+            "changed_at": change.changed_at,
+            "product": schemas.ProductRead.model_validate(product) if product else None,
+        })
+    return {
+        "changes": items,
+        "next_since": rows[-1].seq if rows else since,
+        "has_more": len(rows) == limit,
+        "latest_seq": max(latest, rows[-1].seq if rows else 0),
+    }
@@ -0,0 +1,104 @@
+import hashlib
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+from app.core.config import settings
+from PIL import Image, ImageOps
+
+# Các chiều rộng được tạo sẵn (px) và định dạng: webp cho trình duyệt hỗ trợ, jpeg dự phòng
+VARIANT_WIDTHS = (160, 320, 640)
+FORMATS = {
+    "webp": ("WEBP", "image/webp", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", "image/jpeg", {"quality": 82, "optimize": True, "progressive": True}),
+}
+SOURCE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+HASH_LENGTH = 16
+
+# {tên file gốc: (mtime_ns, size, hash)} để không phải băm lại ảnh gốc mỗi request
+_source_hashes: Dict[str, Tuple[int, int, str]] = {}
+_hash_lock = threading.Lock()
+
+
+def pick_width(size: int) -> int:
+    """Chiều rộng nhỏ nhất >= size (lớn hơn mọi biến thể -> lấy biến thể lớn nhất)"""
+    for width in VARIANT_WIDTHS:
+        if width >= size:
+            return width
+    return VARIANT_WIDTHS[-1]
+
+
+def source_path(filename: str) -> Optional[str]:
+    """Đường dẫn ảnh gốc trong thư mục upload, None nếu không hợp lệ/không tồn tại"""
+    if os.path.basename(filename) != filename or not filename.lower().endswith(SOURCE_EXTENSIONS):
+        return None
+    path = os.path.join(settings.UPLOAD_DIR, filename)
+    return path if os.path.isfile(path) else None
+
+
+def source_hash(path: str) -> str:
+    stat = os.stat(path)
+    filename = os.path.basename(path)
+    with _hash_lock:
+        cached = _source_hashes.get(filename)
+    if cached and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+        return cached[2]
+    with open(path, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()[:HASH_LENGTH]
+    with _hash_lock:
+        _source_hashes[filename] = (stat.st_mtime_ns, stat.st_size, digest)
+    return digest
+
+
+def variant_name(filename: str, digest: str, width: int, fmt: str) -> str:
+    """vd: iphone16.3f9a0c1d2b4e5f60.320.webp (hash đổi khi ảnh gốc đổi)"""
+    stem = os.path.splitext(filename)[0]
+    return f"{stem}.{digest}.{width}.{fmt}"
+
+
+def variant_path(name: str) -> Optional[str]:
+    if os.path.basename(name) != name:
+        return None
+    return os.path.join(settings.IMAGE_VARIANTS_DIR, name)
+
+
+def ensure_variant(filename: str, width: int, fmt: str) -> Optional[str]:
+    """
+    Trả về tên biến thể (đã có trên đĩa), tạo nếu chưa có. Ghi ra file tạm rồi
+    os.replace nên 2 request tạo cùng lúc không làm hỏng file.
+    """
+    path = source_path(filename)
+    if path is None:
+        return None
+    name = variant_name(filename, source_hash(path), width, fmt)
+    target = os.path.join(settings.IMAGE_VARIANTS_DIR, name)
+    if os.path.exists(target):
+        return name
+
+    pil_format, _, save_options = FORMATS[fmt]
+    with Image.open(path) as source:
+        image = ImageOps.exif_transpose(source)
+        if image.width > width:
+            height = max(1, round(image.height * width / image.width))
+            image = image.resize((width, height), Image.LANCZOS)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA")
+        if fmt == "jpeg" and image.mode == "RGBA":
+            # JPEG không có kênh alpha -> nền trắng
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        os.makedirs(settings.IMAGE_VARIANTS_DIR, exist_ok=True)
+        tmp_path = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+        image.save(tmp_path, pil_format, **save_options)
+    os.replace(tmp_path, target)
+    return name
+
+
+def ensure_all_variants(filename: str) -> Dict[str, str]:
+    """Tạo mọi biến thể của 1 ảnh (dùng cho backfill), trả về {"320.webp": tên file}"""
+    return {
+        f"{width}.{fmt}": ensure_variant(filename, width, fmt)
+        for width in VARIANT_WIDTHS
+        for fmt in FORMATS
+    }
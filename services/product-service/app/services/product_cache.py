@@ -0,0 +1,178 @@
+import json
+import logging
+import threading
+from typing import Callable, Dict, Iterable, List, Optional
+
+import redis
+from app.core.cache import LRUCache
+from app.core.config import settings
+from app.db.database import redis_client
+
+logger = logging.getLogger(__name__)
+
+REDIS_KEY_PREFIX = "product:v1:"
+
+
+class _InFlight:
+    """Một lần đọc DB đang chạy cho 1 key; các request khác chờ kết quả này"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Optional[dict] = None
+        # Lỗi của thread đầu (DB / loader lỗi): các thread chờ ném lại lỗi này thay vì trả None (404)
+        self.error: Optional[BaseException] = None
+
+
+class ProductCache:
+    """
+    Cache read-through cho sản phẩm (dict ProductRead đã serialize).
+
+    Tầng 1: LRU + TTL trong process. Tầng 2 (tùy chọn): Redis dùng chung giữa
+    các instance. Miss ở cả 2 tầng -> chỉ 1 thread đọc DB cho mỗi key
+    (request coalescing), các thread khác chờ và dùng lại kết quả.
+    Nếu có invalidate xảy ra trong lúc đang đọc DB thì kết quả đó không được
+    ghi vào cache (tránh bản cũ đè lên bản vừa cập nhật).
+    """
+
+    def __init__(self, local: LRUCache, redis_client=None, redis_ttl: int = 300,
+                 coalesce_timeout: float = 5.0):
+        self.local = local
+        self.redis = redis_client
+        self.redis_ttl = redis_ttl
+        self.coalesce_timeout = coalesce_timeout
+        self._inflight: Dict[int, _InFlight] = {}
+        self._lock = threading.Lock()
+        self._epoch = 0
+        self.redis_hits = 0
+        self.redis_errors = 0
+        self.db_loads = 0
+        self.coalesced = 0
+
+    def get(self, product_id: int, loader: Callable[[int], Optional[dict]]) -> Optional[dict]:
+        value = self.local.get(product_id)
+        if value is not None:
+            return value
+
+        with self._lock:
+            inflight = self._inflight.get(product_id)
+            leader = inflight is None
+            if leader:
+                inflight = self._inflight[product_id] = _InFlight()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            if inflight.done.wait(self.coalesce_timeout):
+                if inflight.error is not None:
+                    raise inflight.error
+                return inflight.value
+            # Thread đầu bị treo quá lâu -> tự đọc DB, không chờ thêm
+            return loader(product_id)
+
+        try:
+            epoch = self._epoch
+            value = self._redis_get([product_id]).get(product_id)
+            if value is None:
+                value = loader(product_id)
+                self.db_loads += 1
+                if value is not None and epoch == self._epoch:
+                    self._redis_set({product_id: value})
+            if value is not None and epoch == self._epoch:
+                self.local.set(product_id, value)
+            inflight.value = value
+            return value
+        except BaseException as e:
+            inflight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(product_id, None)
+            inflight.done.set()
+
+    def get_many(
+        self, product_ids: Iterable[int], loader: Callable[[List[int]], Dict[int, dict]]
+    ) -> Dict[int, dict]:
+        """Đọc nhiều sản phẩm: LRU -> Redis MGET -> 1 query DB cho phần còn thiếu"""
+        found: Dict[int, dict] = {}
+        missing = []
+        for product_id in dict.fromkeys(product_ids):
+            value = self.local.get(product_id)
+            if value is None:
+                missing.append(product_id)
+            else:
+                found[product_id] = value
+
+        epoch = self._epoch
+        if missing:
+            from_redis = self._redis_get(missing)
+            for product_id, value in from_redis.items():
+                self.local.set(product_id, value)
+            found.update(from_redis)
+            missing = [pid for pid in missing if pid not in from_redis]
+
+        if missing:
+            from_db = loader(missing)
+            self.db_loads += 1
+            if epoch == self._epoch:
+                for product_id, value in from_db.items():
+                    self.local.set(product_id, value)
+                self._redis_set(from_db)
+            found.update(from_db)
+        return found
+
+    def invalidate(self, product_id: int):
+        """Gọi sau khi update/delete đã commit"""
+        with self._lock:
+            self._epoch += 1
+        self.local.delete(product_id)
+        if self.redis is not None:
+            try:
+                self.redis.delete(REDIS_KEY_PREFIX + str(product_id))
+            except redis.RedisError as e:
+                self.redis_errors += 1
+                logger.warning("Product cache: Redis delete failed: %s", e)
+
+    def _redis_get(self, product_ids: List[int]) -> Dict[int, dict]:
+        if self.redis is None or not product_ids:
+            return {}
+        try:
+            raw_values = self.redis.mget([REDIS_KEY_PREFIX + str(pid) for pid in product_ids])
+        except redis.RedisError as e:
+            self.redis_errors += 1
+            logger.warning("Product cache: Redis read failed: %s", e)
+            return {}
+        found = {
+            pid: json.loads(raw) for pid, raw in zip(product_ids, raw_values) if raw is not None
+        }
+        self.redis_hits += len(found)
+        return found
+
+    def _redis_set(self, values: Dict[int, dict]):
+        if self.redis is None or not values:
+            return
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for product_id, value in values.items():
+                pipe.set(REDIS_KEY_PREFIX + str(product_id), json.dumps(value), ex=self.redis_ttl)
+            pipe.execute()
+        except redis.RedisError as e:
+            self.redis_errors += 1
+            logger.warning("Product cache: Redis write failed: %s", e)
+
+    def stats(self) -> dict:
+        return {
+            "local": self.local.stats(),
+            "redis_enabled": self.redis is not None,
+            "redis_hits": self.redis_hits,
+            "redis_errors": self.redis_errors,
+            "db_loads": self.db_loads,
+            "coalesced": self.coalesced,
+        }
+
+
+product_cache = ProductCache(
+    LRUCache(settings.PRODUCT_CACHE_MAX_ENTRIES, settings.PRODUCT_CACHE_TTL),
+    redis_client=redis_client,
+    redis_ttl=settings.PRODUCT_CACHE_REDIS_TTL,
+    coalesce_timeout=settings.PRODUCT_CACHE_COALESCE_TIMEOUT,
+)
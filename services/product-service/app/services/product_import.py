@@ -0,0 +1,177 @@
+import codecs
+import csv
+import json
+import time
+from typing import AsyncIterator, Dict, List, Optional
+
+from app.core.config import settings
+from app.db import models
+from app.models import product as schemas
+from app.services import change_feed, product_service
+from pydantic import ValidationError
+from sqlalchemy.dialects.mysql import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+IMPORT_FORMATS = ("csv", "ndjson")
+# Các cột được cập nhật khi trùng tên sản phẩm (name là UNIQUE)
+UPSERT_COLUMNS = ("description", "price", "category", "image_url")
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Tách body stream thành từng dòng, giải mã UTF-8 tăng dần (không đọc cả file vào RAM)"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r")
+
+
+async def iter_csv_records(lines: AsyncIterator[str]) -> AsyncIterator[List[str]]:
+    """
+    Ghép các dòng vật lý thành bản ghi CSV: trường trong ngoặc kép có thể chứa
+    xuống dòng, nên còn số lẻ dấu " thì bản ghi chưa kết thúc.
+    """
+    buffer: Optional[str] = None
+    async for line in lines:
+        buffer = line if buffer is None else f"{buffer}\n{line}"
+        if buffer.count('"') % 2 == 0:
+            yield next(csv.reader([buffer]), [])
+            buffer = None
+    if buffer is not None:
+        yield next(csv.reader([buffer]), [])
+
+
+async def iter_rows(chunks: AsyncIterator[bytes], fmt: str) -> AsyncIterator[tuple]:
+    """Trả về (số dòng, dict | lỗi parse) cho từng bản ghi; bỏ qua dòng trống"""
+    lines = iter_lines(chunks)
+    if fmt == "ndjson":
+        row_number = 0
+        async for line in lines:
+            row_number += 1
+            if not line.strip():
+                continue
+            try:
+                value = json.loads(line)
+            except ValueError as e:
+                yield row_number, ValueError(f"invalid JSON: {e}")
+                continue
+            if not isinstance(value, dict):
+                yield row_number, ValueError("each line must be a JSON object")
+                continue
+            yield row_number, value
+        return
+
+    header = None
+    row_number = 0
+    async for record in iter_csv_records(lines):
+        row_number += 1
+        if header is None:
+            header = [column.strip().lower() for column in record]
+            continue
+        if not any(field.strip() for field in record):
+            continue
+        if len(record) != len(header):
+            yield row_number, ValueError(f"expected {len(header)} columns, got {len(record)}")
+            continue
+        # Ô trống -> bỏ qua để trường tùy chọn nhận giá trị mặc định của ProductCreate
+        yield row_number, {
+            column: field for column, field in zip(header, record) if field != ""
+        }
+
+
+def upsert_products_batch(db: Session, rows: List[dict]) -> int:
+    """
+    1 câu INSERT ... ON DUPLICATE KEY UPDATE cho cả batch (1 round-trip) + change feed
+    trong cùng transaction, rồi cập nhật search index / cache cho các sản phẩm vừa ghi.
+    Trả về số dòng MySQL báo bị ảnh hưởng.
+    """
+    stmt = insert(models.Product).values(rows)
+    stmt = stmt.on_duplicate_key_update(
+        **{column: stmt.inserted[column] for column in UPSERT_COLUMNS}
+    )
+    result = db.execute(stmt)
+    names = [row["name"] for row in rows]
+    products = db.query(models.Product).filter(models.Product.name.in_(names)).all()
+    change_feed.record_changes(
+        db, sorted(product.id for product in products), change_feed.OP_UPSERT
+    )
+    db.commit()
+
+    product_service.refresh_derived_state(products)
+    return result.rowcount
+
+
+async def import_products(
+    db: Session, chunks: AsyncIterator[bytes], fmt: str, batch_size: int
+) -> Dict:
+    """Đọc stream, kiểm tra từng dòng bằng ProductCreate, ghi theo batch; trả về báo cáo"""
+    started = time.perf_counter()
+    report = {
+        "rows": 0,
+        "imported": 0,
+        "failed": 0,
+        "batches": 0,
+        "affected_rows": 0,
+        "errors": [],
+    }
+    batch: List[dict] = []
+    batch_rows: List[int] = []
+
+    def record_error(row_number: int, message: str):
+        report["failed"] += 1
+        if len(report["errors"]) < settings.IMPORT_MAX_REPORTED_ERRORS:
+            report["errors"].append({"row": row_number, "error": message})
+
+    async def flush():
+        if not batch:
+            return
+        try:
+            report["affected_rows"] += await run_in_threadpool(
+                upsert_products_batch, db, list(batch)
+            )
+            report["imported"] += len(batch)
+        except SQLAlchemyError:
+            db.rollback()
+            # Batch lỗi (vd: 1 tên quá dài) -> ghi lại từng dòng để biết chính xác dòng nào hỏng
+            for row_number, row in zip(batch_rows, batch):
+                try:
+                    report["affected_rows"] += await run_in_threadpool(
+                        upsert_products_batch, db, [row]
+                    )
+                    report["imported"] += 1
+                except SQLAlchemyError as e:
+                    db.rollback()
+                    record_error(row_number, f"database error: {getattr(e, 'orig', None) or e}")
+        report["batches"] += 1
+        batch.clear()
+        batch_rows.clear()
+
+    async for row_number, value in iter_rows(chunks, fmt):
+        report["rows"] += 1
+        if isinstance(value, Exception):
+            record_error(row_number, str(value))
+            continue
+        try:
+            product = schemas.ProductCreate.model_validate(value)
+        except ValidationError as e:
+            record_error(row_number, "; ".join(
+                f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors()
+            ))
+            continue
+        batch.append(product.model_dump())
+        batch_rows.append(row_number)
+        if len(batch) >= batch_size:
+            await flush()
+    await flush()
+
+    elapsed = time.perf_counter() - started
+    report["elapsed_seconds"] = round(elapsed, 3)
+    report["rows_per_second"] = round(report["rows"] / elapsed, 1) if elapsed > 0 else None
+    return report
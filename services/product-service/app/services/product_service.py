@@ -1,15 +1,90 @@
+import base64
+import binascii
+import logging
 import math
+import threading
+import time
+from bisect import bisect_right
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
 
+from app.core.config import settings
 from app.db import models
+from app.db.database import SessionLocal
 from app.models import product as schemas
+from app.core.cache import LRUCache
+from app.services import change_feed
+from app.services.catalog_version import catalog_version
+from app.services.product_cache import product_cache
+from app.services.search_cache import search_cache
+from app.services.search_index import (
+    SearchHit, hit_sort_key, normalize_text, product_index, tokenize,
+)
+from app.services.suggest_index import MAX_SUGGESTIONS, suggest_index
+from sqlalchemy import case, func, literal_column, tuple_
 from sqlalchemy.orm import Session
 
+logger = logging.getLogger(__name__)
+
+# Cache tong so ket qua tim kiem (total_mode=cached), key = bo loc
+COUNT_CACHE_MAX_ENTRIES = 1000
+_count_cache = LRUCache(COUNT_CACHE_MAX_ENTRIES, settings.SEARCH_COUNT_CACHE_TTL)
+
+# So dong change feed doc moi lan khi bat kip index
+CHANGE_FEED_FOLLOW_BATCH = 1000
+
+# Cache facet theo truy van da chuan hoa
+_facet_cache = LRUCache(settings.FACET_CACHE_MAX_ENTRIES, settings.FACET_CACHE_TTL)
+
+# Instance khac ghi catalog -> xoa cache cuc bo cua instance nay
+catalog_version.on_change(product_cache.local.clear)
+catalog_version.on_change(_count_cache.clear)
+catalog_version.on_change(_facet_cache.clear)
+
 
 # Lay san pham dua tren id
 def get_product(db: Session, product_id: int):
     return db.query(models.Product).filter(models.Product.id == product_id).first()
 
 
+# Ban serialize (dict ProductRead) de luu cache
+def serialize_product(product: models.Product) -> dict:
+    return schemas.ProductRead.model_validate(product).model_dump(mode="json")
+
+
+# Lay san pham qua cache (chi dung cho endpoint doc, tra ve dict thay vi ORM object)
+def get_product_cached(db: Session, product_id: int) -> Optional[dict]:
+    def load(pid: int) -> Optional[dict]:
+        product = get_product(db, pid)
+        return serialize_product(product) if product else None
+
+    if not settings.PRODUCT_CACHE_ENABLED:
+        return load(product_id)
+    return product_cache.get(product_id, load)
+
+
+# Lay nhieu san pham qua cache: phan thieu doc bang 1 query IN
+def get_products_by_ids_cached(db: Session, product_ids: List[int]) -> Dict[int, dict]:
+    def load(pids: List[int]) -> Dict[int, dict]:
+        return {pid: serialize_product(p) for pid, p in get_products_by_ids(db, pids).items()}
+
+    if not settings.PRODUCT_CACHE_ENABLED:
+        return load(product_ids)
+    return product_cache.get_many(product_ids, load)
+
+
+# Lay nhieu san pham cung luc (1 query IN), tra ve dict {id: product}
+def get_products_by_ids(db: Session, product_ids: List[int]) -> Dict[int, models.Product]:
+    if not product_ids:
+        return {}
+    products = (
+        db.query(models.Product)
+        .filter(models.Product.id.in_(set(product_ids)))
+        .all()
+    )
+    return {product.id: product for product in products}
+
+
 # lay san pham dua theo ten
 def get_product_by_name(db: Session, name: str):
     return db.query(models.Product).filter(models.Product.name == name).first()
@@ -30,8 +105,11 @@ def create_product(db: Session, product: schemas.ProductCreate):
         image_url=product.image_url
     )
     db.add(db_product)
+    db.flush()
+    change_feed.record_changes(db, [db_product.id], change_feed.OP_UPSERT)
     db.commit()
     db.refresh(db_product)
+    refresh_derived_state([db_product])
     return db_product
 
 
@@ -45,19 +123,141 @@ def update_product(
         setattr(db_product, key, value)
 
     db.add(db_product)
+    change_feed.record_changes(db, [db_product.id], change_feed.OP_UPSERT)
     db.commit()
     db.refresh(db_product)
+    refresh_derived_state([db_product])
     return db_product
 
 
-# Xoa san pham
+# Xoa san pham (ghi tombstone vao change feed trong cung transaction)
 def delete_product(db: Session, db_product: models.Product):
     db.delete(db_product)
+    db.flush()
+    change_feed.record_changes(db, [db_product.id], change_feed.OP_DELETE)
     db.commit()
+    product_cache.invalidate(db_product.id)
+    product_index.remove(db_product.id)
+    suggest_index.remove(db_product.id)
+    _invalidate_search_caches()
+    catalog_version.bump()
     return db_product
 
 
+# Sau khi tao/cap nhat san pham da commit: xoa cache, cap nhat search index, tang phien ban catalog
+def refresh_derived_state(products: List[models.Product]):
+    for product in products:
+        product_cache.invalidate(product.id)
+        product_index.add(product)
+        suggest_index.add(product)
+    _invalidate_search_caches()
+    catalog_version.bump()
+
+
+# Dung lai search index tu toan bo bang san pham (chay nen luc khoi dong)
+def load_search_index():
+    db = SessionLocal()
+    try:
+        products = db.query(models.Product).yield_per(settings.SEARCH_INDEX_BUILD_BATCH)
+        product_index.rebuild(products)
+        logger.info("Search index built: %s", product_index.stats())
+    except Exception:
+        logger.exception("Search index build failed, falling back to SQL search")
+    finally:
+        db.close()
+
+
+# Theo doi change feed de search/suggest index cua instance nay bat kip ghi tu instance khac
+# (ghi cua chinh instance nay da duoc ap dung ngay, ap lai lan nua cung khong sao)
+def follow_change_feed(since: int, stop: threading.Event):
+    while not stop.wait(settings.CHANGE_FEED_POLL_INTERVAL):
+        db = SessionLocal()
+        try:
+            while True:
+                rows = change_feed.read_change_rows(db, since, CHANGE_FEED_FOLLOW_BATCH)
+                if not rows:
+                    break
+                apply_feed_changes(db, change_feed.latest_per_product(rows))
+                since = rows[-1].seq
+                if len(rows) < CHANGE_FEED_FOLLOW_BATCH:
+                    break
+        except Exception:
+            logger.exception("Change feed follower failed, retrying at seq %s", since)
+        finally:
+            db.close()
+
+
+def apply_feed_changes(db: Session, changes: List[models.ProductChange]):
+    products = get_products_by_ids(
+        db, [change.product_id for change in changes if change.op == change_feed.OP_UPSERT]
+    )
+    for change in changes:
+        product = products.get(change.product_id)
+        # Chi xoa LRU cuc bo; Redis da duoc instance ghi xoa
+        product_cache.local.delete(change.product_id)
+        if product is None:
+            product_index.remove(change.product_id)
+            suggest_index.remove(change.product_id)
+        else:
+            product_index.add(product)
+            suggest_index.add(product)
+    _invalidate_search_caches()
+
+
+# Dung index goi y (prefix) tu ten/category, chi doc cac cot can thiet
+def load_suggest_index():
+    db = SessionLocal()
+    try:
+        rows = db.query(
+            models.Product.id,
+            models.Product.name,
+            models.Product.category,
+            models.Product.created_at,
+            models.Product.updated_at,
+        ).yield_per(settings.SEARCH_INDEX_BUILD_BATCH)
+        suggest_index.rebuild(rows)
+        logger.info("Suggest index built: %s", suggest_index.stats())
+    except Exception:
+        logger.exception("Suggest index build failed, falling back to SQL prefix match")
+    finally:
+        db.close()
+
+
+# Goi y khi go: index prefix trong bo nho, chua san sang/tat thi dung LIKE 'prefix%' (dung index cot name)
+def suggest_products(db: Session, prefix: str, limit: int = 10) -> Dict[str, list]:
+    if settings.SUGGEST_ENABLED and suggest_index.ready:
+        return suggest_index.suggest(prefix, limit)
+
+    prefix = prefix.strip()
+    limit = min(limit, MAX_SUGGESTIONS)
+    if not prefix:
+        return {"categories": [], "products": []}
+    pattern = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    products = (
+        db.query(models.Product.id, models.Product.name)
+        .filter(models.Product.name.like(pattern, escape="\\"))
+        .order_by(models.Product.updated_at.desc(), models.Product.id.desc())
+        .limit(limit)
+        .all()
+    )
+    product_count = func.count(models.Product.id)
+    categories = (
+        db.query(models.Product.category, product_count)
+        .filter(models.Product.category.like(pattern, escape="\\"))
+        .group_by(models.Product.category)
+        .order_by(product_count.desc(), models.Product.category)
+        .limit(limit)
+        .all()
+    )
+    return {
+        "categories": [{"value": value, "count": count} for value, count in categories],
+        "products": [{"id": product_id, "name": name} for product_id, name in products],
+    }
+
+
 # Tim kiem san pham (loc theo ten, category, khoang gia, phan trang)
+# Co cursor -> phan trang keyset (sort, id); khong co -> offset theo page nhu cu
+# Ket qua duoc cache theo truy van da chuan hoa + phien ban catalog (ghi san pham -> het hieu luc)
 def search_products(
     db: Session,
     q: str = "",
@@ -66,7 +266,75 @@ def search_products(
     max_price: float = 999999999,
     page: int = 1,
     page_size: int = 20,
+    cursor: Optional[str] = None,
+    sort: str = "relevance",
+    total_mode: str = "exact",
 ):
+    after = decode_search_cursor(cursor, sort) if cursor else None
+    use_index = _use_search_index(q)
+    # Doc phien ban TRUOC khi truy van: ghi xen giua chi lam ket qua moi hon phien ban trong key
+    version = catalog_version.current() if settings.SEARCH_CACHE_ENABLED else None
+    if version is None:
+        return _search_products_uncached(
+            db, q, category, min_price, max_price, page, page_size, sort, total_mode, after, use_index
+        )
+
+    # brand khong anh huong ket qua nen khong nam trong key
+    key = (
+        use_index, _normalized_query(q, use_index), normalize_text(category),
+        float(min_price), float(max_price), page if after is None else None, page_size,
+        after, sort, total_mode,
+    )
+    cached = search_cache.get(version, key)
+    if cached is not None:
+        return (
+            cached["items"], cached["total"], cached["total_pages"],
+            cached["next_cursor"], cached["is_estimate"],
+        )
+
+    started = time.perf_counter()
+    items, total, total_pages, next_cursor, is_estimate = _search_products_uncached(
+        db, q, category, min_price, max_price, page, page_size, sort, total_mode, after, use_index
+    )
+    items = [serialize_product(item) for item in items]
+    search_cache.set(version, key, {
+        "items": items,
+        "total": total,
+        "total_pages": total_pages,
+        "next_cursor": next_cursor,
+        "is_estimate": is_estimate,
+    }, time.perf_counter() - started)
+    return items, total, total_pages, next_cursor, is_estimate
+
+
+def _use_search_index(q: str) -> bool:
+    return bool(q) and settings.SEARCH_BACKEND == "index" and product_index.ready
+
+
+# Truy van da chuan hoa de lam key cache: index khong quan tam thu tu/lap tu (AND),
+# SQL LIKE tren ca cum (khong phan biet hoa thuong)
+def _normalized_query(q: str, use_index: bool) -> str:
+    return " ".join(sorted(set(tokenize(q)))) if use_index else q.lower()
+
+
+def _search_products_uncached(
+    db: Session,
+    q: str,
+    category: str,
+    min_price: float,
+    max_price: float,
+    page: int,
+    page_size: int,
+    sort: str,
+    total_mode: str,
+    after: Optional[Tuple[str, int]],
+    use_index: bool,
+):
+    if use_index:
+        return _search_products_indexed(
+            db, q, category, min_price, max_price, page, page_size, sort, after
+        )
+
     query = db.query(models.Product)
     if q:
         query = query.filter(models.Product.name.ilike(f"%{q}%"))
@@ -76,7 +344,194 @@ def search_products(
         models.Product.price >= min_price,
         models.Product.price <= max_price,
     )
-    total = query.count()
-    items = query.offset((page - 1) * page_size).limit(page_size).all()
+    total, is_estimate = _count_search_results(
+        db, query, (q, category, min_price, max_price), total_mode
+    )
+
+    # SQL khong co diem lien quan -> "relevance" sap theo id
+    if sort == "price":
+        query = query.order_by(models.Product.price, models.Product.id)
+        if after:
+            query = query.filter(
+                tuple_(models.Product.price, models.Product.id) > (Decimal(after[0]), after[1])
+            )
+    else:
+        query = query.order_by(models.Product.id)
+        if after:
+            query = query.filter(models.Product.id > after[1])
+    if not after:
+        query = query.offset((page - 1) * page_size)
+
+    # Lay du 1 dong de biet con trang sau hay khong
+    rows = query.limit(page_size + 1).all()
+    items = rows[:page_size]
+    next_cursor = None
+    if len(rows) > page_size:
+        last = items[-1]
+        next_cursor = encode_search_cursor(sort, last.price if sort == "price" else "", last.id)
+
     total_pages = math.ceil(total / page_size) if page_size > 0 else 0
-    return items, total, total_pages
+    return items, total, total_pages, next_cursor, is_estimate
+
+
+# Tim kiem qua inverted index: loc + xep hang trong bo nho, chi doc 1 trang tu DB
+def _search_products_indexed(
+    db: Session,
+    q: str,
+    category: str,
+    min_price: float,
+    max_price: float,
+    page: int,
+    page_size: int,
+    sort: str,
+    after: Optional[Tuple[str, int]],
+):
+    hits = product_index.search(
+        q, category=category, min_price=min_price, max_price=max_price, sort=sort
+    )
+    total = len(hits)
+    if after:
+        # Vi tri ngay sau cursor trong danh sach da sap xep (bisect theo cung khoa sap xep)
+        sort_key = hit_sort_key(sort)
+        value, product_id = after
+        boundary = SearchHit(product_id, float(value or 0), float(value or 0))
+        start = bisect_right(hits, sort_key(boundary), key=sort_key)
+    else:
+        start = (page - 1) * page_size
+    page_hits = hits[start:start + page_size]
+
+    next_cursor = None
+    if page_hits and start + page_size < total:
+        last = page_hits[-1]
+        value = last.price if sort == "price" else repr(last.score)
+        next_cursor = encode_search_cursor(sort, value, last.product_id)
+
+    page_ids = [hit.product_id for hit in page_hits]
+    products = get_products_by_ids(db, page_ids)
+    items = [products[product_id] for product_id in page_ids if product_id in products]
+    total_pages = math.ceil(total / page_size) if page_size > 0 else 0
+    return items, total, total_pages, next_cursor, False
+
+
+# Cursor tim kiem: base64("sort|gia tri|id"), gia tri = gia hoac diem lien quan
+def encode_search_cursor(sort: str, value, product_id: int) -> str:
+    raw = f"{sort}|{value}|{product_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_search_cursor(cursor: str, sort: str) -> Tuple[str, int]:
+    try:
+        cursor_sort, value, product_id = (
+            base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        )
+        if cursor_sort != sort:
+            raise ValueError("cursor was issued for a different sort")
+        if value or sort == "price":
+            float(value)
+        return value, int(product_id)
+    except (ValueError, UnicodeDecodeError, binascii.Error):
+        raise ValueError("Invalid cursor")
+
+
+# Dem tong so ket qua: exact = COUNT(*), cached = COUNT(*) cache theo bo loc,
+# estimate = uoc luong tu EXPLAIN cua MySQL (khong quet bang)
+def _count_search_results(db: Session, query, filters: tuple, total_mode: str):
+    if total_mode == "estimate" and db.bind.dialect.name == "mysql":
+        statement = str(query.statement.compile(
+            dialect=db.bind.dialect, compile_kwargs={"literal_binds": True}
+        ))
+        # Gui thang cho driver (khong qua text(): chu ":tu" trong tu khoa tim kiem se bi
+        # hieu la bind param). Giu nguyen "%%" ma compiler da nhan doi: SQLAlchemy van dua
+        # bo tham so rong cho pymysql va driver chay query % args -> "%%" thanh "%"
+        plan = db.connection().exec_driver_sql("EXPLAIN " + statement).mappings().first()
+        if plan and plan.get("rows") is not None:
+            return int(plan["rows"] * float(plan.get("filtered") or 100) / 100), True
+
+    if total_mode == "cached":
+        total = _count_cache.get(filters)
+        if total is None:
+            total = query.count()
+            _count_cache.set(filters, total)
+        return total, False
+
+    return query.count(), False
+
+
+def _invalidate_search_caches():
+    _count_cache.clear()
+    _facet_cache.clear()
+
+
+# Facet cho trang tim kiem: so san pham theo category + histogram gia theo cac moc boundaries
+# Moi facet bo qua bo loc cua chinh no (loc category khong lam mat cac category khac)
+def search_facets(
+    db: Session,
+    q: str = "",
+    category: str = "",
+    min_price: float = 0,
+    max_price: float = 999999999,
+    boundaries: Optional[List[float]] = None,
+) -> dict:
+    boundaries = sorted(boundaries or settings.FACET_PRICE_BUCKETS)
+    use_index = _use_search_index(q)
+    key = (
+        use_index, _normalized_query(q, use_index), normalize_text(category),
+        min_price, max_price, tuple(boundaries),
+    )
+    cached = _facet_cache.get(key)
+    if cached is not None:
+        return cached
+
+    if use_index:
+        category_counts, bucket_counts = product_index.facet_counts(
+            q, boundaries, category=category, min_price=min_price, max_price=max_price
+        )
+    else:
+        category_counts, bucket_counts = _facet_counts_sql(
+            db, q, category, min_price, max_price, boundaries
+        )
+
+    edges = [None] + boundaries + [None]
+    facets = {
+        "categories": [
+            {"value": value, "count": count}
+            for value, count in sorted(
+                category_counts.items(), key=lambda item: (-item[1], item[0] or "")
+            )
+        ],
+        "price": [
+            {"min": edges[i], "max": edges[i + 1], "count": count}
+            for i, count in enumerate(bucket_counts)
+        ],
+    }
+    _facet_cache.set(key, facets)
+    return facets
+
+
+# 1 query GROUP BY (category, khoang gia, co nam trong bo loc gia) -> tinh ca 2 facet tu bang cheo
+def _facet_counts_sql(
+    db: Session, q: str, category: str, min_price: float, max_price: float, boundaries: List[float]
+):
+    price = models.Product.price
+    bucket = case(
+        *[(price < boundary, i) for i, boundary in enumerate(boundaries)],
+        else_=len(boundaries),
+    ).label("bucket")
+    in_range = case((price.between(min_price, max_price), 1), else_=0).label("in_range")
+    query = db.query(models.Product.category, bucket, in_range, func.count())
+    if q:
+        query = query.filter(models.Product.name.ilike(f"%{q}%"))
+    # GROUP BY theo alias (lap lai bieu thuc CASE se vuong ONLY_FULL_GROUP_BY cua MySQL)
+    rows = query.group_by(
+        models.Product.category, literal_column("bucket"), literal_column("in_range")
+    ).all()
+
+    category = normalize_text(category)
+    category_counts: Dict[Optional[str], int] = {}
+    bucket_counts = [0] * (len(boundaries) + 1)
+    for label, bucket_index, price_ok, count in rows:
+        if price_ok:
+            category_counts[label] = category_counts.get(label, 0) + count
+        if not category or category in normalize_text(label):
+            bucket_counts[int(bucket_index)] += count
+    return category_counts, bucket_counts
@@ -0,0 +1,103 @@
+import hashlib
+import json
+import logging
+import threading
+from typing import Hashable, Optional
+
+import redis
+from app.core.cache import LRUCache
+from app.core.config import settings
+from app.db.database import redis_client
+
+logger = logging.getLogger(__name__)
+
+REDIS_KEY_PREFIX = "search:v1:"
+
+
+class SearchResultCache:
+    """
+    Cache kết quả /products/search (1 trang + tổng số) theo truy vấn đã chuẩn hóa.
+
+    Khóa gồm phiên bản catalog, nên mọi lần ghi sản phẩm (bump phiên bản) làm
+    toàn bộ kết quả cũ hết hiệu lực cùng lúc mà không phải xóa từng key; key cũ
+    tự hết hạn theo TTL. Có Redis thì dùng chung giữa các instance, không có
+    thì dùng LRU trong process. Mỗi entry lưu thời gian đã tốn để tính, nên
+    khi trúng cache biết được đã tiết kiệm bao nhiêu thời gian DB/index.
+    """
+
+    def __init__(self, local: LRUCache, redis_client=None, ttl: int = 60):
+        self.local = local
+        self.redis = redis_client
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.redis_errors = 0
+        self.saved_seconds = 0.0
+        self.computed_seconds = 0.0
+
+    @staticmethod
+    def _key(version: str, key: Hashable) -> str:
+        digest = hashlib.sha256(repr(key).encode()).hexdigest()[:32]
+        return f"{REDIS_KEY_PREFIX}{version}:{digest}"
+
+    def get(self, version: str, key: Hashable) -> Optional[dict]:
+        cache_key = self._key(version, key)
+        if self.redis is None:
+            entry = self.local.get(cache_key)
+        else:
+            try:
+                raw = self.redis.get(cache_key)
+            except redis.RedisError as e:
+                self._record_redis_error("read", e)
+                raw = None
+            entry = json.loads(raw) if raw is not None else None
+
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.saved_seconds += entry["cost"]
+        return entry["result"]
+
+    def set(self, version: str, key: Hashable, result: dict, cost: float):
+        """cost = số giây đã tốn để tính result (cộng vào saved_seconds mỗi lần trúng)"""
+        with self._lock:
+            self.computed_seconds += cost
+        entry = {"result": result, "cost": cost}
+        cache_key = self._key(version, key)
+        if self.redis is None:
+            self.local.set(cache_key, entry)
+            return
+        try:
+            self.redis.set(cache_key, json.dumps(entry), ex=self.ttl)
+        except redis.RedisError as e:
+            self._record_redis_error("write", e)
+
+    def _record_redis_error(self, action: str, error: Exception):
+        with self._lock:
+            self.redis_errors += 1
+        logger.warning("Search cache: Redis %s failed: %s", action, error)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": "local" if self.redis is None else "redis",
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "redis_errors": self.redis_errors,
+                # Thời gian DB/index tránh được nhờ trúng cache, và đã tốn khi miss
+                "saved_seconds": round(self.saved_seconds, 3),
+                "computed_seconds": round(self.computed_seconds, 3),
+                "local": self.local.stats() if self.redis is None else None,
+            }
+
+
+search_cache = SearchResultCache(
+    LRUCache(settings.SEARCH_CACHE_MAX_ENTRIES, settings.SEARCH_CACHE_TTL),
+    redis_client=redis_client,
+    ttl=settings.SEARCH_CACHE_TTL,
+)
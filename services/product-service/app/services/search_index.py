@@ -0,0 +1,276 @@
+import math
+import re
+import sys
+import threading
+import unicodedata
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+# Trọng số từng trường khi tính độ liên quan (khớp tên quan trọng hơn khớp mô tả)
+FIELD_WEIGHTS = {"name": 3.0, "category": 2.0, "description": 1.0}
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Dọn các slot đã xóa khi chiếm quá 25% (và ít nhất 1000 slot)
+COMPACT_MIN_DEAD = 1000
+COMPACT_DEAD_RATIO = 0.25
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+class SearchHit(NamedTuple):
+    product_id: int
+    score: float
+    price: float
+
+
+def normalize_text(text: Optional[str]) -> str:
+    """Chuẩn hóa để tìm kiếm: chữ thường, bỏ dấu tiếng Việt (kể cả đ -> d)"""
+    if not text:
+        return ""
+    text = text.lower().replace("đ", "d")
+    decomposed = unicodedata.normalize("NFD", text)
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Tách từ trên chuỗi đã chuẩn hóa ("Điện thoại 5G" -> ["dien", "thoai", "5g"])"""
+    return _TOKEN_RE.findall(normalize_text(text))
+
+
+class SearchIndex:
+    """
+    Inverted index trong bộ nhớ cho products_official (thay cho LIKE '%q%').
+
+    Mỗi sản phẩm chiếm 1 slot (chỉ thêm vào cuối); posting list của mỗi token là
+    2 mảng song song (slot tăng dần, tf có trọng số). Cập nhật = đánh dấu slot cũ
+    đã chết + thêm slot mới; các slot chết được dọn định kỳ (compaction).
+    Xếp hạng bằng BM25, lọc category/giá ngay trong index để chỉ phải đọc
+    đúng 1 trang sản phẩm từ MySQL.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.ready = False
+        self._reset()
+
+    def _reset(self):
+        self._slot_of: Dict[int, int] = {}
+        self._ids = array("q")
+        self._prices = array("d")
+        self._categories: List[str] = []
+        self._category_labels: List[Optional[str]] = []
+        self._lengths = array("f")
+        self._alive = bytearray()
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._total_length = 0.0
+        self._live_count = 0
+
+    # --- Ghi ---
+
+    def rebuild(self, products: Iterable):
+        """Dựng lại toàn bộ index (lúc khởi động)"""
+        with self._lock:
+            self._reset()
+            for product in products:
+                self._add(product)
+            self.ready = True
+
+    def add(self, product):
+        """Thêm hoặc cập nhật 1 sản phẩm (gọi sau khi create/update đã commit)"""
+        with self._lock:
+            self._add(product)
+            self._maybe_compact()
+
+    def remove(self, product_id: int):
+        with self._lock:
+            self._remove(product_id)
+            self._maybe_compact()
+
+    def _add(self, product):
+        self._remove(product.id)
+
+        weighted_tf: Dict[str, float] = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(getattr(product, field, None)):
+                weighted_tf[token] = weighted_tf.get(token, 0.0) + weight
+        length = sum(weighted_tf.values())
+
+        slot = len(self._ids)
+        self._slot_of[product.id] = slot
+        self._ids.append(product.id)
+        self._prices.append(float(product.price or 0))
+        self._categories.append(sys.intern(normalize_text(product.category)))
+        self._category_labels.append(sys.intern(product.category) if product.category else None)
+        self._lengths.append(length)
+        self._alive.append(1)
+        self._total_length += length
+        self._live_count += 1
+
+        for token, tf in weighted_tf.items():
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = (array("i"), array("f"))
+            postings[0].append(slot)
+            postings[1].append(tf)
+
+    def _remove(self, product_id: int):
+        slot = self._slot_of.pop(product_id, None)
+        if slot is None:
+            return
+        self._alive[slot] = 0
+        self._total_length -= self._lengths[slot]
+        self._live_count -= 1
+
+    def _maybe_compact(self):
+        dead = len(self._ids) - self._live_count
+        if dead >= COMPACT_MIN_DEAD and dead > COMPACT_DEAD_RATIO * len(self._ids):
+            self._compact()
+
+    def _compact(self):
+        """Bỏ các slot đã chết, đánh số lại slot (giữ nguyên thứ tự tăng dần)"""
+        remap = array("i", [-1]) * len(self._ids)
+        ids, prices, lengths = array("q"), array("d"), array("f")
+        categories, category_labels = [], []
+        for old_slot, alive in enumerate(self._alive):
+            if alive:
+                remap[old_slot] = len(ids)
+                ids.append(self._ids[old_slot])
+                prices.append(self._prices[old_slot])
+                lengths.append(self._lengths[old_slot])
+                categories.append(self._categories[old_slot])
+                category_labels.append(self._category_labels[old_slot])
+
+        postings = {}
+        for token, (slots, tfs) in self._postings.items():
+            new_slots, new_tfs = array("i"), array("f")
+            for slot, tf in zip(slots, tfs):
+                if remap[slot] >= 0:
+                    new_slots.append(remap[slot])
+                    new_tfs.append(tf)
+            if new_slots:
+                postings[token] = (new_slots, new_tfs)
+
+        self._ids, self._prices, self._lengths = ids, prices, lengths
+        self._categories, self._category_labels = categories, category_labels
+        self._alive = bytearray(b"\x01") * len(ids)
+        self._slot_of = {product_id: slot for slot, product_id in enumerate(ids)}
+        self._postings = postings
+
+    # --- Đọc ---
+
+    def search(
+        self,
+        q: str,
+        category: str = "",
+        min_price: float = 0,
+        max_price: float = math.inf,
+        sort: str = "relevance",
+    ) -> List[SearchHit]:
+        """
+        Trả về các sản phẩm chứa TẤT CẢ từ trong q, đã lọc category
+        (chuỗi con, không dấu) và khoảng giá. sort="relevance": điểm giảm dần
+        rồi id; sort="price": giá tăng dần rồi id.
+        """
+        category = normalize_text(category)
+
+        with self._lock:
+            postings, candidates = self._match(q)
+            if not candidates:
+                return []
+
+            prices, categories = self._prices, self._categories
+            candidates = [
+                slot for slot in candidates
+                if min_price <= prices[slot] <= max_price
+                and (not category or category in categories[slot])
+            ]
+
+            doc_count = max(self._live_count, 1)
+            avg_length = self._total_length / doc_count or 1.0
+            length_norm = {
+                slot: BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[slot] / avg_length)
+                for slot in candidates
+            }
+            scores = dict.fromkeys(candidates, 0.0)
+            for slots, tfs in postings:
+                idf = math.log(1 + (doc_count - len(slots) + 0.5) / (len(slots) + 0.5))
+                for slot in candidates:
+                    tf = tfs[bisect_left(slots, slot)]
+                    scores[slot] += idf * tf * (BM25_K1 + 1) / (tf + length_norm[slot])
+
+            results = [
+                SearchHit(self._ids[slot], score, prices[slot]) for slot, score in scores.items()
+            ]
+
+        results.sort(key=hit_sort_key(sort))
+        return results
+
+    def facet_counts(
+        self,
+        q: str,
+        boundaries: List[float],
+        category: str = "",
+        min_price: float = 0,
+        max_price: float = math.inf,
+    ) -> Tuple[Dict[Optional[str], int], List[int]]:
+        """
+        Đếm facet trong 1 lượt duyệt các sản phẩm khớp q:
+        - số lượng theo category (áp dụng bộ lọc giá, bỏ qua bộ lọc category)
+        - histogram giá theo các mốc boundaries (áp dụng bộ lọc category, bỏ qua bộ lọc giá)
+        Bỏ qua chính bộ lọc của facet đó để UI vẫn hiện các lựa chọn khác.
+        """
+        category = normalize_text(category)
+        category_counts: Dict[Optional[str], int] = {}
+        bucket_counts = [0] * (len(boundaries) + 1)
+
+        with self._lock:
+            _, candidates = self._match(q)
+            prices, categories, labels = self._prices, self._categories, self._category_labels
+            for slot in candidates:
+                price = prices[slot]
+                if min_price <= price <= max_price:
+                    label = labels[slot]
+                    category_counts[label] = category_counts.get(label, 0) + 1
+                if not category or category in categories[slot]:
+                    bucket_counts[bisect_right(boundaries, price)] += 1
+        return category_counts, bucket_counts
+
+    def _match(self, q: str) -> Tuple[list, set]:
+        """Posting list của các token trong q (hiếm nhất trước) và tập slot còn sống chứa tất cả"""
+        tokens = list(dict.fromkeys(tokenize(q)))
+        postings = [self._postings.get(token) for token in tokens]
+        if not tokens or any(p is None for p in postings):
+            return [], set()
+        # Bắt đầu từ token hiếm nhất để tập ứng viên nhỏ nhất
+        postings.sort(key=lambda p: len(p[0]))
+
+        # Giao các posting list bằng set (chạy ở tầng C)
+        candidates = set(postings[0][0])
+        for slots, _ in postings[1:]:
+            candidates.intersection_update(slots)
+            if not candidates:
+                return postings, candidates
+        alive = self._alive
+        return postings, {slot for slot in candidates if alive[slot]}
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "ready": self.ready,
+                "documents": self._live_count,
+                "slots": len(self._ids),
+                "tokens": len(self._postings),
+                "postings": sum(len(slots) for slots, _ in self._postings.values()),
+            }
+
+
+def hit_sort_key(sort: str):
+    """Khóa sắp xếp của kết quả (dùng cả cho phân trang keyset)"""
+    if sort == "price":
+        return lambda hit: (hit.price, hit.product_id)
+    return lambda hit: (-hit.score, hit.product_id)
+
+
+# Index dùng chung cho cả process
+product_index = SearchIndex()
@@ -0,0 +1,243 @@
+import heapq
+import sys
+import threading
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.search_index import tokenize
+
+# Số gợi ý tối đa 1 request (mỗi prefix cache sâu gấp đôi để chịu được vài lần xóa)
+MAX_SUGGESTIONS = 20
+CACHE_DEPTH = 2 * MAX_SUGGESTIONS
+
+
+def suggest_key(text: Optional[str]) -> str:
+    """Khóa so khớp prefix: không dấu, chữ thường, các từ cách nhau 1 dấu cách"""
+    return " ".join(tokenize(text))
+
+
+def recency_score(product) -> float:
+    """Điểm xếp hạng mặc định: sản phẩm vừa tạo/cập nhật đứng trước"""
+    changed_at = getattr(product, "updated_at", None) or getattr(product, "created_at", None)
+    return changed_at.timestamp() if changed_at else 0.0
+
+
+class SuggestIndex:
+    """
+    Index prefix trong bộ nhớ cho ô tìm kiếm (gợi ý khi đang gõ).
+
+    Tên sản phẩm (đã chuẩn hóa) nằm trong 1 mảng đã sắp xếp; prefix -> khoảng
+    [lo, hi) bằng bisect. Khoảng nhỏ thì lấy top-k trực tiếp; khoảng lớn (vd "i")
+    thì dùng top-k đã cache theo prefix. Khi ghi 1 sản phẩm chỉ các prefix của
+    tên nó bị ảnh hưởng, nên top-k cache được sửa tại chỗ thay vì xóa hết.
+    Category được gợi ý riêng, xếp theo số sản phẩm.
+    """
+
+    def __init__(self, scan_limit: int = 2000, cache_max_entries: int = 20000):
+        self.scan_limit = scan_limit
+        self.cache_max_entries = cache_max_entries
+        self._lock = threading.RLock()
+        self.ready = False
+        self._reset()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def _reset(self):
+        # 3 mảng song song, sắp xếp theo khóa
+        self._keys: List[str] = []
+        self._ids = array("q")
+        self._scores = array("d")
+        # id -> (khóa, tên hiển thị, khóa category)
+        self._entries: Dict[int, Tuple[str, str, str]] = {}
+        # khóa category -> [tên hiển thị, số sản phẩm]; _category_keys đã sắp xếp
+        self._categories: Dict[str, list] = {}
+        self._category_keys: List[str] = []
+        # prefix -> top CACHE_DEPTH sản phẩm, tăng dần theo (-điểm, -id) (chỉ cho khoảng lớn)
+        self._top: "OrderedDict[str, List[Tuple[float, int]]]" = OrderedDict()
+        self._string_bytes = 0
+
+    # --- Ghi ---
+
+    def rebuild(self, products: Iterable, score=recency_score):
+        """Dựng lại toàn bộ (lúc khởi động): gom hết rồi sắp xếp 1 lần"""
+        rows = []
+        for product in products:
+            key = suggest_key(product.name)
+            if key:
+                rows.append((key, product.id, score(product), product.name, product.category))
+        rows.sort()
+
+        with self._lock:
+            self._reset()
+            for key, product_id, product_score, name, category in rows:
+                self._keys.append(key)
+                self._ids.append(product_id)
+                self._scores.append(product_score)
+                self._entries[product_id] = (key, name, self._add_category(category))
+                self._string_bytes += sys.getsizeof(key) + sys.getsizeof(name)
+            self.ready = True
+
+    def add(self, product, score: Optional[float] = None):
+        """Thêm hoặc cập nhật 1 sản phẩm (gọi sau khi create/update đã commit)"""
+        key = suggest_key(product.name)
+        product_score = recency_score(product) if score is None else score
+        with self._lock:
+            self._remove(product.id)
+            if not key:
+                return
+            position = bisect_right(self._keys, key)
+            self._keys.insert(position, key)
+            self._ids.insert(position, product.id)
+            self._scores.insert(position, product_score)
+            category_key = self._add_category(product.category)
+            self._entries[product.id] = (key, product.name, category_key)
+            self._string_bytes += sys.getsizeof(key) + sys.getsizeof(product.name)
+            self._top_add(key, product_score, product.id)
+
+    def remove(self, product_id: int):
+        with self._lock:
+            self._remove(product_id)
+
+    def _remove(self, product_id: int):
+        entry = self._entries.pop(product_id, None)
+        if entry is None:
+            return
+        key, name, category_key = entry
+        position = bisect_left(self._keys, key)
+        while self._ids[position] != product_id:
+            position += 1
+        del self._keys[position]
+        del self._ids[position]
+        del self._scores[position]
+        self._string_bytes -= sys.getsizeof(key) + sys.getsizeof(name)
+        if category_key:
+            counter = self._categories[category_key]
+            counter[1] -= 1
+            if counter[1] == 0:
+                del self._categories[category_key]
+                del self._category_keys[bisect_left(self._category_keys, category_key)]
+        self._top_remove(key, product_id)
+
+    def _add_category(self, label: Optional[str]) -> str:
+        category_key = suggest_key(label)
+        if category_key:
+            counter = self._categories.get(category_key)
+            if counter is None:
+                self._categories[category_key] = [label, 1]
+                insort(self._category_keys, category_key)
+            else:
+                counter[1] += 1
+        return category_key
+
+    def _top_add(self, key: str, score: float, product_id: int):
+        """Sửa top-k đã cache của mọi prefix của key (chỉ các prefix này bị ảnh hưởng)"""
+        item = (-score, -product_id)
+        for end in range(1, len(key) + 1):
+            top = self._top.get(key[:end])
+            # Kém hơn phần tử cuối thì không chắc thuộc top (có thể còn phần tử chưa cache ở giữa)
+            if top and item < top[-1]:
+                insort(top, item)
+                if len(top) > CACHE_DEPTH:
+                    top.pop()
+
+    def _top_remove(self, key: str, product_id: int):
+        for end in range(1, len(key) + 1):
+            prefix = key[:end]
+            top = self._top.get(prefix)
+            if top is None:
+                continue
+            for i, (_, negative_id) in enumerate(top):
+                if negative_id == -product_id:
+                    del top[i]
+                    break
+            # Còn ít hơn 1 trang gợi ý mà không biết phần tử kế tiếp -> tính lại lần sau
+            if len(top) < MAX_SUGGESTIONS:
+                del self._top[prefix]
+
+    # --- Đọc ---
+
+    def suggest(self, prefix: str, limit: int = 10) -> Dict[str, list]:
+        """
+        Gợi ý cho prefix đang gõ: category có khóa bắt đầu bằng prefix (nhiều sản
+        phẩm trước) và sản phẩm có tên bắt đầu bằng prefix (điểm cao trước).
+        """
+        key = suggest_key(prefix)
+        limit = min(limit, MAX_SUGGESTIONS)
+        if not key:
+            return {"categories": [], "products": []}
+
+        with self._lock:
+            lo = bisect_left(self._category_keys, key)
+            hi = bisect_left(self._category_keys, key + "\uffff", lo)
+            categories = heapq.nsmallest(
+                limit,
+                self._category_keys[lo:hi],
+                key=lambda k: (-self._categories[k][1], k),
+            )
+            category_items = [
+                {"value": self._categories[k][0], "count": self._categories[k][1]}
+                for k in categories
+            ]
+
+            top = self._top_k(key)
+            product_items = [
+                {"id": -negative_id, "name": self._entries[-negative_id][1]}
+                for _, negative_id in top[:limit]
+            ]
+        return {"categories": category_items, "products": product_items}
+
+    def _top_k(self, key: str) -> List[Tuple[float, int]]:
+        top = self._top.get(key)
+        if top is not None:
+            self._top.move_to_end(key)
+            self.cache_hits += 1
+            return top
+
+        lo = bisect_left(self._keys, key)
+        hi = bisect_left(self._keys, key + "\uffff", lo)
+        scores, ids = self._scores, self._ids
+        if hi - lo <= CACHE_DEPTH:
+            return sorted((-scores[i], -ids[i]) for i in range(lo, hi))
+
+        items = heapq.nsmallest(
+            CACHE_DEPTH, ((-scores[i], -ids[i]) for i in range(lo, hi))
+        )
+        # Khoảng nhỏ: duyệt lại mỗi lần vẫn nhanh, không cần chiếm chỗ trong cache
+        if hi - lo > self.scan_limit:
+            self.cache_misses += 1
+            self._top[key] = items
+            if len(self._top) > self.cache_max_entries:
+                self._top.popitem(last=False)
+        return items
+
+    def stats(self) -> dict:
+        with self._lock:
+            container_bytes = (
+                sys.getsizeof(self._keys)
+                + sys.getsizeof(self._ids)
+                + sys.getsizeof(self._scores)
+                + sys.getsizeof(self._entries)
+                + sys.getsizeof(self._categories)
+                + sys.getsizeof(self._category_keys)
+                + len(self._entries) * sys.getsizeof((None, None, None))
+            )
+            return {
+                "ready": self.ready,
+                "products": len(self._keys),
+                "categories": len(self._categories),
+                "cached_prefixes": len(self._top),
+                "cache_hits": self.cache_hits,
+                "cache_misses": self.cache_misses,
+                # Ước lượng: mảng/dict/tuple + chuỗi khóa và tên (chưa tính top-k cache)
+                "memory_bytes": container_bytes + self._string_bytes,
+            }
+
+
+# Index gợi ý dùng chung cho cả process
+suggest_index = SuggestIndex(
+    scan_limit=settings.SUGGEST_SCAN_LIMIT,
+    cache_max_entries=settings.SUGGEST_CACHE_MAX_ENTRIES,
+)
@@ -0,0 +1,56 @@
+"""
+Tạo sẵn mọi biến thể (160/320/640 px, webp + jpeg) cho các ảnh đã có trong thư mục upload.
+Biến thể đã tồn tại (cùng hash nội dung) được bỏ qua nên chạy lại nhiều lần vẫn an toàn.
+Chạy trong container product-service:
+
+    PYTHONPATH=. python scripts/backfill_image_variants.py --workers 4
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from app.core.config import settings
+from app.services import image_variants
+
+
+def backfill_one(filename: str):
+    start = time.perf_counter()
+    variants = image_variants.ensure_all_variants(filename)
+    return filename, variants, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    filenames = sorted(
+        name for name in os.listdir(settings.UPLOAD_DIR)
+        if image_variants.source_path(name) is not None
+    )
+    print(f"{len(filenames)} images in {settings.UPLOAD_DIR} -> {settings.IMAGE_VARIANTS_DIR}")
+
+    start = time.perf_counter()
+    failed = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = {pool.submit(backfill_one, name): name for name in filenames}
+        for future in as_completed(futures):
+            try:
+                filename, variants, elapsed = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"FAILED {futures[future]}: {e}")
+                continue
+            original = os.path.getsize(os.path.join(settings.UPLOAD_DIR, filename))
+            smallest = os.path.getsize(
+                os.path.join(settings.IMAGE_VARIANTS_DIR, variants["320.webp"])
+            )
+            print(f"{filename:<40} {original / 1024:8.1f}KB -> 320.webp {smallest / 1024:6.1f}KB "
+                  f"({elapsed * 1000:.0f}ms)")
+
+    print(f"done: {len(filenames) - failed} ok, {failed} failed in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
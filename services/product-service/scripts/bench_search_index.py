@@ -0,0 +1,132 @@
+"""
+Benchmark search index trên catalog giả lập (mặc định 1.000.000 sản phẩm).
+
+Đo thời gian dựng index, bộ nhớ tăng thêm và độ trễ truy vấn (p50/p95),
+so với quét tuần tự kiểu name LIKE '%q%' (cách search_products làm trước đây).
+Không cần MySQL:
+
+    PYTHONPATH=. python scripts/bench_search_index.py --products 1000000 --queries 200
+"""
+import argparse
+import random
+import resource
+import statistics
+import time
+from types import SimpleNamespace
+
+from app.services.search_index import SearchIndex
+
+# Mỗi hãng có vài dòng sản phẩm; tên = loại + hãng + dòng + mã model + mô tả ngắn
+LINES = {
+    "Apple": ["iPhone", "iPad", "MacBook", "AirPods", "Watch"],
+    "Samsung": ["Galaxy S", "Galaxy A", "Galaxy Tab", "Odyssey", "Galaxy Buds"],
+    "Xiaomi": ["Redmi Note", "Poco", "Mi Band", "Redmi Pad"],
+    "Sony": ["WH", "Xperia", "Alpha", "Bravia"],
+    "Asus": ["ROG Strix", "TUF Gaming", "Zenbook", "Vivobook"],
+    "Dell": ["XPS", "Inspiron", "Latitude", "Alienware"],
+    "Lenovo": ["ThinkPad", "IdeaPad", "Legion", "Yoga"],
+    "Logitech": ["MX Master", "G Pro", "MX Keys"],
+    "Canon": ["EOS", "PowerShot"],
+    "Kingston": ["Fury", "NV2", "KC3000"],
+}
+NOUNS = [
+    "Điện thoại", "Máy tính bảng", "Laptop", "Tai nghe", "Loa bluetooth", "Chuột không dây",
+    "Bàn phím cơ", "Màn hình", "Đồng hồ thông minh", "Máy ảnh", "Ổ cứng SSD", "Sạc dự phòng",
+]
+ADJECTIVES = ["chính hãng", "cao cấp", "giá rẻ", "chống ồn", "siêu mỏng", "pin trâu", "màu đen", "màu trắng"]
+CATEGORIES = ["Điện thoại", "Laptop", "Phụ kiện", "Âm thanh", "Màn hình", "Máy ảnh", "Lưu trữ"]
+# Truy vấn rộng (khớp hàng chục nghìn sản phẩm) và truy vấn cụ thể (hãng + dòng + model)
+BROAD_QUERIES = [
+    "dien thoai samsung", "tai nghe chong on", "laptop dell", "ban phim co", "Sạc dự phòng",
+]
+SPECIFIC_QUERIES = [
+    "galaxy s 24", "dell xps 13", "thinkpad x1", "Điện thoại iPhone 15", "rog strix 17",
+    "redmi note 12 chính hãng", "mx master 3", "eos r5", "kingston fury 32",
+]
+
+
+def make_products(count: int, seed: int):
+    rng = random.Random(seed)
+    brands = list(LINES)
+    for product_id in range(1, count + 1):
+        noun = rng.choice(NOUNS)
+        brand = rng.choice(brands)
+        line = rng.choice(LINES[brand])
+        model = f"{rng.choice(['', 'X', 'R', 'Pro '])}{rng.randint(1, 40)}"
+        yield SimpleNamespace(
+            id=product_id,
+            name=f"{noun} {brand} {line} {model} {rng.choice(ADJECTIVES)} #{product_id}",
+            description=f"{noun} {brand} {line} {rng.choice(ADJECTIVES)}, bảo hành 12 tháng",
+            category=rng.choice(CATEGORIES),
+            price=rng.randint(100, 50000) * 1000,
+        )
+
+
+def max_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def report(label, latencies):
+    print(
+        f"{label:<24} p50={statistics.median(latencies) * 1000:8.2f}ms "
+        f"p95={percentile(latencies, 95) * 1000:8.2f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--scan-queries", type=int, default=20)
+    parser.add_argument("--updates", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    rss_before = max_rss_mb()
+    index = SearchIndex()
+    start = time.perf_counter()
+    index.rebuild(make_products(args.products, args.seed))
+    build_time = time.perf_counter() - start
+    print(f"build: {args.products} products in {build_time:.1f}s, "
+          f"+{max_rss_mb() - rss_before:.0f}MB RSS, {index.stats()}")
+
+    for label, queries in (("index search (broad)", BROAD_QUERIES),
+                           ("index search (specific)", SPECIFIC_QUERIES)):
+        latencies, hits = [], []
+        for _ in range(args.queries):
+            q = rng.choice(queries)
+            start = time.perf_counter()
+            results = index.search(q, min_price=1_000_000, max_price=20_000_000)
+            latencies.append(time.perf_counter() - start)
+            hits.append(len(results))
+        report(label, latencies)
+        print(f"{'':<24} avg matches={statistics.mean(hits):.0f}")
+
+    # Baseline: quét tuần tự như LIKE '%q%' (chỉ khớp nguyên cụm, có phân biệt dấu)
+    names = [p.name.lower() for p in make_products(args.products, args.seed)]
+    latencies = []
+    for _ in range(args.scan_queries):
+        q = rng.choice(BROAD_QUERIES + SPECIFIC_QUERIES).lower()
+        start = time.perf_counter()
+        [i for i, name in enumerate(names) if q in name]
+        latencies.append(time.perf_counter() - start)
+    report("linear LIKE scan", latencies)
+
+    # Cập nhật tăng dần (giống PUT /products/{id}) rồi tìm lại
+    start = time.perf_counter()
+    for product in make_products(args.updates, args.seed + 1):
+        product.id = rng.randint(1, args.products)
+        index.add(product)
+    update_time = time.perf_counter() - start
+    print(f"updates: {args.updates} in {update_time:.2f}s "
+          f"({args.updates / update_time:.0f}/s), {index.stats()}")
+
+
+if __name__ == "__main__":
+    main()
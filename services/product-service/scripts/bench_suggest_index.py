@@ -0,0 +1,70 @@
+"""
+Benchmark index gợi ý (prefix) trên catalog giả lập (mặc định 1.000.000 sản phẩm).
+
+Đo thời gian dựng, bộ nhớ (RSS tăng thêm và ước lượng của stats()) và độ trễ
+gợi ý theo độ dài prefix, kể cả khi đang có ghi xen kẽ. Không cần MySQL:
+
+    PYTHONPATH=. python scripts/bench_suggest_index.py --products 1000000
+"""
+import argparse
+import random
+import time
+
+from app.services.suggest_index import SuggestIndex
+from bench_search_index import make_products, max_rss_mb, report
+
+# Từ rất rộng (1 ký tự, khớp hàng trăm nghìn tên) tới gần như đủ tên
+PREFIXES = {
+    "1-2 chars": ["d", "l", "t", "m", "ma", "ta", "o"],
+    "1 word": ["dien", "laptop", "tai nghe", "man hinh", "o cung"],
+    "word + brand": ["dien thoai sam", "laptop dell", "tai nghe sony", "ban phim co log"],
+    "near full name": ["dien thoai apple iphone 1", "laptop lenovo thinkpad x2", "tai nghe sony wh pro 3"],
+}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--updates", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    rss_before = max_rss_mb()
+    index = SuggestIndex()
+    start = time.perf_counter()
+    # Không có updated_at trong dữ liệu giả -> điểm ngẫu nhiên thay cho độ mới
+    index.rebuild(make_products(args.products, args.seed), score=lambda p: rng.random())
+    build_time = time.perf_counter() - start
+    print(f"build: {args.products} products in {build_time:.1f}s, "
+          f"+{max_rss_mb() - rss_before:.0f}MB RSS, {index.stats()}")
+
+    for label, prefixes in PREFIXES.items():
+        latencies = []
+        for _ in range(args.queries):
+            prefix = rng.choice(prefixes)
+            start = time.perf_counter()
+            index.suggest(prefix, limit=10)
+            latencies.append(time.perf_counter() - start)
+        report(f"suggest ({label})", latencies)
+
+    # Ghi xen kẽ (giống PUT /products/{id}): mỗi lần ghi sửa top-k cache của các prefix liên quan
+    updates = make_products(args.updates, args.seed + 1)
+    write_latencies, read_latencies = [], []
+    all_prefixes = [p for group in PREFIXES.values() for p in group]
+    for product in updates:
+        product.id = rng.randint(1, args.products)
+        start = time.perf_counter()
+        index.add(product, score=rng.random() + 1)
+        write_latencies.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        index.suggest(rng.choice(all_prefixes), limit=10)
+        read_latencies.append(time.perf_counter() - start)
+    report("add/update", write_latencies)
+    report("suggest (during writes)", read_latencies)
+    print(f"after updates: {index.stats()}")
+
+
+if __name__ == "__main__":
+    main()
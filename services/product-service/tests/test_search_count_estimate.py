@@ -0,0 +1,97 @@
+"""
+total_mode=estimate trên MySQL: EXPLAIN được gửi qua pymysql thật (Cursor của pymysql),
+chỉ thay kết nối mạng bằng kết nối giả để không cần MySQL server.
+Chạy: cd services/product-service && python -m pytest -q tests
+"""
+import os
+import sys
+
+import pymysql.cursors
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# config.py dựng DATABASE_URL từ biến môi trường lúc import (engine không kết nối ngay)
+os.environ.setdefault("MYSQL_PORT", "3306")
+
+from app.db import models  # noqa: E402
+from app.services import product_service  # noqa: E402
+
+
+class _FakeResult:
+    def __init__(self, description, rows):
+        self.affected_rows = len(rows)
+        self.insert_id = 0
+        self.warning_count = 0
+        self.message = None
+        self.has_next = False
+        self.description = description
+        self.rows = rows
+
+
+class _FakeMySQLConnection:
+    """Đủ cho pymysql.cursors.Cursor: ghi lại câu SQL cuối cùng và trả về 1 dòng EXPLAIN"""
+
+    encoding = "utf8mb4"
+
+    def __init__(self):
+        self.queries = []
+        self._result = None
+
+    def cursor(self):
+        return pymysql.cursors.Cursor(self)
+
+    def escape(self, obj, mapping=None):
+        return pymysql.converters.escape_item(obj, "utf8mb4", mapping)
+
+    def literal(self, obj):
+        return self.escape(obj)
+
+    def query(self, sql, unbuffered=False):
+        self.queries.append(sql)
+        description = (("rows", 8, None, 21, 21, 0, True), ("filtered", 4, None, 12, 12, 31, True))
+        self._result = _FakeResult(description, ((40, 25.0),))
+        return 1
+
+    def character_set_name(self):
+        return self.encoding
+
+    def next_result(self):
+        return 0
+
+    def show_warnings(self):
+        return ()
+
+    def rollback(self):
+        pass
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def _mysql_session(connection):
+    engine = create_engine("mysql+pymysql://", creator=lambda: connection)
+    engine.dialect.initialize = lambda conn: None
+    return Session(bind=engine)
+
+
+def test_estimate_with_like_filters_runs_explain():
+    connection = _FakeMySQLConnection()
+    db = _mysql_session(connection)
+    query = (
+        db.query(models.Product)
+        .filter(models.Product.name.ilike("%iphone: 50%%%"))
+        .filter(models.Product.category.ilike("%phone%"))
+    )
+
+    total, is_estimate = product_service._count_search_results(db, query, ("k",), "estimate")
+
+    assert (total, is_estimate) == (10, True)
+    explain = connection.queries[-1]
+    assert explain.startswith("EXPLAIN ")
+    # LIKE tới MySQL với "%" đơn, không còn "%%" do compiler nhân đôi
+    assert "lower('%iphone: 50%%%')" in explain
+    assert "lower('%phone%')" in explain
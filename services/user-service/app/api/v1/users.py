@@ -1,6 +1,7 @@
 # File: app/api/v1/users.py
 from typing import List
 
+from app.core.internal_auth import require_internal_caller
 from app.db.database import get_db
 from app.models import user as schemas
 from app.services import user_services as crud
@@ -30,10 +31,15 @@ def read_users_endpoint(request: Request, skip: int = 0, limit: int = 100, db: S
     return users
 
 
-@router.get("/users/by-email/{email}", response_model=schemas.UserReadWithPassword)
+@router.get(
+    "/users/by-email/{email}",
+    response_model=schemas.UserReadWithPassword,
+    dependencies=[Depends(require_internal_caller)],
+)
 def read_user_by_email_endpoint(email: str, db: Session = Depends(get_db)):
     """
     API nội bộ: Lấy thông tin user bằng email (bao gồm cả password đã băm).
+    Khi đã cấu hình INTERNAL_SERVICE_SECRET, chỉ service nội bộ (có chữ ký) được gọi.
     """
     db_user = crud.get_user_by_email(db, email=email)
     if db_user is None:
@@ -4,6 +4,9 @@ import os
 
 class Settings:
     DATABASE_URL: str = os.environ.get("DATABASE_URL")
+    # Ký / xác thực request giữa các service nội bộ
+    INTERNAL_SERVICE_SECRET: str = os.environ.get("INTERNAL_SERVICE_SECRET", "")
+    INTERNAL_SIGNATURE_MAX_AGE: int = int(os.environ.get("INTERNAL_SIGNATURE_MAX_AGE", 30))
 
 
 settings = Settings()
@@ -1,4 +1,5 @@
 from app.api.v1 import users  # <-- Import router users
+from app.core.internal_auth import internal_caller_middleware
 from app.db import models
 from app.db.database import engine
 from fastapi import FastAPI
@@ -8,6 +9,9 @@ models.Base.metadata.create_all(bind=engine)
 
 app = FastAPI()
 
+# Xác thực header ký của service nội bộ (khi được gọi thẳng, không qua gateway)
+app.middleware("http")(internal_caller_middleware)
+
 # Include router:
 # Tất cả các API trong 'users.router' sẽ được thêm vào app
 # Nó sẽ giữ nguyên các đường dẫn như /api/users/